@@ -2,13 +2,19 @@ from __future__ import annotations
 
 from logging.config import fileConfig
 
-from alembic import context
 from sqlalchemy import engine_from_config, pool
 
+from alembic import context
 from pastoapp.core.config import settings
 from pastoapp.db.base import Base
-from pastoapp.models import pasto_entry, photo  # noqa: F401
-
+from pastoapp.db.session import sync_database_url
+from pastoapp.models import (  # noqa: F401
+    change_log,
+    pasto_entry,
+    photo,
+    push_receipt,
+    sync_sequence,
+)
 
 config = context.config
 
@@ -19,7 +25,7 @@ target_metadata = Base.metadata
 
 
 def get_url() -> str:
-    return str(settings.database_url)
+    return sync_database_url(str(settings.database_url))
 
 
 def run_migrations_offline() -> None:
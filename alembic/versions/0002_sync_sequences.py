@@ -0,0 +1,49 @@
+"""sync sequence allocator
+
+Revision ID: 0002_sync_sequences
+Revises: 0001_init
+Create Date: 2026-10-18 00:00:01
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0002_sync_sequences"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+SEQUENCE_NAME = "pasto_entries_updated_seq"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_sequences",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("value", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        sa.text(
+            "INSERT INTO sync_sequences (name, value) "
+            "SELECT :name, COALESCE(MAX(updated_seq), 0) FROM pasto_entries"
+        ).bindparams(name=SEQUENCE_NAME)
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.CreateSequence(sa.Sequence(SEQUENCE_NAME)))
+        op.execute(
+            sa.text(
+                "SELECT setval(:name, COALESCE(MAX(updated_seq), 0) + 1, false) "
+                "FROM pasto_entries"
+            ).bindparams(name=SEQUENCE_NAME)
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.DropSequence(sa.Sequence(SEQUENCE_NAME)))
+    op.drop_table("sync_sequences")
@@ -0,0 +1,29 @@
+"""photo content hash
+
+Revision ID: 0003_photo_content_hash
+Revises: 0002_sync_sequences
+Create Date: 2026-10-18 00:00:02
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0003_photo_content_hash"
+down_revision = "0002_sync_sequences"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "pasto_entry_photos",
+        sa.Column("content_hash", sa.String(length=64), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("pasto_entry_photos", "content_hash")
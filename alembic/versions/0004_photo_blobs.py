@@ -0,0 +1,45 @@
+"""content-addressed photo blobs
+
+Revision ID: 0004_photo_blobs
+Revises: 0003_photo_content_hash
+Create Date: 2026-10-18 00:00:03
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0004_photo_blobs"
+down_revision = "0003_photo_content_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "photo_blobs",
+        sa.Column("content_hash", sa.String(length=64), primary_key=True),
+        sa.Column("storage_key", sa.String(length=512), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column("orphaned_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_photo_blobs_orphaned",
+        "photo_blobs",
+        ["ref_count", "orphaned_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_photo_blobs_orphaned", table_name="photo_blobs")
+    op.drop_table("photo_blobs")
@@ -0,0 +1,57 @@
+"""keyset pagination indexes for pasto entries
+
+Revision ID: 0005_entry_keyset_indexes
+Revises: 0004_photo_blobs
+Create Date: 2026-10-18 00:00:04
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0005_entry_keyset_indexes"
+down_revision = "0004_photo_blobs"
+branch_labels = None
+depends_on = None
+
+LIVE_ROWS = sa.text("deleted_at IS NULL")
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_pasto_entries_created_id", "pasto_entries", ["created_at", "id"]
+    )
+    op.create_index(
+        "ix_pasto_entries_device_created_id",
+        "pasto_entries",
+        ["device_id", "created_at", "id"],
+    )
+
+    # The default listing hides deleted rows; on PostgreSQL give it indexes
+    # that only hold live rows.
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_index(
+            "ix_pasto_entries_live_created_id",
+            "pasto_entries",
+            ["created_at", "id"],
+            postgresql_where=LIVE_ROWS,
+        )
+        op.create_index(
+            "ix_pasto_entries_live_device_created_id",
+            "pasto_entries",
+            ["device_id", "created_at", "id"],
+            postgresql_where=LIVE_ROWS,
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index(
+            "ix_pasto_entries_live_device_created_id", table_name="pasto_entries"
+        )
+        op.drop_index("ix_pasto_entries_live_created_id", table_name="pasto_entries")
+    op.drop_index("ix_pasto_entries_device_created_id", table_name="pasto_entries")
+    op.drop_index("ix_pasto_entries_created_id", table_name="pasto_entries")
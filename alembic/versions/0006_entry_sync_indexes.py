@@ -0,0 +1,34 @@
+"""composite indexes for the sync paths
+
+Revision ID: 0006_entry_sync_indexes
+Revises: 0005_entry_keyset_indexes
+Create Date: 2026-10-18 00:00:05
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0006_entry_sync_indexes"
+down_revision = "0005_entry_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_pasto_entries_device_seq", "pasto_entries", ["device_id", "updated_seq"]
+    )
+    # Every device_id lookup is now served by a composite index that starts
+    # with device_id, so the single-column one only costs writes.
+    op.drop_index("ix_pasto_entries_device_id", table_name="pasto_entries")
+    # Nearly every row has deleted_at NULL, so this index never narrows a
+    # query and only tempts planners away from the ordered indexes.
+    op.drop_index("ix_pasto_entries_deleted_at", table_name="pasto_entries")
+
+
+def downgrade() -> None:
+    op.create_index("ix_pasto_entries_deleted_at", "pasto_entries", ["deleted_at"])
+    op.create_index("ix_pasto_entries_device_id", "pasto_entries", ["device_id"])
+    op.drop_index("ix_pasto_entries_device_seq", table_name="pasto_entries")
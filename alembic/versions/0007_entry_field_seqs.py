@@ -0,0 +1,26 @@
+"""per-field change tracking for delta sync
+
+Revision ID: 0007_entry_field_seqs
+Revises: 0006_entry_sync_indexes
+Create Date: 2026-10-18 00:00:06
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0007_entry_field_seqs"
+down_revision = "0006_entry_sync_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("pasto_entries", sa.Column("field_seqs", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("pasto_entries", "field_seqs")
@@ -0,0 +1,35 @@
+"""idempotency receipts for push batches
+
+Revision ID: 0008_sync_push_receipts
+Revises: 0007_entry_field_seqs
+Create Date: 2026-10-18 00:00:07
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0008_sync_push_receipts"
+down_revision = "0007_entry_field_seqs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_push_receipts",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_sync_push_receipts_created_at", "sync_push_receipts", ["created_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sync_push_receipts_created_at", table_name="sync_push_receipts")
+    op.drop_table("sync_push_receipts")
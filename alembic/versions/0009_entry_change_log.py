@@ -0,0 +1,60 @@
+"""append-only change log read by sync pulls
+
+Revision ID: 0009_entry_change_log
+Revises: 0008_sync_push_receipts
+Create Date: 2026-10-18 00:00:08
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+from pastoapp.core.config import settings
+
+revision = "0009_entry_change_log"
+down_revision = "0008_sync_push_receipts"
+branch_labels = None
+depends_on = None
+
+TABLE = "pasto_entry_changes"
+
+
+def upgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+    op.create_table(
+        TABLE,
+        sa.Column("scope", sa.String(length=128), nullable=False),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.Column("entry_uuid", sa.Uuid(as_uuid=True), nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("scope", "seq", "entry_uuid"),
+        postgresql_partition_by="RANGE (seq)",
+    )
+    op.create_index("ix_pasto_entry_changes_seq", TABLE, ["seq"])
+
+    if is_postgresql:
+        # Ranges covering existing history plus the next one; later ranges
+        # are added by the change log maintenance loop.
+        size = settings.change_log_partition_size
+        last = op.get_bind().scalar(
+            sa.text("SELECT COALESCE(MAX(updated_seq), 0) FROM pasto_entries")
+        )
+        for index in range(int(last) // size + 2):
+            op.execute(
+                f"CREATE TABLE {TABLE}_p{index} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ({index * size}) TO ({(index + 1) * size})"
+            )
+        op.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    op.execute(
+        f"INSERT INTO {TABLE} (scope, seq, entry_uuid, changed_at) "
+        "SELECT COALESCE(device_id, ''), updated_seq, uuid, updated_at "
+        "FROM pasto_entries"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pasto_entry_changes_seq", table_name=TABLE)
+    op.drop_table(TABLE)
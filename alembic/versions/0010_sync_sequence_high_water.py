@@ -0,0 +1,38 @@
+"""keep the sync_sequences row as the committed high-water mark on PostgreSQL
+
+Revision ID: 0010_sync_sequence_high_water
+Revises: 0009_entry_change_log
+Create Date: 2026-10-18 00:00:09
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0010_sync_sequence_high_water"
+down_revision = "0009_entry_change_log"
+branch_labels = None
+depends_on = None
+
+SEQUENCE_NAME = "pasto_entries_updated_seq"
+
+
+def upgrade() -> None:
+    # Until now PostgreSQL allocations only advanced the sequence, leaving
+    # the row at its seed value; allocations keep it current from here on.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(
+        sa.text(
+            "UPDATE sync_sequences SET value = GREATEST(value, "
+            "(SELECT COALESCE(MAX(updated_seq), 0) FROM pasto_entries)) "
+            "WHERE name = :name"
+        ).bindparams(name=SEQUENCE_NAME)
+    )
+
+
+def downgrade() -> None:
+    pass
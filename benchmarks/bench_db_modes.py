@@ -0,0 +1,137 @@
+"""Compare requests/sec of the sync (threadpool) and async database modes.
+
+Usage:
+    python benchmarks/bench_db_modes.py [--requests 2000] [--concurrency 100]
+        [--sync-url sqlite+pysqlite:///bench.db]
+        [--async-url sqlite+aiosqlite:///bench.db]
+
+Both modes run in-process against a fresh database each; point the URLs at a
+PostgreSQL instance (psycopg2 / asyncpg) for numbers closer to production.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections.abc import AsyncGenerator, Generator
+from datetime import UTC, datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from pastoapp.db.base import Base  # noqa: E402
+from pastoapp.db.session import get_db  # noqa: E402
+from pastoapp.main import app  # noqa: E402
+
+
+def _entry(lot: str) -> dict:
+    now = datetime.now(tz=UTC).isoformat()
+    return {
+        "uuid": str(uuid.uuid4()),
+        "lotNumber": lot,
+        "entryTime": now,
+        "exitTime": now,
+        "createdAt": now,
+    }
+
+
+async def _drive(total: int, concurrency: int) -> float:
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for index in range(total):
+            queue.put_nowait(index)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if index % 4 == 0:
+                    response = await client.post(
+                        "/api/sync/pasto/push",
+                        json={"deviceId": "bench", "items": [_entry(f"L{index}")]},
+                    )
+                else:
+                    response = await client.get(
+                        "/api/sync/pasto/pull", params={"cursor": 0, "limit": 50}
+                    )
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - started)
+
+
+async def _run_sync(url: str, total: int, concurrency: int) -> float:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    def override() -> Generator[Session, None, None]:
+        db = factory()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    try:
+        return await _drive(total, concurrency)
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+async def _run_async(url: str, total: int, concurrency: int) -> float:
+    engine = create_async_engine(url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override() -> AsyncGenerator:
+        async with factory() as db:
+            yield db
+            await db.commit()
+
+    app.dependency_overrides[get_db] = override
+    try:
+        return await _drive(total, concurrency)
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sync-url")
+    parser.add_argument("--async-url")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_url = args.sync_url or f"sqlite+pysqlite:///{tmp}/sync.db"
+        async_url = args.async_url or f"sqlite+aiosqlite:///{tmp}/async.db"
+        sync_rps = asyncio.run(_run_sync(sync_url, args.requests, args.concurrency))
+        async_rps = asyncio.run(_run_async(async_url, args.requests, args.concurrency))
+
+    print(f"{'mode':<8}{'req/s':>10}")
+    print(f"{'sync':<8}{sync_rps:>10.1f}")
+    print(f"{'async':<8}{async_rps:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measure wire bytes and CPU per pull response for each serializer/encoding.
+
+Usage:
+    python benchmarks/bench_payloads.py [--sizes 100,500,1000] [--repeat 50]
+
+Serializers are timed from ORM-like rows to JSON bytes; encodings are timed
+on the bytes produced by the serializer the API uses. zstd and brotli rows
+only appear when the optional ``speedups`` extra is installed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from pastoapp.core.compression import available_encodings  # noqa: E402
+from pastoapp.core.config import settings  # noqa: E402
+from pastoapp.schemas.pasto_entry import PastoEntryRead  # noqa: E402
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+ENTRY_LIST = TypeAdapter(list[PastoEntryRead])
+
+
+def _rows(count: int) -> list[SimpleNamespace]:
+    start = datetime(2026, 3, 1, 6, tzinfo=UTC)
+    rows = []
+    for index in range(count):
+        created = start + timedelta(minutes=7 * index)
+        rows.append(
+            SimpleNamespace(
+                id=index + 1,
+                uuid=uuid.uuid4(),
+                lot_number=f"Lote {index % 12 + 1}",
+                entry_time=created,
+                exit_time=created + timedelta(hours=3),
+                created_at=created,
+                updated_at=created + timedelta(seconds=5),
+                deleted_at=None,
+                device_id=f"device-{index % 4}",
+                updated_seq=index + 1,
+            )
+        )
+    return rows
+
+
+def _fastapi_default(rows: list) -> bytes:
+    # What FastAPI does for response_model: validate, dump to dicts, json.dumps.
+    value = ENTRY_LIST.validate_python(rows, from_attributes=True)
+    content = ENTRY_LIST.dump_python(value, mode="json", by_alias=True)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _orjson(rows: list) -> bytes:
+    value = ENTRY_LIST.validate_python(rows, from_attributes=True)
+    return orjson.dumps(ENTRY_LIST.dump_python(value, mode="json", by_alias=True))
+
+
+def _dump_json(rows: list) -> bytes:
+    value = ENTRY_LIST.validate_python(rows, from_attributes=True)
+    return ENTRY_LIST.dump_json(value, by_alias=True)
+
+
+def _cpu_ms(fn: Callable[[], object], repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) * 1000 / repeat
+
+
+def _compress(factory: Callable, body: bytes) -> bytes:
+    compressor = factory()
+    return compressor.compress(body) + compressor.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,500,1000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    serializers: dict[str, Callable[[list], bytes]] = {
+        "fastapi-default": _fastapi_default,
+        "pydantic-dump-json": _dump_json,
+    }
+    if orjson is not None:
+        serializers["orjson"] = _orjson
+    encodings = available_encodings(
+        settings.compression_gzip_level,
+        settings.compression_brotli_quality,
+        settings.compression_zstd_level,
+    )
+
+    print(f"{'rows':>6}  {'step':<20}{'bytes':>10}{'ratio':>8}{'cpu ms':>9}")
+    for size in (int(item) for item in args.sizes.split(",")):
+        rows = _rows(size)
+        for name, serialize in serializers.items():
+            body = serialize(rows)
+            cpu = _cpu_ms(partial(serialize, rows), args.repeat)
+            print(f"{size:>6}  {name:<20}{len(body):>10}{1:>8.2f}{cpu:>9.2f}")
+        body = _dump_json(rows)
+        for encoding, factory in encodings.items():
+            wire = _compress(factory, body)
+            cpu = _cpu_ms(partial(_compress, factory, body), args.repeat)
+            ratio = len(body) / len(wire)
+            print(f"{size:>6}  {encoding:<20}{len(wire):>10}{ratio:>8.2f}{cpu:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
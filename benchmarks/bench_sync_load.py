@@ -0,0 +1,347 @@
+"""Simulate a fleet of devices against the sync API and report per-endpoint latency.
+
+Usage:
+    python benchmarks/bench_sync_load.py [--entries 10000] [--devices 200]
+        [--cycles 5] [--photo-every 5] [--database-url URL] [--url URL]
+        [--save baseline.json] [--compare baseline.json] [--tolerance 0.2]
+
+The database is seeded with ``--entries`` entries spread over the fleet, then
+every device runs ``--cycles`` interleaved cycles: push a few new entries, a
+patch and a delete, pull from its cursor, read one entry, list a page and,
+every ``--photo-every`` cycles, upload a photo. All devices run concurrently.
+
+By default the app runs in-process on a temporary SQLite file (pass
+``--database-url`` for PostgreSQL); queries per request are counted with
+engine events. ``--url`` drives a running server instead (for example a
+local ``uvicorn pastoapp.main:app``), seeding it through push, without query
+counts.
+
+``--save`` writes the results as a baseline; ``--compare`` checks them
+against one and exits with status 1 when p95 latency or throughput got worse
+than ``--tolerance`` or an endpoint issues more queries than before.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Generator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlalchemy import Engine, create_engine, event  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from pastoapp.core.config import settings  # noqa: E402
+from pastoapp.db.base import Base  # noqa: E402
+from pastoapp.db.session import get_db  # noqa: E402
+from pastoapp.main import app  # noqa: E402
+
+SEED_BATCH = 500
+PUSH_ITEMS = 3
+# Uploads are stored as sent, so random bytes stand in for a photo.
+PHOTO_BYTES = os.urandom(64 * 1024)
+
+# Statement counter of the request running in the current task.
+_query_counter: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar(
+    "bench_query_counter", default=None
+)
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, list[int]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(
+        self, client: AsyncClient, name: str, method: str, url: str, **kwargs
+    ) -> dict | list | None:
+        counter = [0]
+        token = _query_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _query_counter.reset(token)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(elapsed * 1000)
+        self.queries[name].append(counter[0])
+        if response.headers.get("content-type", "").startswith("application/json"):
+            return response.json()
+        return None
+
+
+def _count_queries(engine: Engine) -> None:
+    def before_cursor_execute(*args) -> None:
+        counter = _query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _entry(rng: random.Random, when: datetime) -> dict:
+    return {
+        "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "lotNumber": f"Lote {rng.randint(1, 40)}",
+        "entryTime": when.isoformat(),
+        "exitTime": (when + timedelta(hours=rng.randint(1, 8))).isoformat(),
+        "createdAt": when.isoformat(),
+    }
+
+
+def _device_id(index: int) -> str:
+    return f"bench-device-{index:04d}"
+
+
+async def _seed(
+    client: AsyncClient, entries: int, devices: int, rng: random.Random
+) -> dict[str, list[str]]:
+    # Goes through push so sequences, the change log and caches stay coherent.
+    start = datetime.now(tz=UTC) - timedelta(days=365)
+    owned: dict[str, list[str]] = defaultdict(list)
+    for batch_start in range(0, entries, SEED_BATCH):
+        device = _device_id((batch_start // SEED_BATCH) % devices)
+        items = [
+            _entry(rng, start + timedelta(minutes=53 * index))
+            for index in range(batch_start, min(batch_start + SEED_BATCH, entries))
+        ]
+        response = await client.post(
+            "/api/sync/pasto/push", json={"deviceId": device, "items": items}
+        )
+        response.raise_for_status()
+        owned[device].extend(item["uuid"] for item in items)
+    return owned
+
+
+async def _device(
+    client: AsyncClient,
+    recorder: Recorder,
+    index: int,
+    cycles: int,
+    photo_every: int,
+    owned: list[str],
+    seed: int,
+) -> None:
+    rng = random.Random(seed * 100_003 + index)
+    device = _device_id(index)
+    headers = {"X-Device-Id": device}
+    cursor = 0
+    for cycle in range(cycles):
+        now = datetime.now(tz=UTC)
+        items = [_entry(rng, now) for _ in range(PUSH_ITEMS)]
+        body: dict = {"deviceId": device, "items": items}
+        if owned:
+            body["patches"] = [{"uuid": rng.choice(owned), "exitTime": now.isoformat()}]
+        if len(owned) > 1 and cycle % 2:
+            body["deletedIds"] = [owned.pop(rng.randrange(len(owned)))]
+        await recorder.request(
+            client,
+            "push",
+            "POST",
+            "/api/sync/pasto/push",
+            json=body,
+            headers={**headers, "Idempotency-Key": str(uuid.uuid4())},
+        )
+        owned.extend(item["uuid"] for item in items)
+
+        pulled = await recorder.request(
+            client,
+            "pull",
+            "GET",
+            "/api/sync/pasto/pull",
+            params={"cursor": cursor, "limit": 500},
+            headers=headers,
+        )
+        if isinstance(pulled, dict):
+            cursor = pulled["newCursor"]
+        await recorder.request(
+            client, "get", "GET", f"/api/pasto/entries/{rng.choice(owned)}"
+        )
+        await recorder.request(
+            client, "list", "GET", "/api/pasto/entries", params={"limit": 100}
+        )
+        if photo_every and cycle % photo_every == 0:
+            await recorder.request(
+                client,
+                "photo",
+                "POST",
+                f"/api/pasto/entries/{items[0]['uuid']}/photos",
+                files={"file": ("bench.jpg", PHOTO_BYTES, "image/jpeg")},
+            )
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _summarize(recorder: Recorder, elapsed: float, count_queries: bool) -> dict:
+    results = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        queries = recorder.queries[name]
+        results[name] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[name],
+            "p50Ms": round(_percentile(latencies, 50), 2),
+            "p95Ms": round(_percentile(latencies, 95), 2),
+            "p99Ms": round(_percentile(latencies, 99), 2),
+            "rps": round(len(latencies) / elapsed, 1),
+            "queries": round(sum(queries) / len(queries), 2) if count_queries else None,
+        }
+    return results
+
+
+def _print(results: dict) -> None:
+    header = f"{'endpoint':<8}{'reqs':>7}{'errs':>6}{'p50 ms':>9}{'p95 ms':>9}"
+    print(f"{header}{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+    for name, row in results.items():
+        queries = "-" if row["queries"] is None else f"{row['queries']:.2f}"
+        print(
+            f"{name:<8}{row['requests']:>7}{row['errors']:>6}{row['p50Ms']:>9.2f}"
+            f"{row['p95Ms']:>9.2f}{row['p99Ms']:>9.2f}{row['rps']:>9.1f}{queries:>9}"
+        )
+
+
+def _compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, old in baseline["endpoints"].items():
+        new = results.get(name)
+        if new is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        if new["p95Ms"] > old["p95Ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['p95Ms']} -> {new['p95Ms']} ms")
+        if new["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['rps']} -> {new['rps']} req/s")
+        if None not in (old["queries"], new["queries"]) and (
+            new["queries"] > old["queries"]
+        ):
+            regressions.append(f"{name}: queries {old['queries']} -> {new['queries']}")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors {old['errors']} -> {new['errors']}")
+    return regressions
+
+
+async def _run(args: argparse.Namespace, client: AsyncClient, counted: bool) -> dict:
+    rng = random.Random(args.seed)
+    owned = await _seed(client, args.entries, args.devices, rng)
+    recorder = Recorder()
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _device(
+                client,
+                recorder,
+                index,
+                args.cycles,
+                args.photo_every,
+                owned[_device_id(index)],
+                args.seed,
+            )
+            for index in range(args.devices)
+        )
+    )
+    return _summarize(recorder, time.perf_counter() - started, counted)
+
+
+async def _run_in_process(args: argparse.Namespace, tmp: str) -> dict:
+    url = args.database_url or f"sqlite+pysqlite:///{tmp}/bench.db"
+    connect_args = {"timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(
+        url, pool_size=50, max_overflow=50, connect_args=connect_args
+    )
+    Base.metadata.create_all(bind=engine)
+    _count_queries(engine)
+    factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    settings.media_root = tmp
+
+    def override() -> Generator[Session, None, None]:
+        db = factory()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport, base_url="http://bench", timeout=120
+        ) as client:
+            return await _run(args, client, counted=True)
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+async def _run_remote(args: argparse.Namespace) -> dict:
+    async with AsyncClient(base_url=args.url, timeout=120) as client:
+        return await _run(args, client, counted=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--photo-every", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url")
+    parser.add_argument("--url")
+    parser.add_argument("--save", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            results = asyncio.run(_run_remote(args))
+        else:
+            results = asyncio.run(_run_in_process(args, tmp))
+    _print(results)
+
+    config = {
+        key: getattr(args, key)
+        for key in ("entries", "devices", "cycles", "photo_every", "seed")
+    }
+    if args.save:
+        args.save.write_text(
+            json.dumps({"config": config, "endpoints": results}, indent=2) + "\n"
+        )
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["config"] != config:
+            print(f"warning: baseline was recorded with {baseline['config']}")
+        regressions = _compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Measure how API throughput scales with the number of server worker processes.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--server uvicorn]
+        [--duration 10] [--connections 64] [--clients 4] [--entries 2000]
+        [--write-ratio 0.05] [--database-url URL] [--port 8765]
+        [--save results.json]
+
+For every worker count the production launcher (``python -m pastoapp.server``)
+is started on ``--port`` and driven for ``--duration`` seconds by ``--clients``
+load processes sharing ``--connections`` keep-alive connections. Each request
+is an entry read, a list page or a pull; ``--write-ratio`` of them are pushes.
+The load generators run in their own processes so they do not become the
+bottleneck before the server does; leave them some cores.
+
+The default database is a temporary SQLite file, where writes from several
+workers serialize on the file lock; pass ``--database-url`` (PostgreSQL,
+already migrated) for numbers that reflect production. The database is
+seeded once with ``--entries`` entries through push.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from pastoapp.db.base import Base  # noqa: E402
+from pastoapp.db.session import sync_database_url  # noqa: E402
+from pastoapp.models import (  # noqa: E402, F401
+    change_log,
+    pasto_entry,
+    photo,
+    push_receipt,
+    sync_sequence,
+)
+from pastoapp.server import available_cpus  # noqa: E402
+
+SEED_BATCH = 500
+STARTUP_TIMEOUT = 60.0
+WARMUP_SECONDS = 2.0
+
+
+def _entry(rng: random.Random, when: datetime) -> dict:
+    return {
+        "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "lotNumber": f"Lote {rng.randint(1, 40)}",
+        "entryTime": when.isoformat(),
+        "exitTime": (when + timedelta(hours=rng.randint(1, 8))).isoformat(),
+        "createdAt": when.isoformat(),
+    }
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+async def _connection(
+    client: httpx.AsyncClient,
+    uuids: list[str],
+    write_ratio: float,
+    deadline: float,
+    measure_from: float,
+    rng: random.Random,
+    latencies: list[float],
+    errors: list[int],
+) -> None:
+    device = f"bench-load-{uuid.uuid4().hex[:12]}"
+    while time.perf_counter() < deadline:
+        read = rng.randrange(3)
+        if rng.random() < write_ratio:
+            now = datetime.now(tz=UTC)
+            request = client.build_request(
+                "POST",
+                "/api/sync/pasto/push",
+                json={"deviceId": device, "items": [_entry(rng, now)]},
+            )
+        elif read == 0:
+            request = client.build_request(
+                "GET", f"/api/pasto/entries/{rng.choice(uuids)}"
+            )
+        elif read == 1:
+            request = client.build_request(
+                "GET", "/api/pasto/entries", params={"limit": 50}
+            )
+        else:
+            request = client.build_request(
+                "GET",
+                "/api/sync/pasto/pull",
+                params={"cursor": rng.randrange(len(uuids)), "limit": 100},
+                headers={"X-Device-Id": device},
+            )
+        started = time.perf_counter()
+        try:
+            response = await client.send(request)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        if started < measure_from:
+            continue
+        if failed:
+            errors[0] += 1
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _load(
+    url: str,
+    uuids: list[str],
+    connections: int,
+    duration: float,
+    write_ratio: float,
+    seed: int,
+) -> tuple[list[float], int]:
+    limits = httpx.Limits(
+        max_connections=connections, max_keepalive_connections=connections
+    )
+    latencies: list[float] = []
+    errors = [0]
+    measure_from = time.perf_counter() + WARMUP_SECONDS
+    deadline = measure_from + duration
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        await asyncio.gather(
+            *(
+                _connection(
+                    client,
+                    uuids,
+                    write_ratio,
+                    deadline,
+                    measure_from,
+                    random.Random(seed * 10_007 + index),
+                    latencies,
+                    errors,
+                )
+                for index in range(connections)
+            )
+        )
+    return latencies, errors[0]
+
+
+def _load_process(args: tuple) -> tuple[list[float], int]:
+    return asyncio.run(_load(*args))
+
+
+def _seed(url: str, entries: int, rng: random.Random) -> list[str]:
+    start = datetime.now(tz=UTC) - timedelta(days=365)
+    uuids: list[str] = []
+    with httpx.Client(base_url=url, timeout=120) as client:
+        for batch_start in range(0, entries, SEED_BATCH):
+            items = [
+                _entry(rng, start + timedelta(minutes=53 * index))
+                for index in range(batch_start, min(batch_start + SEED_BATCH, entries))
+            ]
+            client.post(
+                "/api/sync/pasto/push",
+                json={"deviceId": "bench-seed", "items": items},
+            ).raise_for_status()
+            uuids.extend(item["uuid"] for item in items)
+    return uuids
+
+
+def _start_server(
+    args: argparse.Namespace, workers: int, env: dict
+) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        "-m",
+        "pastoapp.server",
+        "--server",
+        args.server,
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(args.port),
+        "--workers",
+        str(workers),
+    ]
+    process = subprocess.Popen(command, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{url}/api/status", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    _stop_server(process)
+    raise SystemExit("server did not start in time")
+
+
+def _stop_server(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _server_env(database_url: str, media_root: str) -> dict:
+    return {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "MEDIA_ROOT": media_root,
+        "LOG_LEVEL": "WARNING",
+        "METRICS_ENABLED": "false",
+        # Background loops would add noise that depends on the worker count.
+        "PHOTO_GC_INTERVAL_SECONDS": "0",
+        "SNAPSHOT_REFRESH_SECONDS": "0",
+        "CHANGE_LOG_MAINTENANCE_SECONDS": "0",
+        "WEB_MAX_REQUESTS": "0",
+    }
+
+
+def _run(args: argparse.Namespace, workers: int, env: dict, uuids: list[str]) -> dict:
+    process = _start_server(args, workers, env)
+    try:
+        url = f"http://127.0.0.1:{args.port}"
+        shares = [
+            args.connections // args.clients
+            + (1 if index < args.connections % args.clients else 0)
+            for index in range(args.clients)
+        ]
+        jobs = [
+            (url, uuids, share, args.duration, args.write_ratio, args.seed + index)
+            for index, share in enumerate(shares)
+            if share
+        ]
+        with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+            outcomes = pool.map(_load_process, jobs)
+    finally:
+        _stop_server(process)
+    latencies = [value for values, _ in outcomes for value in values]
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in outcomes),
+        "rps": round(len(latencies) / args.duration, 1),
+        "p50Ms": round(_percentile(latencies, 50), 2),
+        "p95Ms": round(_percentile(latencies, 95), 2),
+        "p99Ms": round(_percentile(latencies, 99), 2),
+    }
+
+
+def _print(rows: list[dict]) -> None:
+    base = rows[0]["rps"] or 1
+    header = f"{'workers':>8}{'reqs':>9}{'errs':>6}{'req/s':>10}"
+    print(f"{header}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for row in rows:
+        print(
+            f"{row['workers']:>8}{row['requests']:>9}{row['errors']:>6}"
+            f"{row['rps']:>10.1f}{row['rps'] / base:>8.2f}x{row['p50Ms']:>9.2f}"
+            f"{row['p95Ms']:>9.2f}{row['p99Ms']:>9.2f}"
+        )
+
+
+def _default_workers() -> str:
+    cpus = available_cpus()
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return ",".join(map(str, counts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=_default_workers())
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=max(available_cpus() // 2, 1))
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--save", type=Path)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    counts = [int(value) for value in args.workers.split(",") if value.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite+pysqlite:///{tmp}/bench.db"
+        engine = create_engine(sync_database_url(database_url))
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        env = _server_env(database_url, tmp)
+
+        process = _start_server(args, 1, env)
+        try:
+            uuids = _seed(
+                f"http://127.0.0.1:{args.port}", args.entries, random.Random(args.seed)
+            )
+        finally:
+            _stop_server(process)
+
+        rows = [_run(args, workers, env, uuids) for workers in counts]
+    _print(rows)
+
+    if args.save:
+        config = {
+            key: getattr(args, key)
+            for key in (
+                "server",
+                "duration",
+                "connections",
+                "clients",
+                "entries",
+                "write_ratio",
+                "seed",
+            )
+        }
+        args.save.write_text(
+            json.dumps({"config": config, "results": rows}, indent=2) + "\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
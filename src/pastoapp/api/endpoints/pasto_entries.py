@@ -1,101 +1,210 @@
 from __future__ import annotations
 
 import uuid
+from collections.abc import AsyncIterator
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
+from pydantic import TypeAdapter
+from sqlalchemy import Select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from pastoapp.api.ndjson import ndjson_lines, ndjson_response, wants_ndjson
+from pastoapp.api.responses import model_json_response
+from pastoapp.core.config import settings
 from pastoapp.crud.pasto_entry import (
+    decode_entry_cursor,
+    encode_entry_cursor,
+    entries_query,
+    entry_columns,
     get_entry,
     list_entries,
     soft_delete_entry,
-    upsert_entry,
     update_entry,
+    upsert_entry,
+)
+from pastoapp.crud.photo import (
+    StoredPhoto,
+    create_photo_record,
+    queue_photo_from_base64,
+    store_photo_from_base64,
+)
+from pastoapp.crud.photo_variant import queue_thumbnails
+from pastoapp.db.session import get_session, run_db, run_db_commit, stream_db
+from pastoapp.models.pasto_entry import PastoEntry
+from pastoapp.models.photo import PastoEntryPhoto
+from pastoapp.schemas.pasto_entry import (
+    PastoEntryCreate,
+    PastoEntryRead,
+    PastoEntryUpdate,
 )
-from pastoapp.crud.photo import create_photo_from_base64
-from pastoapp.db.session import get_db
-from pastoapp.schemas.pasto_entry import PastoEntryCreate, PastoEntryRead, PastoEntryUpdate
-
 
 router = APIRouter(prefix="/pasto/entries")
 
+_ENTRY = TypeAdapter(PastoEntryRead)
+_ENTRY_LIST = TypeAdapter(list[PastoEntryRead])
+
 
 def _device_id_from_header(device_id: str | None) -> str | None:
     return device_id
 
 
+async def _store_photo(photo_base64: str) -> tuple[StoredPhoto, str | None] | None:
+    # Runs before the entry is written: a bad payload fails the request with
+    # nothing written, and the file I/O stays outside the transaction.
+    if settings.photo_background_writes:
+        return None
+    try:
+        return await run_in_threadpool(store_photo_from_base64, photo_base64)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid photoBase64")
+
+
+def _save_entry(
+    db: Session,
+    entry_uuid: uuid.UUID | None,
+    payload: PastoEntryCreate | PastoEntryUpdate,
+    device_id: str | None,
+    stored: tuple[StoredPhoto, str | None] | None,
+) -> tuple[PastoEntry, PastoEntryPhoto | None]:
+    # The entry and its inline photo commit together or not at all.
+    if entry_uuid is None:
+        entry = upsert_entry(db, payload, device_id)
+    else:
+        entry = get_entry(db, entry_uuid, for_update=True)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Pasto entry not found")
+        entry = update_entry(db, entry, payload, device_id)
+    photo = None
+    if stored is not None:
+        photo = create_photo_record(db, entry.uuid, *stored)
+    return entry, photo
+
+
+def _delete_entry(db: Session, entry_uuid: uuid.UUID) -> PastoEntry | None:
+    entry = get_entry(db, entry_uuid, for_update=True)
+    return soft_delete_entry(db, entry) if entry is not None else None
+
+
+def _queue_photo_work(
+    entry_uuid: uuid.UUID, photo_base64: str | None, photo: PastoEntryPhoto | None
+) -> None:
+    if photo is not None:
+        queue_thumbnails(photo)
+    elif photo_base64:
+        # Background writes use their own session, so only once committed.
+        queue_photo_from_base64(entry_uuid, photo_base64)
+
+
 @router.post("", response_model=PastoEntryRead, status_code=status.HTTP_201_CREATED)
-def create_pasto_entry(
+async def create_pasto_entry(
     payload: PastoEntryCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session, scope="function"),
     x_device_id: str | None = Header(default=None, alias="X-Device-Id"),
-) -> PastoEntryRead:
+) -> Response:
     device_id = _device_id_from_header(x_device_id) or payload.device_id
-    entry = upsert_entry(db, payload, device_id)
-    if payload.photo_base64:
-        try:
-            create_photo_from_base64(db, entry.uuid, payload.photo_base64)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid photoBase64")
-    return entry
+    stored = await _store_photo(payload.photo_base64) if payload.photo_base64 else None
+    entry, photo = await run_db_commit(
+        db, _save_entry, None, payload, device_id, stored
+    )
+    _queue_photo_work(entry.uuid, payload.photo_base64, photo)
+    return model_json_response(_ENTRY, entry, status_code=status.HTTP_201_CREATED)
+
+
+async def _entry_lines(db: Session, stmt: Select, limit: int) -> AsyncIterator[bytes]:
+    # One line per entry; a full page ends with {"nextCursor": ...}.
+    count = 0
+    last = None
+    async for rows in stream_db(db, entry_columns(stmt)):
+        count += len(rows)
+        last = rows[-1]
+        yield ndjson_lines(PastoEntryRead.model_validate(row) for row in rows)
+    if count == limit:
+        yield ndjson_lines([{"nextCursor": encode_entry_cursor(last)}])
 
 
 @router.get("", response_model=list[PastoEntryRead])
-def list_pasto_entries(
-    db: Session = Depends(get_db),
+async def list_pasto_entries(
+    db: Session = Depends(get_session),
     x_device_id: str | None = Header(default=None, alias="X-Device-Id"),
+    accept: str | None = Header(default=None),
     device_id: str | None = Query(default=None),
     updated_since: datetime | None = Query(default=None, alias="updated_since"),
     include_deleted: bool = Query(default=False),
     limit: int = Query(default=100, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
-) -> list[PastoEntryRead]:
+    after: str | None = Query(default=None),
+) -> Response:
     resolved_device_id = x_device_id or device_id
-    return list_entries(
-        db=db,
+    try:
+        after_key = decode_entry_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+    if wants_ndjson(accept):
+        stmt = entries_query(
+            resolved_device_id, updated_since, include_deleted, limit, offset, after_key
+        )
+        return ndjson_response(_entry_lines(db, stmt, limit))
+
+    entries = await run_db(
+        db,
+        list_entries,
         device_id=resolved_device_id,
         updated_since=updated_since,
         include_deleted=include_deleted,
         limit=limit,
         offset=offset,
+        after=after_key,
     )
+    headers = {}
+    if len(entries) == limit:
+        headers["X-Next-Cursor"] = encode_entry_cursor(entries[-1])
+    return model_json_response(_ENTRY_LIST, entries, headers)
 
 
 @router.get("/{entry_uuid}", response_model=PastoEntryRead)
-def get_pasto_entry(
-    entry_uuid: uuid.UUID, db: Session = Depends(get_db)
-) -> PastoEntryRead:
-    entry = get_entry(db, entry_uuid)
+async def get_pasto_entry(
+    entry_uuid: uuid.UUID, db: Session = Depends(get_session)
+) -> Response:
+    entry = await run_db(db, get_entry, entry_uuid)
     if not entry:
         raise HTTPException(status_code=404, detail="Pasto entry not found")
-    return entry
+    return model_json_response(_ENTRY, entry)
 
 
 @router.patch("/{entry_uuid}", response_model=PastoEntryRead)
-def patch_pasto_entry(
+async def patch_pasto_entry(
     entry_uuid: uuid.UUID,
     payload: PastoEntryUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session, scope="function"),
     x_device_id: str | None = Header(default=None, alias="X-Device-Id"),
-) -> PastoEntryRead:
-    entry = get_entry(db, entry_uuid)
-    if not entry:
+) -> Response:
+    # Cached lookup, only so an unknown uuid fails before the photo is
+    # decoded; _save_entry reads the row again, locked, to write it.
+    if not await run_db(db, get_entry, entry_uuid):
         raise HTTPException(status_code=404, detail="Pasto entry not found")
     device_id = x_device_id or payload.device_id
-    updated = update_entry(db, entry, payload, device_id)
-    if payload.photo_base64:
-        try:
-            create_photo_from_base64(db, updated.uuid, payload.photo_base64)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid photoBase64")
-    return updated
+    stored = await _store_photo(payload.photo_base64) if payload.photo_base64 else None
+    updated, photo = await run_db_commit(
+        db, _save_entry, entry_uuid, payload, device_id, stored
+    )
+    _queue_photo_work(updated.uuid, payload.photo_base64, photo)
+    return model_json_response(_ENTRY, updated)
 
 
 @router.delete("/{entry_uuid}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_pasto_entry(entry_uuid: uuid.UUID, db: Session = Depends(get_db)) -> None:
-    entry = get_entry(db, entry_uuid)
-    if not entry:
+async def delete_pasto_entry(
+    entry_uuid: uuid.UUID, db: Session = Depends(get_session, scope="function")
+) -> None:
+    if await run_db_commit(db, _delete_entry, entry_uuid) is None:
         raise HTTPException(status_code=404, detail="Pasto entry not found")
-    soft_delete_entry(db, entry)
     return None
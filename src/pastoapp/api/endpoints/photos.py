@@ -1,75 +1,167 @@
 from __future__ import annotations
 
+import os
 import uuid
 from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from pastoapp.api.responses import model_json_response
 from pastoapp.core.config import settings
 from pastoapp.crud.photo import (
-    delete_photo as delete_photo_record,
+    PhotoTooLargeError,
+    create_photo_record,
     get_photo,
     list_photos,
+    store_photo_stream,
+)
+from pastoapp.crud.photo import (
+    delete_photo as delete_photo_record,
 )
-from pastoapp.db.session import get_db
+from pastoapp.crud.photo_variant import (
+    UnsupportedImageError,
+    VariantSpec,
+    VariantsUnavailableError,
+    get_or_create_variant,
+    queue_thumbnails,
+    variant_id,
+)
+from pastoapp.db.session import get_session, run_db, run_db_commit
 from pastoapp.models.photo import PastoEntryPhoto
 from pastoapp.schemas.photo import PhotoRead
 
-
 router = APIRouter()
 
+# Stored photos never change, so any cache may keep them for good.
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_PHOTO = TypeAdapter(PhotoRead)
+_PHOTO_LIST = TypeAdapter(list[PhotoRead])
+
 
-@router.post("/pasto/entries/{entry_uuid}/photos", response_model=PhotoRead, status_code=status.HTTP_201_CREATED)
-def upload_photo(
+def _photo_etag(photo: PastoEntryPhoto) -> str:
+    return f'"{photo.content_hash or photo.uuid.hex}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+@router.post(
+    "/pasto/entries/{entry_uuid}/photos",
+    response_model=PhotoRead,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_photo(
     entry_uuid: uuid.UUID,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-) -> PhotoRead:
-    contents = file.file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Empty file")
-
-    photo_id = uuid.uuid4()
-    storage_key = f"pasto/{entry_uuid}/{photo_id}.bin"
-    file_path = Path(settings.media_root) / storage_key
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    file_path.write_bytes(contents)
-
-    photo = PastoEntryPhoto(
-        id=photo_id,
-        entry_uuid=entry_uuid,
-        storage_key=storage_key,
-        mime_type=file.content_type,
-        size=len(contents),
+    db: Session = Depends(get_session, scope="function"),
+) -> Response:
+    try:
+        stored = await run_in_threadpool(store_photo_stream, file.file)
+    except PhotoTooLargeError:
+        raise HTTPException(status_code=413, detail="Photo too large") from None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Empty file") from None
+    photo = await run_db_commit(
+        db, create_photo_record, entry_uuid, stored, file.content_type
     )
-    db.add(photo)
-    db.commit()
-    db.refresh(photo)
-    return photo
+    queue_thumbnails(photo)
+    return model_json_response(_PHOTO, photo, status_code=status.HTTP_201_CREATED)
 
 
 @router.get("/pasto/entries/{entry_uuid}/photos", response_model=list[PhotoRead])
-def list_entry_photos(entry_uuid: uuid.UUID, db: Session = Depends(get_db)) -> list[PhotoRead]:
-    return list_photos(db, entry_uuid)
+async def list_entry_photos(
+    entry_uuid: uuid.UUID, db: Session = Depends(get_session)
+) -> Response:
+    photos = await run_db(db, list_photos, entry_uuid)
+    return model_json_response(_PHOTO_LIST, photos)
 
 
-@router.get("/photos/{photo_uuid}/content")
-def get_photo_content(photo_uuid: uuid.UUID, db: Session = Depends(get_db)) -> FileResponse:
-    photo = get_photo(db, photo_uuid)
+@router.api_route("/photos/{photo_uuid}/content", methods=["GET", "HEAD"])
+async def get_photo_content(
+    photo_uuid: uuid.UUID,
+    request: Request,
+    db: Session = Depends(get_session),
+    width: int | None = Query(default=None, alias="w", ge=16),
+    image_format: Literal["jpeg", "webp", "png"] | None = Query(
+        default=None, alias="format"
+    ),
+    quality: int | None = Query(default=None, alias="q", ge=1, le=95),
+) -> Response:
+    photo = await run_db(db, get_photo, photo_uuid)
     if not photo or photo.deleted_at:
         raise HTTPException(status_code=404, detail="Photo not found")
+
+    spec = None
+    if width is not None or image_format is not None or quality is not None:
+        max_width = settings.photo_variant_max_width
+        spec = VariantSpec(
+            width=min(width or max_width, max_width),
+            image_format=image_format or "webp",
+            quality=quality or 80,
+        )
+
+    etag = _photo_etag(photo)
+    if spec is not None:
+        etag = f'{etag[:-1]}-{spec.filename()}"'
+    headers = {"ETag": etag, "Cache-Control": PHOTO_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     file_path = Path(settings.media_root) / photo.storage_key
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Photo content not found")
-    return FileResponse(file_path, media_type=photo.mime_type or "application/octet-stream")
+    media_type = photo.mime_type or "application/octet-stream"
+    try:
+        if spec is not None:
+            file_path = await run_in_threadpool(
+                get_or_create_variant, variant_id(photo), photo.storage_key, spec
+            )
+            media_type = spec.media_type
+        stat_result = await run_in_threadpool(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Photo content not found") from None
+    except VariantsUnavailableError:
+        raise HTTPException(
+            status_code=501, detail="Image variants are not available"
+        ) from None
+    except UnsupportedImageError:
+        raise HTTPException(
+            status_code=415, detail="Photo is not a supported image"
+        ) from None
+    # FileResponse serves Range/If-Range requests against the ETag set here.
+    return FileResponse(
+        file_path,
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result,
+    )
 
 
 @router.delete("/photos/{photo_uuid}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_photo(photo_uuid: uuid.UUID, db: Session = Depends(get_db)) -> None:
-    photo = get_photo(db, photo_uuid)
+async def delete_photo(
+    photo_uuid: uuid.UUID, db: Session = Depends(get_session, scope="function")
+) -> None:
+    photo = await run_db(db, get_photo, photo_uuid)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
-    delete_photo_record(db, photo)
+    await run_db_commit(db, delete_photo_record, photo)
     return None
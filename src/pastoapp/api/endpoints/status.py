@@ -1,10 +1,36 @@
 from __future__ import annotations
 
+from typing import Any
+
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 
+from pastoapp.core.metrics import render_metrics
+from pastoapp.crud.pasto_entry import entry_cache
+from pastoapp.db.pool import pool_status
+from pastoapp.db.session import request_engine
 
 router = APIRouter()
 
+
 @router.get("/status")
 def status_check() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@router.get("/status/db-pool")
+def db_pool_status() -> dict[str, Any]:
+    return pool_status(request_engine.pool)
+
+
+@router.get("/status/entry-cache")
+def entry_cache_status() -> dict[str, Any]:
+    return entry_cache.snapshot()
+
+
+@router.get("/status/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Request histograms in the Prometheus text format (METRICS_ENABLED)."""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
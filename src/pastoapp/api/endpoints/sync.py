@@ -1,75 +1,195 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import uuid
-from datetime import datetime, timezone
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from typing import Any, Literal
 
 from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from pastoapp.api.ndjson import (
+    NDJSON_MEDIA_TYPE,
+    ndjson_lines,
+    ndjson_response,
+    wants_ndjson,
+)
+from pastoapp.api.responses import FastJSONResponse, model_json_response
+from pastoapp.core.config import settings
 from pastoapp.crud.pasto_entry import (
-    get_entry,
+    entries_by_cursor_query,
+    entry_columns,
     get_max_updated_seq,
     list_entries_by_cursor,
-    soft_delete_entry,
-    upsert_entry,
+    push_entries,
+)
+from pastoapp.crud.push_receipt import (
+    get_push_receipt,
+    receipt_key,
+    save_push_receipt,
 )
-from pastoapp.db.session import get_db
+from pastoapp.crud.snapshot import latest_snapshot, run_snapshot_refresh
+from pastoapp.db.changes import change_notifier
+from pastoapp.db.session import get_session, run_db, run_db_commit, stream_db
+from pastoapp.models.pasto_entry import PastoEntry
 from pastoapp.schemas.pasto_entry import PastoEntryRead
 from pastoapp.schemas.sync import (
+    SyncDeltaPullResponse,
     SyncPullResponse,
     SyncPushRequest,
     SyncPushResponse,
-    SyncRejectedItem,
 )
 
-
 router = APIRouter(prefix="/sync/pasto")
 
+_PULL_RESPONSE = TypeAdapter(SyncPullResponse)
+_DELTA_RESPONSE = TypeAdapter(SyncDeltaPullResponse)
+
+# Wire name, entry attribute and the field_seqs key that tracks it. id and
+# createdAt never change after insert, so they ride on created_at; deletedAt
+# has no key and is sent for every tombstone.
+_DELTA_FIELDS = (
+    ("id", "id", "created_at"),
+    ("lotNumber", "lot_number", "lot_number"),
+    ("entryTime", "entry_time", "entry_time"),
+    ("exitTime", "exit_time", "exit_time"),
+    ("createdAt", "created_at", "created_at"),
+    ("deviceId", "device_id", "device_id"),
+    ("deletedAt", "deleted_at", None),
+)
+
 
 @router.post("/push", response_model=SyncPushResponse)
-def push_pasto_entries(
+async def push_pasto_entries(
     payload: SyncPushRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session, scope="function"),
     x_device_id: str | None = Header(default=None, alias="X-Device-Id"),
-) -> SyncPushResponse:
-    accepted: list[uuid.UUID] = []
-    rejected: list[SyncRejectedItem] = []
+    idempotency_key: str | None = Header(
+        default=None, alias="Idempotency-Key", max_length=255
+    ),
+) -> SyncPushResponse | Response:
     device_id = x_device_id or payload.device_id
+    idempotency_key = idempotency_key or payload.idempotency_key
+    key = receipt_key(device_id, idempotency_key) if idempotency_key else None
+    if key is not None:
+        # A retried batch gets the original answer without touching entries.
+        stored = await run_db(db, get_push_receipt, key)
+        if stored is not None:
+            return FastJSONResponse(stored, headers={"Idempotent-Replayed": "true"})
 
-    for item in payload.items:
-        try:
-            entry = upsert_entry(db, item, device_id)
-            accepted.append(entry.uuid)
-        except Exception as exc:  # pragma: no cover - defensive
-            rejected.append(
-                SyncRejectedItem(id=item.id or uuid.UUID(int=0), reason=str(exc))
-            )
-
-    for deleted_id in payload.deleted_ids:
-        entry = get_entry(db, deleted_id)
-        if entry:
-            soft_delete_entry(db, entry)
+    return await run_db_commit(db, _apply_push, payload, device_id, key)
 
-    latest_seq = get_max_updated_seq(db)
 
-    return SyncPushResponse(
+def _apply_push(
+    db: Session, payload: SyncPushRequest, device_id: str | None, key: str | None
+) -> SyncPushResponse:
+    # The entries and the receipt that replays their answer commit together.
+    accepted, rejected, unknown_deleted = push_entries(
+        db, payload.items, device_id, payload.patches, payload.deleted_ids
+    )
+    response = SyncPushResponse(
         accepted=accepted,
         rejected=rejected,
-        server_time=datetime.now(tz=timezone.utc),
-        new_cursor=latest_seq,
+        unknown_deleted_ids=unknown_deleted,
+        server_time=datetime.now(tz=UTC),
+        new_cursor=get_max_updated_seq(db),
     )
+    if key is not None:
+        save_push_receipt(db, key, response.model_dump(mode="json", by_alias=True))
+    return response
+
+
+async def _wait_for_entries(
+    db: Session, cursor: int, limit: int, device_id: str | None, wait: float
+) -> list[PastoEntry]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    # Anything committed before the query below is visible to it, so only
+    # later commits are worth waking up for.
+    seen = max(cursor, change_notifier.latest)
+    while True:
+        entries = await run_db(db, list_entries_by_cursor, cursor, limit, device_id)
+        remaining = deadline - loop.time()
+        if entries or remaining <= 0:
+            return entries
+        # Long poll: hand the connection back to the pool while idle and
+        # query again only once a newer updated_seq has been committed.
+        await run_db(db, Session.rollback)
+        newest = await change_notifier.wait_for(seen, remaining)
+        if newest is None:
+            return entries
+        seen = newest
 
 
-@router.get("/pull", response_model=SyncPullResponse)
-def pull_pasto_entries(
-    db: Session = Depends(get_db),
+async def _pull_lines(
+    db: Session, cursor: int, limit: int, device_id: str | None
+) -> AsyncIterator[bytes]:
+    # One line per live entry, {"deleted": uuid} per tombstone, and a
+    # closing {"newCursor": n}.
+    stmt = entry_columns(entries_by_cursor_query(cursor, limit, device_id))
+    new_cursor = cursor
+    async for rows in stream_db(db, stmt):
+        records: list[PastoEntryRead | dict] = []
+        for row in rows:
+            new_cursor = max(new_cursor, row.updated_seq or 0)
+            if row.deleted_at:
+                records.append({"deleted": row.uuid})
+            else:
+                records.append(PastoEntryRead.model_validate(row))
+        yield ndjson_lines(records)
+    yield ndjson_lines([{"newCursor": new_cursor}])
+
+
+def _delta_row(entry: PastoEntry, cursor: int) -> list[Any]:
+    # Rows written before field tracking existed carry every field.
+    field_seqs = entry.field_seqs
+    mask = 0
+    values = []
+    for bit, (_, attribute, key) in enumerate(_DELTA_FIELDS):
+        if key is None:
+            changed = entry.deleted_at is not None
+        else:
+            changed = field_seqs is None or field_seqs.get(key, 0) > cursor
+        if changed:
+            mask |= 1 << bit
+            values.append(getattr(entry, attribute))
+    return [entry.uuid, entry.updated_seq, entry.updated_at, mask, *values]
+
+
+@router.get("/pull", response_model=SyncPullResponse | SyncDeltaPullResponse)
+async def pull_pasto_entries(
+    db: Session = Depends(get_session),
     x_device_id: str | None = Header(default=None, alias="X-Device-Id"),
+    accept: str | None = Header(default=None),
     cursor: int = Query(default=0, ge=0),
     limit: int = Query(default=500, ge=1, le=1000),
     device_id: str | None = Query(default=None),
-) -> SyncPullResponse:
+    wait: float = Query(default=0, ge=0, le=settings.sync_max_wait_seconds),
+    format: Literal["full", "delta"] = Query(default="full"),
+) -> Response:
     resolved_device_id = x_device_id or device_id
-    entries = list_entries_by_cursor(db, cursor, limit, resolved_device_id)
+    if format == "delta":
+        entries = await _wait_for_entries(db, cursor, limit, resolved_device_id, wait)
+        new_cursor = max((entry.updated_seq or 0 for entry in entries), default=cursor)
+        return model_json_response(
+            _DELTA_RESPONSE,
+            SyncDeltaPullResponse(
+                fields=[name for name, _, _ in _DELTA_FIELDS],
+                rows=[_delta_row(entry, cursor) for entry in entries],
+                new_cursor=max(cursor, new_cursor),
+            ),
+        )
+    if wants_ndjson(accept):
+        if wait:
+            await _wait_for_entries(db, cursor, 1, resolved_device_id, wait)
+        return ndjson_response(_pull_lines(db, cursor, limit, resolved_device_id))
+
+    entries = await _wait_for_entries(db, cursor, limit, resolved_device_id, wait)
     items: list[PastoEntryRead] = []
     deleted: list[uuid.UUID] = []
     max_cursor = cursor
@@ -80,4 +200,60 @@ def pull_pasto_entries(
         else:
             items.append(PastoEntryRead.model_validate(entry))
 
-    return SyncPullResponse(items=items, deleted=deleted, new_cursor=max_cursor)
+    return model_json_response(
+        _PULL_RESPONSE,
+        SyncPullResponse(items=items, deleted=deleted, new_cursor=max_cursor),
+    )
+
+
+@router.get("/snapshot")
+async def download_pasto_snapshot() -> FileResponse:
+    """Gzipped NDJSON of all live entries; pull from X-Snapshot-Seq afterwards."""
+    snapshot = await run_in_threadpool(latest_snapshot)
+    if snapshot is None:
+        # Built in a worker thread with its own session, as the periodic
+        # refresh does; in async mode run_db would gzip on the event loop.
+        snapshot = await run_in_threadpool(run_snapshot_refresh)
+    return FileResponse(
+        snapshot.path,
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={
+            "Content-Encoding": "gzip",
+            "Cache-Control": "no-cache",
+            "ETag": f'"snapshot-{snapshot.seq}"',
+            "X-Snapshot-Seq": str(snapshot.seq),
+        },
+    )
+
+
+async def change_events(
+    latest: int, cursor: int, heartbeat: float
+) -> AsyncIterator[str]:
+    """Server-Sent Events announcing updated_seq ranges newer than ``cursor``."""
+    while True:
+        if latest > cursor:
+            data = json.dumps({"fromSeq": cursor + 1, "toSeq": latest})
+            yield f"id: {latest}\nevent: change\ndata: {data}\n\n"
+            cursor = latest
+        newest = await change_notifier.wait_for(cursor, heartbeat)
+        if newest is None:
+            yield ": keepalive\n\n"
+        else:
+            latest = newest
+
+
+@router.get("/events")
+async def stream_pasto_changes(
+    db: Session = Depends(get_session),
+    cursor: int = Query(default=0, ge=0),
+    last_event_id: int | None = Header(default=None, alias="Last-Event-ID"),
+) -> StreamingResponse:
+    if last_event_id is not None:
+        cursor = max(cursor, last_event_id)
+    latest = max(await run_db(db, get_max_updated_seq), change_notifier.latest)
+    await run_db(db, Session.rollback)
+    return StreamingResponse(
+        change_events(latest, cursor, settings.sync_sse_heartbeat_seconds),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
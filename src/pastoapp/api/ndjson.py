@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from pastoapp.core.metrics import timed
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(accept: str | None) -> bool:
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+def ndjson_lines(records: Iterable[BaseModel | dict[str, Any]]) -> bytes:
+    lines = []
+    with timed("serialize"):
+        for record in records:
+            if isinstance(record, BaseModel):
+                lines.append(record.model_dump_json(by_alias=True).encode())
+            else:
+                lines.append(to_json(record))
+    return b"\n".join(lines) + b"\n" if lines else b""
+
+
+def ndjson_response(chunks: AsyncIterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE)
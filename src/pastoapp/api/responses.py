@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from pastoapp.core.metrics import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def model_json_response(
+    adapter: TypeAdapter,
+    value: Any,
+    headers: Mapping[str, str] | None = None,
+    status_code: int = 200,
+) -> Response:
+    # Validates ORM rows and writes JSON bytes in one pass inside pydantic,
+    # skipping the intermediate dicts FastAPI builds for response_model.
+    with timed("validate"):
+        validated = adapter.validate_python(value, from_attributes=True)
+    with timed("serialize"):
+        body = adapter.dump_json(validated, by_alias=True)
+    return Response(
+        body, status_code=status_code, media_type="application/json", headers=headers
+    )
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+
+from pydantic import TypeAdapter
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Any | None: ...
+
+    def set(self, key: str, value: Any) -> None: ...
+
+    def delete(self, *keys: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryCache:
+    # LRU bounded by entry count; entries also expire ttl_seconds after they
+    # were stored. Shared by every request thread in the process.
+    def __init__(self, max_items: int, ttl_seconds: float) -> None:
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class RedisCache:
+    """Cache shared by every worker, stored in Redis as JSON.
+
+    ``client`` needs only ``get``, ``set(..., ex=)``, ``delete`` and
+    ``scan_iter``, so tests can pass a small in-memory stand-in.
+    """
+
+    def __init__(
+        self, client: Any, ttl_seconds: float, adapter: TypeAdapter, prefix: str
+    ) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.adapter = adapter
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any | None:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return self.adapter.validate_json(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        self.client.set(
+            self.prefix + key,
+            self.adapter.dump_json(value),
+            ex=max(1, math.ceil(self.ttl_seconds)),
+        )
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def redis_client(url: str) -> Any:
+    try:
+        import redis
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "The redis cache backend needs the 'cache' extra (pip install redis)"
+        ) from exc
+    return redis.Redis.from_url(url)
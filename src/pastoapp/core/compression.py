@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import zlib
+from collections.abc import Callable
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+# Already compressed, or must reach the client unbuffered.
+EXCLUDED_CONTENT_TYPES = (
+    "text/event-stream",
+    "image/",
+    "video/",
+    "audio/",
+    "application/gzip",
+    "application/zip",
+)
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._stream = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._stream.compress(data)
+
+    def flush(self) -> bytes:
+        return self._stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._stream.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        self._stream = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._stream.process(data)
+
+    def flush(self) -> bytes:
+        return self._stream.flush()
+
+    def finish(self) -> bytes:
+        return self._stream.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int) -> None:
+        self._stream = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._stream.compress(data)
+
+    def flush(self) -> bytes:
+        return self._stream.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._stream.flush()
+
+
+def available_encodings(
+    gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3
+) -> dict[str, Callable[[], Compressor]]:
+    """Encoding -> compressor factory, most preferred first."""
+    encodings: dict[str, Callable[[], Compressor]] = {}
+    if zstandard is not None:
+        encodings["zstd"] = lambda: ZstdCompressor(zstd_level)
+    if brotli is not None:
+        encodings["br"] = lambda: BrotliCompressor(brotli_quality)
+    encodings["gzip"] = lambda: GzipCompressor(gzip_level)
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: list[str]) -> str | None:
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in supported:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class _CompressingSend:
+    """ASGI ``send`` wrapper that compresses one response.
+
+    The decision is made on the first body message: a complete body is
+    compressed when it reaches ``minimum_size``, a streamed one right away
+    unless its Content-Length says it is smaller, so streams are never held
+    back waiting for more bytes.
+    """
+
+    def __init__(
+        self,
+        send: Send,
+        minimum_size: int,
+        encoding: str,
+        factory: Callable[[], Compressor],
+    ) -> None:
+        self._send = send
+        self._minimum_size = minimum_size
+        self._encoding = encoding
+        self._factory = factory
+        self._start: Message | None = None
+        self._compressor: Compressor | None = None
+        self._passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if self._passthrough:
+            await self._send(message)
+            return
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            # Partial content must stay byte-identical to the stored file.
+            if (
+                "content-encoding" in headers
+                or "content-range" in headers
+                or content_type.startswith(EXCLUDED_CONTENT_TYPES)
+            ):
+                await self._pass(message)
+            else:
+                self._start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._pass(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._compressor is None:
+            if not self._should_compress(body, more_body):
+                await self._pass(message)
+                return
+            self._compressor = self._factory()
+            data = self._compress(body, more_body)
+            await self._send(self._compressed_start(data, more_body))
+        else:
+            data = self._compress(body, more_body)
+        await self._send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
+
+    async def _pass(self, message: Message) -> None:
+        self._passthrough = True
+        if self._start is not None:
+            await self._send(self._start)
+            self._start = None
+        await self._send(message)
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        if not more_body:
+            return len(body) >= self._minimum_size
+        content_length = Headers(raw=self._start["headers"]).get("content-length")
+        return content_length is None or int(content_length) >= self._minimum_size
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.compress(body)
+        # Flush each streamed chunk so NDJSON lines reach the client as
+        # they are produced instead of waiting for the compressor's window.
+        if more_body:
+            return data + self._compressor.flush()
+        return data + self._compressor.finish()
+
+    def _compressed_start(self, data: bytes, more_body: bool) -> Message:
+        start = {**self._start, "headers": list(self._start["headers"])}
+        self._start = None
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = self._encoding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(data))
+        return start
+
+
+class CompressionMiddleware:
+    """Negotiated zstd / brotli / gzip response compression.
+
+    Responses smaller than ``minimum_size`` and already encoded or excluded
+    content types pass through untouched. zstd and brotli are offered only
+    when their optional packages are installed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings(gzip_level, brotli_quality, zstd_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, list(self.encodings))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        send = _CompressingSend(
+            send, self.minimum_size, encoding, self.encodings[encoding]
+        )
+        await self.app(scope, receive, send)
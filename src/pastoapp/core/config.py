@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,6 +12,95 @@ class Settings(BaseSettings):
     cors_origins: str = "http://localhost:8080,http://127.0.0.1:8080"
     log_level: str = "INFO"
     media_root: str = "storage"
+    photo_max_bytes: int = 20 * 1024 * 1024
+    photo_chunk_size: int = 64 * 1024
+    photo_background_writes: bool = False
+    photo_gc_interval_seconds: int = 3600
+    photo_gc_grace_seconds: int = 3600
+    photo_variant_cache_bytes: int = 512 * 1024 * 1024
+    photo_variant_max_width: int = 2048
+    # Comma-separated widths rendered in the background right after upload.
+    photo_thumbnail_widths: str = ""
+    background_workers: int = 4
+
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # always: ping on every checkout; idle: only connections idle longer than
+    # db_pool_ping_idle_seconds; never: rely on db_pool_recycle alone.
+    db_pool_pre_ping: Literal["always", "idle", "never"] = "idle"
+    db_pool_ping_idle_seconds: float = 60.0
+    db_pgbouncer: bool = False
+
+    # local: long-poll/SSE waiters only hear about writes made by this
+    # process; postgres: writes are also broadcast with LISTEN/NOTIFY.
+    sync_notify_backend: Literal["local", "postgres"] = "local"
+    sync_max_wait_seconds: float = 60.0
+    sync_sse_heartbeat_seconds: float = 15.0
+    # How often the bootstrap snapshot is rebuilt when entries changed; 0
+    # builds it only on demand.
+    snapshot_refresh_seconds: int = 900
+    # Push batches sent with an Idempotency-Key get their first response
+    # replayed for this long. memory keeps receipts per process; database
+    # also stores them in sync_push_receipts so every worker sees them.
+    sync_idempotency_ttl_seconds: int = 24 * 3600
+    sync_idempotency_cache_size: int = 4096
+    sync_idempotency_store: Literal["memory", "database"] = "memory"
+    # Pulls read pasto_entry_changes. On PostgreSQL it is range-partitioned
+    # by seq in blocks of this size. Maintenance (creating upcoming
+    # partitions, compacting superseded rows) runs at this interval; 0 = off.
+    change_log_partition_size: int = 1_000_000
+    change_log_maintenance_seconds: int = 3600
+
+    # Read-through cache for single-entry lookups. memory is per process, so
+    # a write only evicts the copy held by the worker that made it; with
+    # several workers use redis (needs the cache extra) or a short TTL.
+    entry_cache_backend: Literal["none", "memory", "redis"] = "memory"
+    entry_cache_size: int = 10_000
+    entry_cache_ttl_seconds: float = 30.0
+    entry_cache_redis_url: str = "redis://localhost:6379/0"
+
+    # Per-request query counts, DB time and phase timings: Server-Timing
+    # headers plus histograms at /api/status/metrics. Off costs one check
+    # per request.
+    metrics_enabled: bool = False
+    # Dev/staging diagnostics; any of them also turns the middleware above
+    # on. query_debug logs requests that run one statement at least
+    # query_repeat_threshold times (N+1 loops) and, when slow_query_ms > 0,
+    # slower statements with their parameters and EXPLAIN output.
+    # profile_sample_rate of requests run under cProfile and are saved as
+    # .prof files in profile_dir.
+    query_debug: bool = False
+    query_repeat_threshold: int = 5
+    slow_query_ms: float = 0.0
+    profile_sample_rate: float = 0.0
+    profile_dir: str = "profiles"
+
+    # Responses below this many bytes are sent uncompressed.
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+
+    # Production launcher (python -m pastoapp.server). uvicorn runs its own
+    # supervisor; gunicorn (server extra) forks workers from a preloaded app
+    # and recycles them after web_max_requests (0 = never). web_workers 0
+    # starts one per available CPU. auto picks uvloop / httptools when
+    # installed and falls back to asyncio / h11.
+    web_server: Literal["uvicorn", "gunicorn"] = "uvicorn"
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 0
+    web_loop: Literal["auto", "uvloop", "asyncio"] = "auto"
+    web_http: Literal["auto", "httptools", "h11"] = "auto"
+    web_backlog: int = 2048
+    web_keepalive_seconds: int = 5
+    # In-flight requests get this long to finish on shutdown or restart.
+    web_graceful_timeout_seconds: int = 30
+    web_max_requests: int = 0
+    web_preload: bool = True
+    web_forwarded_allow_ips: str = "127.0.0.1"
 
     def cors_origins_list(self) -> list[str]:
         if not self.cors_origins:
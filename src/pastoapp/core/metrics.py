@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator, Sequence
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from pastoapp.core.config import settings
+from pastoapp.core.profiling import (
+    finish_request_profile,
+    profile_path,
+    start_request_profile,
+)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Longest statement / parameter text written to the query debug log.
+_LOG_TEXT_LIMIT = 2000
+_EXPLAINABLE = ("select", "with", "update", "delete")
+
+logger = logging.getLogger("pastoapp.queries")
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_seconds", "phases", "statements")
+
+    def __init__(self, track_statements: bool = False) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases: dict[str, float] = {}
+        # SQL text -> executions, kept only in query debug mode.
+        self.statements: Counter[str] | None = Counter() if track_statements else None
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+# Set by the middleware for the duration of an instrumented request; engine
+# events and timed() find it through the request's context, including from
+# threadpool workers, which run with a copy of it.
+_current: ContextVar[RequestMetrics | None] = ContextVar(
+    "pastoapp_request_metrics", default=None
+)
+
+
+def current_metrics() -> RequestMetrics | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Add the block's wall time to ``phase`` of the current request, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(phase, time.perf_counter() - started)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: Sequence[float],
+        label_names: Sequence[str],
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        # label values -> per-bucket counts, then sum and count
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            pairs = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.label_names, labels, strict=True)
+            ]
+            cumulative = 0
+            for bound, count in zip(self.buckets, values, strict=False):
+                cumulative += count
+                le = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {int(cumulative)}")
+            le = ",".join([*pairs, 'le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{le}}} {int(values[-1])}")
+            label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{label_text} {int(values[-1])}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "pastoapp_request_duration_seconds",
+    "Time until the response finished sending.",
+    LATENCY_BUCKETS,
+    ("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "pastoapp_request_queries",
+    "SQL statements executed per request.",
+    QUERY_BUCKETS,
+    ("method", "route"),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "pastoapp_request_db_seconds",
+    "Time spent executing SQL statements per request.",
+    LATENCY_BUCKETS,
+    ("method", "route"),
+)
+REQUEST_PHASE_SECONDS = Histogram(
+    "pastoapp_request_phase_seconds",
+    "Time per request in validation, serialization and photo file I/O.",
+    LATENCY_BUCKETS,
+    ("phase", "route"),
+)
+HISTOGRAMS = (
+    REQUEST_SECONDS,
+    REQUEST_QUERIES,
+    REQUEST_DB_SECONDS,
+    REQUEST_PHASE_SECONDS,
+)
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+_QUERY_START_KEY = "pastoapp_query_started"
+_listeners_lock = threading.Lock()
+_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if _current.get() is not None:
+        conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    metrics = _current.get()
+    if metrics is None:
+        return
+    started = conn.info.get(_QUERY_START_KEY)
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    metrics.db_seconds += elapsed
+    metrics.queries += 1
+    if metrics.statements is None:
+        return
+    metrics.statements[statement] += 1
+    slow_ms = settings.slow_query_ms
+    if slow_ms > 0 and elapsed * 1000 >= slow_ms:
+        _log_slow_statement(conn, statement, parameters, many, elapsed)
+
+
+def _handle_error(context) -> None:
+    # A statement that raises never reaches after_cursor_execute; its start
+    # time would stay on the pooled connection and be popped by, and so
+    # skew, the next statement run on it.
+    conn = context.connection
+    started = conn.info.get(_QUERY_START_KEY) if conn is not None else None
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.db_seconds += elapsed
+        metrics.queries += 1
+
+
+def _clip(text: str) -> str:
+    if len(text) <= _LOG_TEXT_LIMIT:
+        return text
+    return f"{text[:_LOG_TEXT_LIMIT]}... ({len(text)} chars)"
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    # Runs on the raw DBAPI connection so it is neither counted nor timed.
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as exc:
+        return f"EXPLAIN failed: {exc}"
+    finally:
+        cursor.close()
+    return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+
+
+def _log_slow_statement(conn, statement, parameters, many, elapsed) -> None:
+    plan = "not explained (executemany)" if many else "not explained"
+    if not many and statement.lstrip().lower().startswith(_EXPLAINABLE):
+        plan = _explain(conn, statement, parameters)
+    logger.warning(
+        "Slow statement (%.1f ms): %s\nparameters: %s\nplan:\n%s",
+        elapsed * 1000,
+        _clip(statement),
+        _clip(repr(parameters)),
+        plan,
+    )
+
+
+def _log_repeated_statements(metrics: RequestMetrics, method: str, route: str) -> None:
+    threshold = settings.query_repeat_threshold
+    if metrics.statements is None or threshold <= 0:
+        return
+    for statement, count in metrics.statements.most_common():
+        if count < threshold:
+            break
+        logger.warning(
+            "%s %s ran the same statement %d times: %s",
+            method,
+            route,
+            count,
+            _clip(statement),
+        )
+
+
+def install_query_metrics() -> None:
+    # Registered for every engine, and only once metrics are first turned on,
+    # so a disabled deployment pays nothing per statement.
+    global _listeners_installed
+    with _listeners_lock:
+        if _listeners_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        _listeners_installed = True
+
+
+def _server_timing(metrics: RequestMetrics, app_seconds: float) -> str:
+    parts = [f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"']
+    for phase, seconds in metrics.phases.items():
+        parts.append(f"{phase};dur={seconds * 1000:.1f}")
+    parts.append(f"app;dur={app_seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _route(scope: Scope) -> str:
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def _instrumented() -> bool:
+    return (
+        settings.metrics_enabled
+        or settings.query_debug
+        or settings.profile_sample_rate > 0
+    )
+
+
+class InstrumentationMiddleware:
+    """Per-request query counts, DB time and phase timings.
+
+    Adds a ``Server-Timing`` header and feeds the histograms served as
+    Prometheus text. With ``query_debug`` it also logs repeated and slow
+    statements, and ``profile_sample_rate`` of requests are saved as cProfile
+    captures. Does nothing but a few settings checks while all are off.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _instrumented():
+            await self.app(scope, receive, send)
+            return
+        install_query_metrics()
+        metrics = RequestMetrics(track_statements=settings.query_debug)
+        token = _current.set(metrics)
+        profile = start_request_profile()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = _server_timing(metrics, time.perf_counter() - started)
+                headers = [*message.get("headers", [])]
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            seconds = time.perf_counter() - started
+            if profile is not None:
+                finish_request_profile(profile)
+            _current.reset(token)
+            self._observe(scope, metrics, seconds, status)
+        if profile is not None:
+            path = profile_path(scope["method"], _route(scope), seconds)
+            await run_in_threadpool(profile.save, path)
+
+    @staticmethod
+    def _observe(
+        scope: Scope, metrics: RequestMetrics, seconds: float, status: int
+    ) -> None:
+        route = _route(scope)
+        method = scope["method"]
+        _log_repeated_statements(metrics, method, route)
+        REQUEST_SECONDS.observe(seconds, method, route, str(status))
+        REQUEST_QUERIES.observe(metrics.queries, method, route)
+        REQUEST_DB_SECONDS.observe(metrics.db_seconds, method, route)
+        for phase, phase_seconds in metrics.phases.items():
+            REQUEST_PHASE_SECONDS.observe(phase_seconds, phase, route)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import pstats
+import random
+import re
+import threading
+import time
+from collections.abc import Callable
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, TypeVar
+
+from pastoapp.core.config import settings
+
+T = TypeVar("T")
+
+# cProfile hooks a whole thread and only one profiler can be active on it, so
+# the event loop thread runs at most one capture at a time.
+_loop_capture = threading.Lock()
+
+
+class RequestProfile:
+    """cProfile capture of one sampled request.
+
+    The event loop thread is profiled from the first to the last byte of the
+    request, so the capture also holds whatever other requests the loop ran
+    meanwhile. Work handed to the threadpool through run_db is profiled in
+    its worker thread and merged into the same file; on Python 3.12+ the
+    loop profiler already records every thread.
+    """
+
+    def __init__(self) -> None:
+        self._loop_profiler = cProfile.Profile()
+        self._profilers = [self._loop_profiler]
+        self._lock = threading.Lock()
+        self.token: Token[RequestProfile | None] | None = None
+
+    def start(self) -> None:
+        self._loop_profiler.enable()
+
+    def stop(self) -> None:
+        self._loop_profiler.disable()
+
+    def add(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self._profilers.append(profiler)
+
+    def save(self, path: Path) -> bool:
+        stats: pstats.Stats | None = None
+        with self._lock:
+            profilers = list(self._profilers)
+        for profiler in profilers:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profiler)
+                else:
+                    stats.add(profiler)
+            except TypeError:
+                # Nothing was recorded by this profiler.
+                continue
+        if stats is None:
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        return True
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar(
+    "pastoapp_request_profile", default=None
+)
+
+
+def start_request_profile() -> RequestProfile | None:
+    """Start a capture for ``profile_sample_rate`` of requests.
+
+    Returns None when the request is not sampled or another capture is
+    already running on the event loop thread.
+    """
+    rate = settings.profile_sample_rate
+    if rate <= 0 or random.random() >= rate:
+        return None
+    if not _loop_capture.acquire(blocking=False):
+        return None
+    profile = RequestProfile()
+    try:
+        profile.start()
+    except ValueError:
+        # Another profiler (or debugger) already owns sys.monitoring.
+        _loop_capture.release()
+        return None
+    profile.token = _current.set(profile)
+    return profile
+
+
+def finish_request_profile(profile: RequestProfile) -> None:
+    profile.stop()
+    _current.reset(profile.token)
+    _loop_capture.release()
+
+
+def profile_path(method: str, route: str, seconds: float) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    name = f"{stamp}-{time.monotonic_ns() % 1_000_000:06d}-{method}-{slug}"
+    return Path(settings.profile_dir) / f"{name}-{seconds * 1000:.0f}ms.prof"
+
+
+def profiled(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap ``fn`` to run under its own profiler if the request is sampled."""
+    profile = _current.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ runs cProfile on sys.monitoring, which allows one
+            # profiler per process; the request's profiler is already active
+            # and sees this thread too.
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile.add(profiler)
+
+    return wrapper
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from pastoapp.core.config import settings
+
+logger = logging.getLogger("pastoapp.workers")
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.background_workers,
+                thread_name_prefix="pastoapp-worker",
+            )
+        return _executor
+
+
+def _log_failure(future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background job failed", exc_info=exc)
+
+
+def submit_background(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    future = _get_executor().submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def shutdown_workers(wait: bool = True) -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
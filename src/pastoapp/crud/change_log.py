@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from sqlalchemy import delete, exists, func, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from pastoapp.core.config import settings
+from pastoapp.db.session import SessionLocal
+from pastoapp.models.change_log import (
+    CHANGE_LOG_TABLE,
+    NO_DEVICE_SCOPE,
+    PastoEntryChange,
+)
+from pastoapp.models.pasto_entry import PastoEntry
+
+logger = logging.getLogger("pastoapp.change_log")
+
+_COMPACT_WINDOW = 50_000
+
+
+def change_scope(device_id: str | None) -> str:
+    return device_id or NO_DEVICE_SCOPE
+
+
+def record_changes(
+    db: Session, changes: Iterable[tuple[int, str | None, uuid.UUID]]
+) -> None:
+    """Append ``(seq, device_id, entry_uuid)`` rows in the writer's transaction."""
+    now = datetime.now(tz=UTC)
+    rows = [
+        {
+            "scope": change_scope(device_id),
+            "seq": seq,
+            "entry_uuid": entry_uuid,
+            "changed_at": now,
+        }
+        for seq, device_id, entry_uuid in changes
+    ]
+    if rows:
+        db.execute(insert(PastoEntryChange), rows)
+
+
+def compact_change_log(db: Session) -> int:
+    # Drops rows an entry has since moved past, one seq window per
+    # transaction so locks stay short on a large log.
+    superseded = exists().where(
+        PastoEntry.uuid == PastoEntryChange.entry_uuid,
+        PastoEntry.updated_seq > PastoEntryChange.seq,
+    )
+    first, last = db.execute(
+        select(func.min(PastoEntryChange.seq), func.max(PastoEntryChange.seq))
+    ).one()
+    db.rollback()
+    removed = 0
+    if first is None:
+        return removed
+    for start in range(first - 1, last, _COMPACT_WINDOW):
+        result = db.execute(
+            delete(PastoEntryChange)
+            .where(
+                PastoEntryChange.seq > start,
+                PastoEntryChange.seq <= start + _COMPACT_WINDOW,
+                superseded,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        removed += result.rowcount
+    return removed
+
+
+def partition_name(index: int) -> str:
+    return f"{CHANGE_LOG_TABLE}_p{index}"
+
+
+def ensure_partitions(db: Session, ahead: int = 1) -> list[str]:
+    """Create PostgreSQL seq-range partitions up to ``ahead`` past the current.
+
+    Ranges have to exist before seq reaches them: once the default partition
+    holds rows of a range, PostgreSQL refuses to create that range.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    size = settings.change_log_partition_size
+    current = int(db.scalar(select(func.max(PastoEntry.updated_seq))) or 0)
+    created = []
+    for index in range(current // size, current // size + ahead + 1):
+        name = partition_name(index)
+        if db.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(
+                    text(
+                        f"CREATE TABLE {name} PARTITION OF {CHANGE_LOG_TABLE} "
+                        f"FOR VALUES FROM ({index * size}) TO ({(index + 1) * size})"
+                    )
+                )
+        except DBAPIError:
+            logger.warning(
+                "Could not create change log partition %s; rows for its range "
+                "are already in the default partition",
+                name,
+            )
+            continue
+        created.append(name)
+    db.commit()
+    return created
+
+
+def run_change_log_maintenance() -> int:
+    with SessionLocal() as db:
+        for name in ensure_partitions(db):
+            logger.info("Created change log partition %s", name)
+        return compact_change_log(db)
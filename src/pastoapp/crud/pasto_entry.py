@@ -1,15 +1,36 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import logging
+import threading
 import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Any
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from sqlalchemy import desc, func, select
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy import Row, Select, case, desc, insert, select, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, make_transient_to_detached
+from typing_extensions import TypedDict  # pydantic needs it before 3.12
 
+from pastoapp.core.cache import CacheBackend, MemoryCache, RedisCache, redis_client
+from pastoapp.core.config import settings
+from pastoapp.crud.change_log import change_scope, record_changes
+from pastoapp.db.sequence import allocate_seq_block, current_seq, lock_writes
+from pastoapp.db.unit_of_work import on_commit, transaction_state
+from pastoapp.models.change_log import PastoEntryChange
 from pastoapp.models.pasto_entry import PastoEntry
-from pastoapp.schemas.pasto_entry import PastoEntryCreate, PastoEntryUpdate
+from pastoapp.schemas.pasto_entry import (
+    PastoEntryCreate,
+    PastoEntryPatch,
+    PastoEntryUpdate,
+)
+from pastoapp.schemas.sync import SyncRejectedItem
 
+logger = logging.getLogger("pastoapp.push")
 
 try:
     _BOGOTA_TZ = ZoneInfo("America/Bogota")
@@ -21,39 +42,84 @@ def _utcnow() -> datetime:
     return datetime.now(tz=_BOGOTA_TZ)
 
 
-def get_next_updated_seq(db: Session) -> int:
-    current = db.execute(select(func.max(PastoEntry.updated_seq))).scalar()
-    return int(current or 0) + 1
+def get_next_updated_seq(db: Session, count: int = 1) -> int:
+    return allocate_seq_block(db, count)
 
 
 def get_max_updated_seq(db: Session) -> int:
-    current = db.execute(select(func.max(PastoEntry.updated_seq))).scalar()
-    return int(current or 0)
+    return current_seq(db)
 
 
-def upsert_entry(db: Session, payload: PastoEntryCreate, device_id: str | None) -> PastoEntry:
+# Client-writable fields whose changes are recorded in PastoEntry.field_seqs.
+TRACKED_FIELDS = ("lot_number", "entry_time", "exit_time", "device_id")
+_IGNORED_FIELDS = {"photo_base64", "created_at", "id", "uuid"}
+
+
+def _values_equal(old: object, new: object) -> bool:
+    if isinstance(old, datetime) and isinstance(new, datetime):
+        if (old.tzinfo is None) != (new.tzinfo is None):
+            # SQLite hands back the stored wall-clock time without its offset.
+            return old.replace(tzinfo=None) == new.replace(tzinfo=None)
+    return old == new
+
+
+def _current_field_seqs(field_seqs: dict | None, updated_seq: int) -> dict[str, int]:
+    if field_seqs is None:
+        return {name: updated_seq for name in (*TRACKED_FIELDS, "created_at")}
+    return dict(field_seqs)
+
+
+def _new_field_seqs(seq: int) -> dict[str, int]:
+    return {name: seq for name in (*TRACKED_FIELDS, "created_at")}
+
+
+def _changed_values(current: object, data: dict, device_id: str | None) -> dict:
+    # Only fields whose value differs from what is stored; an empty result
+    # means the write is a no-op (typically a retried push).
+    values = {key: value for key, value in data.items() if key not in _IGNORED_FIELDS}
+    if device_id and not values.get("device_id", current.device_id):
+        values["device_id"] = device_id
+    return {
+        key: value
+        for key, value in values.items()
+        if not _values_equal(getattr(current, key), value)
+    }
+
+
+def _apply_changes(entry: PastoEntry, changes: dict, seq: int) -> None:
+    field_seqs = _current_field_seqs(entry.field_seqs, entry.updated_seq)
+    for key, value in changes.items():
+        setattr(entry, key, value)
+        field_seqs[key] = seq
+    entry.field_seqs = field_seqs
+    entry.updated_at = _utcnow()
+    entry.updated_seq = seq
+
+
+def upsert_entry(
+    db: Session, payload: PastoEntryCreate, device_id: str | None
+) -> PastoEntry:
     entry_uuid = payload.uuid or uuid.uuid4()
+    lock_writes(db)
     existing = db.execute(
-        select(PastoEntry).where(PastoEntry.uuid == entry_uuid)
+        select(PastoEntry).where(PastoEntry.uuid == entry_uuid).with_for_update()
     ).scalar_one_or_none()
-    now = _utcnow()
-    next_seq = get_next_updated_seq(db)
 
     if existing:
-        data = payload.model_dump(exclude_unset=True)
-        for key, value in data.items():
-            if key in {"photo_base64", "created_at", "id", "uuid"}:
-                continue
-            setattr(existing, key, value)
-        if device_id and not existing.device_id:
-            existing.device_id = device_id
-        existing.updated_at = now
-        existing.updated_seq = next_seq
+        changes = _changed_values(
+            existing, payload.model_dump(exclude_unset=True), device_id
+        )
+        if not changes:
+            return existing
+        _apply_changes(existing, changes, get_next_updated_seq(db))
         db.add(existing)
-        db.commit()
-        db.refresh(existing)
+        record_changes(db, [(existing.updated_seq, existing.device_id, entry_uuid)])
+        db.flush()
+        _evict_on_commit(db, entry_uuid)
         return existing
 
+    now = _utcnow()
+    next_seq = get_next_updated_seq(db)
     entry = PastoEntry(
         uuid=entry_uuid,
         lot_number=payload.lot_number,
@@ -63,27 +129,440 @@ def upsert_entry(db: Session, payload: PastoEntryCreate, device_id: str | None)
         updated_at=now,
         device_id=device_id or payload.device_id,
         updated_seq=next_seq,
+        field_seqs=_new_field_seqs(next_seq),
     )
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    record_changes(db, [(next_seq, entry.device_id, entry_uuid)])
+    db.flush()
     return entry
 
 
-def get_entry(db: Session, entry_uuid: uuid.UUID) -> PastoEntry | None:
-    return db.execute(
+_PUSH_LOOKUP_CHUNK = 500
+_UPSERT_COLUMNS = (
+    "lot_number",
+    "entry_time",
+    "exit_time",
+    "device_id",
+    "updated_at",
+    "updated_seq",
+    "field_seqs",
+)
+_UNKNOWN_PATCH = "Partial update for an unknown entry"
+_WRITE_FAILED = "Entry could not be stored"
+
+
+def _fetch_existing_entries(
+    db: Session, entry_uuids: list[uuid.UUID]
+) -> dict[uuid.UUID, Row]:
+    # The rows are written back from these values, so they stay locked until
+    # the push commits; sorted so concurrent pushes lock them in one order.
+    lock_writes(db)
+    entry_uuids = sorted(entry_uuids)
+    existing: dict[uuid.UUID, Row] = {}
+    for start in range(0, len(entry_uuids), _PUSH_LOOKUP_CHUNK):
+        chunk = entry_uuids[start : start + _PUSH_LOOKUP_CHUNK]
+        rows = db.execute(
+            select(
+                PastoEntry.uuid,
+                PastoEntry.id,
+                PastoEntry.updated_seq,
+                PastoEntry.field_seqs,
+                PastoEntry.deleted_at,
+                *(getattr(PastoEntry, name) for name in TRACKED_FIELDS),
+            )
+            .where(PastoEntry.uuid.in_(chunk))
+            .order_by(PastoEntry.uuid)
+            .with_for_update()
+        )
+        for row in rows:
+            existing[row.uuid] = row
+    return existing
+
+
+def _merge_push_items(
+    items: list[PastoEntryCreate | PastoEntryPatch],
+) -> tuple[list[uuid.UUID], dict[uuid.UUID, dict]]:
+    # Items repeating a uuid are folded in order, the same result the
+    # sequential upsert path produced for them.
+    item_uuids: list[uuid.UUID] = []
+    merged: dict[uuid.UUID, dict] = {}
+    for item in items:
+        entry_uuid = item.uuid or uuid.uuid4()
+        item_uuids.append(entry_uuid)
+        data = item.model_dump(exclude_unset=True)
+        fields = {
+            key: value
+            for key, value in data.items()
+            if key not in {"photo_base64", "id", "uuid"}
+        }
+        if entry_uuid in merged:
+            created_at = merged[entry_uuid].get("created_at")
+            merged[entry_uuid].update(fields)
+            merged[entry_uuid]["created_at"] = created_at
+        else:
+            merged[entry_uuid] = fields
+    return item_uuids, merged
+
+
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(PastoEntry)
+        return stmt.on_conflict_do_update(
+            index_elements=[PastoEntry.uuid],
+            set_={name: stmt.excluded[name] for name in _UPSERT_COLUMNS},
+        )
+    if dialect == "sqlite":
+        stmt = sqlite.insert(PastoEntry)
+        return stmt.on_conflict_do_update(
+            index_elements=[PastoEntry.uuid],
+            set_={name: stmt.excluded[name] for name in _UPSERT_COLUMNS},
+        )
+    if dialect in {"mysql", "mariadb"}:
+        stmt = mysql.insert(PastoEntry)
+        return stmt.on_duplicate_key_update(
+            {name: stmt.inserted[name] for name in _UPSERT_COLUMNS}
+        )
+    return None
+
+
+def _bulk_write_entries(
+    db: Session, merged: dict[uuid.UUID, dict], device_id: str | None
+) -> set[uuid.UUID]:
+    existing = _fetch_existing_entries(db, list(merged))
+    unknown: set[uuid.UUID] = set()
+    writes: list[tuple[uuid.UUID, dict]] = []
+    for entry_uuid, fields in merged.items():
+        current = existing.get(entry_uuid)
+        if current is not None:
+            changes = _changed_values(current, fields, device_id)
+            # Identical to what is stored: no write and no new updated_seq.
+            if changes:
+                writes.append((entry_uuid, changes))
+        elif {"lot_number", "entry_time", "exit_time"} <= fields.keys():
+            writes.append((entry_uuid, fields))
+        else:
+            # A patch can only complete an entry the server already has.
+            unknown.add(entry_uuid)
+    if not writes:
+        return unknown
+    now = _utcnow()
+    next_seq = get_next_updated_seq(db, len(writes))
+
+    rows: list[dict] = []
+    updates: list[dict] = []
+    for offset, (entry_uuid, fields) in enumerate(writes):
+        seq = next_seq + offset
+        row = {"uuid": entry_uuid, "updated_at": now, "updated_seq": seq}
+        if entry_uuid in existing:
+            current = existing[entry_uuid]
+            field_seqs = _current_field_seqs(current.field_seqs, current.updated_seq)
+            for name in TRACKED_FIELDS:
+                if name in fields:
+                    row[name] = fields[name]
+                    field_seqs[name] = seq
+                else:
+                    row[name] = getattr(current, name)
+            row["field_seqs"] = field_seqs
+            # Never written for existing rows; keeps the upsert rows uniform.
+            row["created_at"] = now
+            updates.append({"id": current.id, **row})
+        else:
+            row.update(
+                lot_number=fields["lot_number"],
+                entry_time=fields["entry_time"],
+                exit_time=fields["exit_time"],
+                device_id=device_id or fields.get("device_id"),
+                created_at=fields.get("created_at") or now,
+                field_seqs=_new_field_seqs(seq),
+            )
+        rows.append(row)
+    record_changes(
+        db, ((row["updated_seq"], row["device_id"], row["uuid"]) for row in rows)
+    )
+
+    stmt = _upsert_statement(db)
+    if stmt is not None:
+        db.execute(stmt, rows)
+        return unknown
+
+    inserts = [row for row in rows if row["uuid"] not in existing]
+    if inserts:
+        db.execute(insert(PastoEntry), inserts)
+    if updates:
+        for row in updates:
+            row.pop("created_at")
+        db.execute(update(PastoEntry), updates)
+    return unknown
+
+
+def _tombstone_entries(db: Session, entry_uuids: list[uuid.UUID]) -> list[uuid.UUID]:
+    # Soft-deletes every listed entry with one UPDATE per lookup chunk and a
+    # contiguous updated_seq block; returns the uuids the server lacks.
+    entry_uuids = list(dict.fromkeys(entry_uuids))
+    existing = _fetch_existing_entries(db, entry_uuids)
+    unknown = [entry_uuid for entry_uuid in entry_uuids if entry_uuid not in existing]
+    by_id = {row.id: row for row in existing.values() if row.deleted_at is None}
+    live = sorted(by_id)
+    if not live:
+        return unknown
+    now = _utcnow()
+    next_seq = get_next_updated_seq(db, len(live))
+    for start in range(0, len(live), _PUSH_LOOKUP_CHUNK):
+        chunk = live[start : start + _PUSH_LOOKUP_CHUNK]
+        offsets = {entry_id: start + index for index, entry_id in enumerate(chunk)}
+        db.execute(
+            update(PastoEntry)
+            .where(PastoEntry.id.in_(chunk), PastoEntry.deleted_at.is_(None))
+            .values(
+                deleted_at=now,
+                updated_at=now,
+                updated_seq=next_seq + case(offsets, value=PastoEntry.id),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        record_changes(
+            db,
+            (
+                (next_seq + offset, by_id[entry_id].device_id, by_id[entry_id].uuid)
+                for entry_id, offset in offsets.items()
+            ),
+        )
+    return unknown
+
+
+def push_entries(
+    db: Session,
+    items: list[PastoEntryCreate],
+    device_id: str | None,
+    patches: list[PastoEntryPatch] = (),
+    deleted_ids: list[uuid.UUID] = (),
+) -> tuple[list[uuid.UUID], list[SyncRejectedItem], list[uuid.UUID]]:
+    """Apply a push batch within the caller's transaction.
+
+    Returns accepted uuids, rejected items and the deleted ids the server
+    does not know. If the set-based write fails the whole transaction is
+    rolled back before retrying item by item, so call it before the request
+    writes anything else.
+    """
+    if not items and not patches and not deleted_ids:
+        return [], [], []
+
+    item_uuids, merged = _merge_push_items([*items, *patches])
+    try:
+        # Not a savepoint: on SQLite, reading inside one before writing lets
+        # two concurrent pushes deadlock on the lock upgrade.
+        unknown = _bulk_write_entries(db, merged, device_id) if merged else set()
+        unknown_deleted = _tombstone_entries(db, deleted_ids)
+    except DBAPIError:
+        db.rollback()
+        accepted, rejected = _push_entries_one_by_one(db, items, device_id, patches)
+        unknown_deleted = _tombstone_entries(db, deleted_ids)
+        _evict_on_commit(db, *deleted_ids)
+        return accepted, rejected, unknown_deleted
+    _evict_on_commit(db, *merged, *deleted_ids)
+    accepted = [entry_uuid for entry_uuid in item_uuids if entry_uuid not in unknown]
+    rejected = [
+        SyncRejectedItem(id=entry_uuid, reason=_UNKNOWN_PATCH)
+        for entry_uuid in dict.fromkeys(item_uuids)
+        if entry_uuid in unknown
+    ]
+    return accepted, rejected, unknown_deleted
+
+
+def _push_entries_one_by_one(
+    db: Session,
+    items: list[PastoEntryCreate],
+    device_id: str | None,
+    patches: list[PastoEntryPatch] = (),
+) -> tuple[list[uuid.UUID], list[SyncRejectedItem]]:
+    # Only reached when the set-based write fails; isolates the offending
+    # items in savepoints so the rest of the batch is still accepted.
+    accepted: list[uuid.UUID] = []
+    rejected: list[SyncRejectedItem] = []
+    for item in [*items, *patches]:
+        try:
+            with db.begin_nested():
+                if isinstance(item, PastoEntryPatch):
+                    entry = get_entry(db, item.uuid, for_update=True)
+                    if entry is None:
+                        rejected.append(
+                            SyncRejectedItem(id=item.uuid, reason=_UNKNOWN_PATCH)
+                        )
+                        continue
+                    entry = update_entry(db, entry, item, device_id)
+                else:
+                    entry = upsert_entry(db, item, device_id)
+            accepted.append(entry.uuid)
+        except Exception:
+            # The database error carries SQL and parameters; keep it in the log.
+            logger.warning("Push item %s rejected", item.uuid, exc_info=True)
+            rejected.append(
+                SyncRejectedItem(id=item.uuid or uuid.UUID(int=0), reason=_WRITE_FAILED)
+            )
+    return accepted, rejected
+
+
+class _EntryValues(TypedDict):
+    id: int
+    uuid: uuid.UUID
+    lot_number: str
+    entry_time: datetime
+    exit_time: datetime
+    created_at: datetime
+    updated_at: datetime
+    deleted_at: datetime | None
+    device_id: str | None
+    updated_seq: int
+    field_seqs: dict[str, int] | None
+
+
+_ENTRY_FIELDS = tuple(_EntryValues.__annotations__)
+
+
+class EntryCache:
+    """Read-through cache for get_entry keyed by uuid.
+
+    Holds column values rather than ORM objects so entries never leak across
+    sessions. Writes evict the uuids they touch once committed; hits and
+    misses are counted to size the backend.
+    """
+
+    def __init__(self, backend: CacheBackend | None) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, entry_uuid: uuid.UUID) -> _EntryValues | None:
+        if self.backend is None:
+            return None
+        values = self.backend.get(str(entry_uuid))
+        with self._lock:
+            if values is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return values
+
+    def put(self, entry: PastoEntry) -> None:
+        if self.backend is not None:
+            values = {name: getattr(entry, name) for name in _ENTRY_FIELDS}
+            self.backend.set(str(entry.uuid), values)
+
+    def invalidate(self, *entry_uuids: uuid.UUID) -> None:
+        if self.backend is not None and entry_uuids:
+            self.backend.delete(*(str(entry_uuid) for entry_uuid in entry_uuids))
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        status: dict[str, Any] = {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": hits,
+            "misses": misses,
+            "hitRatio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+        if isinstance(self.backend, MemoryCache):
+            status["size"] = len(self.backend)
+            status["maxSize"] = self.backend.max_items
+        return status
+
+
+def _entry_cache_backend() -> CacheBackend | None:
+    if settings.entry_cache_backend == "memory":
+        return MemoryCache(settings.entry_cache_size, settings.entry_cache_ttl_seconds)
+    if settings.entry_cache_backend == "redis":
+        return RedisCache(
+            redis_client(settings.entry_cache_redis_url),
+            settings.entry_cache_ttl_seconds,
+            TypeAdapter(_EntryValues),
+            prefix="pastoapp:entry:",
+        )
+    return None
+
+
+entry_cache = EntryCache(_entry_cache_backend())
+
+
+_WRITTEN_UUIDS = "entry_uuids"
+
+
+def _evict_on_commit(db: Session, *entry_uuids: uuid.UUID) -> None:
+    # The cache keeps serving the committed values until the write commits;
+    # get_entry reads these uuids from the session in the meantime.
+    state = transaction_state(db)
+    written = state.get(_WRITTEN_UUIDS)
+    if written is None:
+        written = state[_WRITTEN_UUIDS] = set()
+        on_commit(db, _evict_written, written)
+    written.update(entry_uuids)
+
+
+def _evict_written(entry_uuids: set[uuid.UUID]) -> None:
+    entry_cache.invalidate(*entry_uuids)
+
+
+def get_entry(
+    db: Session, entry_uuid: uuid.UUID, for_update: bool = False
+) -> PastoEntry | None:
+    """Entry by uuid, read through the entry cache.
+
+    Writes pass ``for_update=True``: the row is locked and read from the
+    database, since the no-op check and field_seqs must see what is stored
+    now, not a copy another worker may have already overwritten.
+    """
+    if for_update:
+        lock_writes(db)
+        return db.execute(
+            select(PastoEntry)
+            .where(PastoEntry.uuid == entry_uuid)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+    written = entry_uuid in transaction_state(db).get(_WRITTEN_UUIDS, ())
+    values = None if written else entry_cache.get(entry_uuid)
+    if values is not None:
+        # Attaches the cached row as persistent state without a SELECT.
+        cached = PastoEntry(**values)
+        make_transient_to_detached(cached)
+        return db.merge(cached, load=False)
+    entry = db.execute(
         select(PastoEntry).where(PastoEntry.uuid == entry_uuid)
     ).scalar_one_or_none()
+    if entry is not None and not written:
+        entry_cache.put(entry)
+    return entry
 
 
-def list_entries(
-    db: Session,
+def encode_entry_cursor(entry: PastoEntry) -> str:
+    raw = f"{entry.created_at.isoformat()}|{entry.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_entry_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, entry_id = raw.rpartition("|")
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor") from None
+
+
+def entries_query(
     device_id: str | None,
     updated_since: datetime | None,
     include_deleted: bool,
     limit: int,
-    offset: int,
-) -> list[PastoEntry]:
+    offset: int = 0,
+    after: tuple[datetime, int] | None = None,
+) -> Select:
     stmt = select(PastoEntry)
     if device_id:
         stmt = stmt.where(PastoEntry.device_id == device_id)
@@ -91,10 +570,27 @@ def list_entries(
         stmt = stmt.where(PastoEntry.updated_at > updated_since)
     if not include_deleted:
         stmt = stmt.where(PastoEntry.deleted_at.is_(None))
-    stmt = (
-        stmt.order_by(desc(PastoEntry.created_at), desc(PastoEntry.updated_at))
-        .offset(offset)
-        .limit(limit)
+    if after is not None:
+        # Keyset page: seek straight past the last row of the previous page
+        # along the (created_at, id) index instead of counting rows off.
+        stmt = stmt.where(tuple_(PastoEntry.created_at, PastoEntry.id) < after)
+    stmt = stmt.order_by(desc(PastoEntry.created_at), desc(PastoEntry.id)).limit(limit)
+    if offset:
+        stmt = stmt.offset(offset)
+    return stmt
+
+
+def list_entries(
+    db: Session,
+    device_id: str | None,
+    updated_since: datetime | None,
+    include_deleted: bool,
+    limit: int,
+    offset: int = 0,
+    after: tuple[datetime, int] | None = None,
+) -> list[PastoEntry]:
+    stmt = entries_query(
+        device_id, updated_since, include_deleted, limit, offset, after
     )
     return list(db.scalars(stmt))
 
@@ -102,36 +598,55 @@ def list_entries(
 def update_entry(
     db: Session, entry: PastoEntry, payload: PastoEntryUpdate, device_id: str | None
 ) -> PastoEntry:
-    data = payload.model_dump(exclude_unset=True)
-    for key, value in data.items():
-        if key in {"photo_base64", "created_at", "id", "uuid"}:
-            continue
-        setattr(entry, key, value)
-    if device_id and not entry.device_id:
-        entry.device_id = device_id
-    entry.updated_at = _utcnow()
-    entry.updated_seq = get_next_updated_seq(db)
+    changes = _changed_values(entry, payload.model_dump(exclude_unset=True), device_id)
+    if not changes:
+        return entry
+    _apply_changes(entry, changes, get_next_updated_seq(db))
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    record_changes(db, [(entry.updated_seq, entry.device_id, entry.uuid)])
+    db.flush()
+    _evict_on_commit(db, entry.uuid)
     return entry
 
 
 def soft_delete_entry(db: Session, entry: PastoEntry) -> PastoEntry:
+    if entry.deleted_at is not None:
+        return entry
+    next_seq = get_next_updated_seq(db)
     entry.deleted_at = _utcnow()
     entry.updated_at = _utcnow()
-    entry.updated_seq = get_next_updated_seq(db)
+    entry.updated_seq = next_seq
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    record_changes(db, [(next_seq, entry.device_id, entry.uuid)])
+    db.flush()
+    _evict_on_commit(db, entry.uuid)
     return entry
 
 
+def entries_by_cursor_query(cursor: int, limit: int, device_id: str | None) -> Select:
+    # Walks the change log instead of pasto_entries. A log row whose seq is
+    # no longer the entry's updated_seq was superseded and is skipped.
+    stmt = (
+        select(PastoEntry)
+        .select_from(PastoEntryChange)
+        .join(PastoEntry, PastoEntry.uuid == PastoEntryChange.entry_uuid)
+        .where(
+            PastoEntryChange.seq > cursor,
+            PastoEntry.updated_seq == PastoEntryChange.seq,
+        )
+    )
+    if device_id:
+        stmt = stmt.where(PastoEntryChange.scope == change_scope(device_id))
+    return stmt.order_by(PastoEntryChange.seq).limit(limit)
+
+
 def list_entries_by_cursor(
     db: Session, cursor: int, limit: int, device_id: str | None
 ) -> list[PastoEntry]:
-    stmt = select(PastoEntry).where(PastoEntry.updated_seq > cursor)
-    if device_id:
-        stmt = stmt.where(PastoEntry.device_id == device_id)
-    stmt = stmt.order_by(PastoEntry.updated_seq).limit(limit)
-    return list(db.scalars(stmt))
+    return list(db.scalars(entries_by_cursor_query(cursor, limit, device_id)))
+
+
+def entry_columns(stmt: Select) -> Select:
+    # Plain rows skip the identity map, so streamed pages don't accumulate
+    # ORM objects in the session.
+    return stmt.with_only_columns(*PastoEntry.__table__.columns)
@@ -2,16 +2,28 @@ from __future__ import annotations
 
 import base64
 import binascii
+import contextlib
+import hashlib
 import os
+import tempfile
 import uuid
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
+from typing import BinaryIO
 
-from sqlalchemy import select
-from datetime import datetime, timezone
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from pastoapp.core.config import settings
-from pastoapp.models.photo import PastoEntryPhoto
+from pastoapp.core.metrics import timed
+from pastoapp.core.workers import submit_background
+from pastoapp.crud.photo_variant import get_variant_cache, queue_thumbnails
+from pastoapp.db.session import SessionLocal
+from pastoapp.models.photo import PastoEntryPhoto, PhotoBlob
 
 
 def _ensure_media_root() -> Path:
@@ -20,47 +32,247 @@ def _ensure_media_root() -> Path:
     return root
 
 
-def _write_file(path: Path, data: bytes) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("wb") as handle:
-        handle.write(data)
+class PhotoTooLargeError(ValueError):
+    pass
 
 
-def _parse_base64(payload: str) -> tuple[bytes, str | None]:
+@dataclass(frozen=True)
+class StoredPhoto:
+    photo_id: uuid.UUID
+    storage_key: str
+    size: int
+    content_hash: str
+    # Rewindable upload the blob file can be rewritten from if garbage
+    # collection removes it before the photo row commits.
+    source: BinaryIO | None = field(default=None, compare=False, repr=False)
+
+
+def _blob_key(content_hash: str) -> str:
+    return os.path.join("blobs", content_hash[:2], content_hash[2:4], content_hash)
+
+
+def _read_chunks(source: BinaryIO) -> Iterator[bytes]:
+    size = 0
+    while chunk := source.read(settings.photo_chunk_size):
+        size += len(chunk)
+        if size > settings.photo_max_bytes:
+            raise PhotoTooLargeError("Photo exceeds the maximum size")
+        yield chunk
+    if size == 0:
+        raise ValueError("Empty photo")
+
+
+def _hash_stream(source: BinaryIO) -> tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in _read_chunks(source):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _copy_to_temp(source: BinaryIO, root: Path) -> tuple[str, str, int]:
+    # The temp file lives under media_root so the final rename stays on the
+    # same filesystem and is atomic; readers never see a partial photo.
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=root, prefix=".upload-", suffix=".tmp")
     try:
-        if ";base64," in payload:
-            meta, encoded = payload.split(",", 1)
-            mime_type = None
-            if ":" in meta:
-                mime_type = meta.split(":", 1)[1].split(";", 1)[0]
-            return base64.b64decode(encoded), mime_type
-        return base64.b64decode(payload), None
-    except binascii.Error as exc:  # pragma: no cover - defensive
-        raise ValueError("Invalid base64 payload") from exc
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in _read_chunks(source):
+                digest.update(chunk)
+                size += len(chunk)
+                handle.write(chunk)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+    return tmp_name, digest.hexdigest(), size
 
 
-def create_photo_from_base64(
-    db: Session, entry_uuid: uuid.UUID, photo_base64: str
-) -> PastoEntryPhoto:
-    data, mime_type = _parse_base64(photo_base64)
+def _install(root: Path, tmp_name: str, storage_key: str) -> None:
+    # Replacing an identical file is harmless and keeps the rename atomic.
+    final_path = root / storage_key
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_name, final_path)
+
+
+def _reuse(path: Path) -> bool:
+    # A reused file gets a fresh mtime, so the sweep of files without a blob
+    # row leaves it alone for another grace period while the row commits.
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store_photo_stream(source: BinaryIO) -> StoredPhoto:
+    with timed("photo_io"):
+        return _store_photo_stream(source)
+
+
+def _store_photo_stream(source: BinaryIO) -> StoredPhoto:
+    root = _ensure_media_root()
     photo_id = uuid.uuid4()
-    storage_key = os.path.join("pasto", str(entry_uuid), f"{photo_id}.bin")
-    file_path = _ensure_media_root() / storage_key
-    _write_file(file_path, data)
 
+    # Retried uploads are common: when the source can be rewound, hash it
+    # first so a blob that already exists is never written a second time.
+    rewindable = getattr(source, "seekable", lambda: False)()
+    kept = source if rewindable else None
+    if rewindable:
+        content_hash, size = _hash_stream(source)
+        storage_key = _blob_key(content_hash)
+        if _reuse(root / storage_key):
+            return StoredPhoto(photo_id, storage_key, size, content_hash, kept)
+        source.seek(0)
+
+    tmp_name, content_hash, size = _copy_to_temp(source, root)
+    storage_key = _blob_key(content_hash)
+    _install(root, tmp_name, storage_key)
+    return StoredPhoto(photo_id, storage_key, size, content_hash, kept)
+
+
+class Base64StreamReader:
+    def __init__(self, encoded: str, start: int = 0) -> None:
+        self._encoded = encoded
+        self._start = start
+        self._pos = start
+        self._pending = ""
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int) -> None:
+        if offset != 0:
+            raise ValueError("Base64StreamReader only rewinds to the start")
+        self._pos = self._start
+        self._pending = ""
+
+    def read(self, size: int = -1) -> bytes:
+        step = len(self._encoded) if size < 0 else max(4, (size + 2) // 3 * 4)
+        while self._pos < len(self._encoded):
+            piece = self._encoded[self._pos : self._pos + step]
+            self._pos += len(piece)
+            piece = self._pending + "".join(piece.split())
+            usable = len(piece) - len(piece) % 4
+            self._pending = piece[usable:]
+            if usable:
+                try:
+                    return base64.b64decode(piece[:usable], validate=True)
+                except binascii.Error as exc:
+                    raise ValueError("Invalid base64 payload") from exc
+        if self._pending:
+            raise ValueError("Invalid base64 payload")
+        return b""
+
+
+def _open_base64(payload: str) -> tuple[Base64StreamReader, str | None]:
+    # Only the data-URL header is split off; the body is never copied whole.
+    header_end = payload.find(",", 0, 256)
+    if header_end == -1 or ";base64" not in payload[:header_end]:
+        return Base64StreamReader(payload), None
+    meta = payload[:header_end]
+    mime_type = None
+    if ":" in meta:
+        mime_type = meta.split(":", 1)[1].split(";", 1)[0]
+    return Base64StreamReader(payload, start=header_end + 1), mime_type
+
+
+def store_photo_from_base64(photo_base64: str) -> tuple[StoredPhoto, str | None]:
+    reader, mime_type = _open_base64(photo_base64)
+    return store_photo_stream(reader), mime_type
+
+
+def _acquire_blob(db: Session, stored: StoredPhoto) -> None:
+    stmt = (
+        update(PhotoBlob)
+        .where(PhotoBlob.content_hash == stored.content_hash)
+        .values(ref_count=PhotoBlob.ref_count + 1, orphaned_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(stmt).rowcount:
+        return
+    if not (Path(settings.media_root) / stored.storage_key).exists():
+        # Garbage collection removed the file after the upload matched it.
+        _restore_blob(stored)
+    try:
+        with db.begin_nested():
+            db.add(
+                PhotoBlob(
+                    content_hash=stored.content_hash,
+                    storage_key=stored.storage_key,
+                    size=stored.size,
+                    ref_count=1,
+                )
+            )
+    except IntegrityError:
+        db.execute(stmt)
+
+
+def _restore_blob(stored: StoredPhoto) -> None:
+    if stored.source is None:
+        raise FileNotFoundError(stored.storage_key)
+    root = _ensure_media_root()
+    with timed("photo_io"):
+        stored.source.seek(0)
+        tmp_name, content_hash, _ = _copy_to_temp(stored.source, root)
+        if content_hash != stored.content_hash:
+            os.unlink(tmp_name)
+            raise ValueError("Photo changed while it was being stored")
+        _install(root, tmp_name, stored.storage_key)
+
+
+def _release_blob(db: Session, content_hash: str) -> None:
+    db.execute(
+        update(PhotoBlob)
+        .where(PhotoBlob.content_hash == content_hash, PhotoBlob.ref_count > 0)
+        .values(
+            ref_count=PhotoBlob.ref_count - 1,
+            orphaned_at=case(
+                (PhotoBlob.ref_count == 1, datetime.now(tz=UTC)),
+                else_=PhotoBlob.orphaned_at,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def create_photo_record(
+    db: Session, entry_uuid: uuid.UUID, stored: StoredPhoto, mime_type: str | None
+) -> PastoEntryPhoto:
+    _acquire_blob(db, stored)
     photo = PastoEntryPhoto(
-        id=photo_id,
+        uuid=stored.photo_id,
         entry_uuid=entry_uuid,
-        storage_key=storage_key,
+        storage_key=stored.storage_key,
+        content_hash=stored.content_hash,
         mime_type=mime_type,
-        size=len(data),
+        size=stored.size,
     )
     db.add(photo)
-    db.commit()
-    db.refresh(photo)
+    db.flush()
     return photo
 
 
+def create_photo_from_base64(
+    db: Session, entry_uuid: uuid.UUID, photo_base64: str
+) -> PastoEntryPhoto:
+    stored, mime_type = store_photo_from_base64(photo_base64)
+    return create_photo_record(db, entry_uuid, stored, mime_type)
+
+
+def _create_photo_from_base64_job(entry_uuid: uuid.UUID, photo_base64: str) -> None:
+    with SessionLocal() as db:
+        photo = create_photo_from_base64(db, entry_uuid, photo_base64)
+        db.commit()
+        queue_thumbnails(photo)
+
+
+def queue_photo_from_base64(entry_uuid: uuid.UUID, photo_base64: str) -> Future:
+    return submit_background(_create_photo_from_base64_job, entry_uuid, photo_base64)
+
+
 def list_photos(db: Session, entry_uuid: uuid.UUID) -> list[PastoEntryPhoto]:
     stmt = select(PastoEntryPhoto).where(
         PastoEntryPhoto.entry_uuid == entry_uuid, PastoEntryPhoto.deleted_at.is_(None)
@@ -75,6 +287,76 @@ def get_photo(db: Session, photo_uuid: uuid.UUID) -> PastoEntryPhoto | None:
 
 
 def delete_photo(db: Session, photo: PastoEntryPhoto) -> None:
-    photo.deleted_at = datetime.now(tz=timezone.utc)
+    if photo.deleted_at is None and photo.storage_key.startswith("blobs"):
+        _release_blob(db, photo.content_hash)
+    photo.deleted_at = datetime.now(tz=UTC)
     db.add(photo)
+    db.flush()
+
+
+def collect_photo_garbage(db: Session, grace_seconds: float | None = None) -> int:
+    # Blobs stay on disk for a grace period after their last reference goes
+    # away, so an upload that just matched an existing file can still claim it.
+    if grace_seconds is None:
+        grace_seconds = settings.photo_gc_grace_seconds
+    grace = timedelta(seconds=grace_seconds)
+    cutoff = datetime.now(tz=UTC) - grace
+    root = Path(settings.media_root)
+    removed = 0
+    collected: list[tuple[str, str]] = []
+
+    orphaned = db.execute(
+        select(PhotoBlob.content_hash, PhotoBlob.storage_key)
+        .where(PhotoBlob.ref_count == 0, PhotoBlob.orphaned_at <= cutoff)
+        .with_for_update(skip_locked=True)
+    ).all()
+    for content_hash, storage_key in orphaned:
+        # Re-checked by the DELETE itself, which also takes the row's write
+        # lock: an upload that claimed the blob since the SELECT keeps it, and
+        # one claiming it from now on waits, then finds no row and rewrites
+        # the file.
+        deleted = db.execute(
+            delete(PhotoBlob)
+            .where(PhotoBlob.content_hash == content_hash, PhotoBlob.ref_count == 0)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted:
+            collected.append((content_hash, storage_key))
     db.commit()
+
+    # Files go only once the deletes are committed, so a failed commit never
+    # leaves rows pointing at nothing. An upload that reused a file since the
+    # SELECT has bumped its mtime and keeps it, with its cached variants.
+    cache = get_variant_cache()
+    for content_hash, storage_key in collected:
+        removed += 1
+        path = root / storage_key
+        try:
+            if path.stat().st_mtime > cutoff.timestamp():
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        cache.discard(content_hash)
+
+    # Files written for uploads whose database insert never happened. Their
+    # row may also just not be committed yet: uploads write or reuse the
+    # file first, refreshing its mtime, so only files older than the grace
+    # period go.
+    known = set(db.scalars(select(PhotoBlob.content_hash)))
+    for path in (root / "blobs").glob("*/*/*"):
+        if path.name in known:
+            continue
+        try:
+            if path.stat().st_mtime > cutoff.timestamp():
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def run_photo_garbage_collection() -> int:
+    with SessionLocal() as db:
+        return collect_photo_garbage(db)
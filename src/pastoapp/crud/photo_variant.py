@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from pastoapp.core.config import settings
+from pastoapp.core.workers import submit_background
+from pastoapp.models.photo import PastoEntryPhoto
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+    ImageOps = None
+
+
+VARIANT_FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+class VariantsUnavailableError(RuntimeError):
+    pass
+
+
+class UnsupportedImageError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    width: int
+    image_format: str = "webp"
+    quality: int = 80
+
+    def filename(self) -> str:
+        return f"w{self.width}-q{self.quality}.{self.image_format}"
+
+    @property
+    def media_type(self) -> str:
+        return VARIANT_FORMATS[self.image_format]
+
+
+def variants_available() -> bool:
+    return Image is not None
+
+
+def variant_id(photo: PastoEntryPhoto) -> str:
+    return photo.content_hash or photo.uuid.hex
+
+
+class VariantCache:
+    # LRU over files on disk: the index is ordered by last use and seeded
+    # from file mtimes, which are bumped on every hit so the order survives
+    # restarts.
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: OrderedDict[Path, int] | None = None
+        self._total = 0
+
+    def _load(self) -> OrderedDict[Path, int]:
+        if self._index is None:
+            files = []
+            for path in self.root.glob("*/*"):
+                if path.suffix == ".tmp":
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    stat_result = path.stat()
+                    files.append((stat_result.st_mtime, path, stat_result.st_size))
+            self._index = OrderedDict((path, size) for _, path, size in sorted(files))
+            self._total = sum(self._index.values())
+        return self._index
+
+    def get(self, path: Path) -> bool:
+        with self._lock:
+            index = self._load()
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self._total -= index.pop(path, 0)
+                return False
+            if path in index:
+                index.move_to_end(path)
+            else:
+                # Rendered by another worker process since the index was built.
+                index[path] = path.stat().st_size
+                self._total += index[path]
+            return True
+
+    def put(self, path: Path, size: int) -> None:
+        with self._lock:
+            index = self._load()
+            if path in index:
+                self._total -= index.pop(path)
+            index[path] = size
+            self._total += size
+            while self._total > self.max_bytes and len(index) > 1:
+                oldest, oldest_size = index.popitem(last=False)
+                self._total -= oldest_size
+                with contextlib.suppress(FileNotFoundError):
+                    oldest.unlink()
+
+    def discard(self, variant_key: str) -> None:
+        directory = self.root / variant_key
+        with self._lock:
+            index = self._load()
+            for path in list(index):
+                if path.parent == directory:
+                    self._total -= index.pop(path)
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+_cache: VariantCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_variant_cache() -> VariantCache:
+    global _cache
+    root = Path(settings.media_root) / "variants"
+    with _cache_lock:
+        if _cache is None or _cache.root != root:
+            _cache = VariantCache(root, settings.photo_variant_cache_bytes)
+        return _cache
+
+
+def _render(source: Path, target: Path, spec: VariantSpec) -> int:
+    # Opened here so a missing or unreadable file stays an I/O error; what
+    # Pillow raises while decoding means the upload is not a usable image.
+    with open(source, "rb") as handle:
+        try:
+            image = Image.open(handle)
+            # Decode now: truncated files otherwise fail later, mid-resize.
+            image.load()
+        except (OSError, Image.DecompressionBombError) as exc:
+            raise UnsupportedImageError(str(exc)) from exc
+        with image:
+            return _save_variant(image, target, spec)
+
+
+def _save_variant(image: Image.Image, target: Path, spec: VariantSpec) -> int:
+    image = ImageOps.exif_transpose(image)
+    if image.width > spec.width:
+        height = max(1, round(image.height * spec.width / image.width))
+        image = image.resize((spec.width, height), Image.Resampling.LANCZOS)
+    if spec.image_format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            image.save(handle, format=spec.image_format.upper(), quality=spec.quality)
+        os.replace(tmp_name, target)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+    return target.stat().st_size
+
+
+def get_or_create_variant(
+    variant_key: str, storage_key: str, spec: VariantSpec
+) -> Path:
+    if not variants_available():
+        raise VariantsUnavailableError("Image variants require Pillow")
+    cache = get_variant_cache()
+    target = cache.root / variant_key / spec.filename()
+    if cache.get(target):
+        return target
+    source = Path(settings.media_root) / storage_key
+    size = _render(source, target, spec)
+    cache.put(target, size)
+    return target
+
+
+def thumbnail_specs() -> list[VariantSpec]:
+    widths = [item.strip() for item in settings.photo_thumbnail_widths.split(",")]
+    capped = {
+        min(int(width), settings.photo_variant_max_width) for width in widths if width
+    }
+    return [VariantSpec(width=width) for width in sorted(capped)]
+
+
+def queue_thumbnails(photo: PastoEntryPhoto) -> None:
+    if not variants_available():
+        return
+    key = variant_id(photo)
+    for spec in thumbnail_specs():
+        submit_background(get_or_create_variant, key, photo.storage_key, spec)
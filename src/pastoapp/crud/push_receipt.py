@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from pastoapp.core.cache import MemoryCache
+from pastoapp.core.config import settings
+from pastoapp.db.session import SessionLocal
+from pastoapp.db.unit_of_work import on_commit
+from pastoapp.models.push_receipt import SyncPushReceipt
+
+receipt_cache = MemoryCache(
+    settings.sync_idempotency_cache_size, settings.sync_idempotency_ttl_seconds
+)
+
+
+def receipt_key(device_id: str | None, idempotency_key: str) -> str:
+    # Keys are chosen by clients, so they are only unique per device.
+    raw = f"{device_id or ''}\0{idempotency_key}".encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _cutoff() -> datetime:
+    return datetime.now(tz=UTC) - timedelta(
+        seconds=settings.sync_idempotency_ttl_seconds
+    )
+
+
+def get_push_receipt(db: Session, key: str) -> dict | None:
+    response = receipt_cache.get(key)
+    if response is not None or settings.sync_idempotency_store != "database":
+        return response
+    response = db.scalar(
+        select(SyncPushReceipt.response).where(
+            SyncPushReceipt.key == key, SyncPushReceipt.created_at >= _cutoff()
+        )
+    )
+    if response is not None:
+        receipt_cache.set(key, response)
+    return response
+
+
+def save_push_receipt(db: Session, key: str, response: dict) -> None:
+    # Stored with the push's own writes; replays only start once they commit.
+    on_commit(db, receipt_cache.set, key, response)
+    if settings.sync_idempotency_store != "database":
+        return
+    # merge: a concurrent retry may have stored the same key first.
+    db.merge(
+        SyncPushReceipt(key=key, response=response, created_at=datetime.now(tz=UTC))
+    )
+    db.flush()
+
+
+def prune_push_receipts(db: Session) -> int:
+    result = db.execute(
+        delete(SyncPushReceipt).where(SyncPushReceipt.created_at < _cutoff())
+    )
+    db.commit()
+    return result.rowcount
+
+
+def run_push_receipt_prune() -> int:
+    with SessionLocal() as db:
+        return prune_push_receipts(db)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import contextlib
+import gzip
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from pastoapp.core.config import settings
+from pastoapp.crud.pasto_entry import entry_columns
+from pastoapp.db.session import SessionLocal
+from pastoapp.models.pasto_entry import PastoEntry
+from pastoapp.schemas.pasto_entry import PastoEntryRead
+
+SNAPSHOT_PREFIX = "pasto-entries-"
+SNAPSHOT_SUFFIX = ".ndjson.gz"
+_BATCH_SIZE = 1000
+
+_refresh_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    path: Path
+    seq: int
+
+
+def _snapshot_dir() -> Path:
+    return Path(settings.media_root) / "snapshots"
+
+
+def _list_snapshots() -> list[Snapshot]:
+    snapshots = []
+    for path in _snapshot_dir().glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"):
+        seq = path.name[len(SNAPSHOT_PREFIX) : -len(SNAPSHOT_SUFFIX)]
+        if seq.isdigit():
+            snapshots.append(Snapshot(path=path, seq=int(seq)))
+    return sorted(snapshots, key=lambda snapshot: snapshot.seq)
+
+
+def latest_snapshot() -> Snapshot | None:
+    snapshots = _list_snapshots()
+    return snapshots[-1] if snapshots else None
+
+
+def _write_snapshot(db: Session, seq: int) -> Snapshot:
+    # Only rows at or below seq are written. Sequence values commit in order,
+    # so a device that pulls from seq afterwards misses nothing.
+    stmt = entry_columns(
+        select(PastoEntry)
+        .where(PastoEntry.updated_seq <= seq, PastoEntry.deleted_at.is_(None))
+        .order_by(PastoEntry.updated_seq)
+    ).execution_options(yield_per=_BATCH_SIZE)
+    target = _snapshot_dir() / f"{SNAPSHOT_PREFIX}{seq}{SNAPSHOT_SUFFIX}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with (
+            os.fdopen(fd, "wb") as raw,
+            gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as handle,
+        ):
+            handle.write(json.dumps({"snapshotSeq": seq}).encode() + b"\n")
+            for rows in db.execute(stmt).partitions():
+                lines = [
+                    PastoEntryRead.model_validate(row).model_dump_json(by_alias=True)
+                    for row in rows
+                ]
+                handle.write(("\n".join(lines) + "\n").encode())
+        os.replace(tmp_name, target)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+    return Snapshot(path=target, seq=seq)
+
+
+def refresh_snapshot(db: Session) -> Snapshot:
+    """Write a new snapshot unless the newest one is already current."""
+    with _refresh_lock:
+        seq = int(db.scalar(select(func.max(PastoEntry.updated_seq))) or 0)
+        current = latest_snapshot()
+        if current is not None and current.seq >= seq:
+            return current
+        snapshot = _write_snapshot(db, seq)
+        db.rollback()
+        # Clients may still be downloading the previous file; keep one.
+        for stale in _list_snapshots()[:-2]:
+            with contextlib.suppress(FileNotFoundError):
+                stale.path.unlink()
+        return snapshot
+
+
+def run_snapshot_refresh() -> Snapshot:
+    with SessionLocal() as db:
+        return refresh_snapshot(db)
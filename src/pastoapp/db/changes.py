@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import select
+import threading
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger("pastoapp.changes")
+
+NOTIFY_CHANNEL = "pasto_changes"
+# Session.info key holding the highest updated_seq allocated in the open
+# transaction; published once that transaction commits.
+PENDING_SEQ_KEY = "pasto_pending_seq"
+
+
+class ChangeNotifier:
+    # Wakes waiting requests when a transaction that allocated updated_seq
+    # values commits. Publishers may run on any thread; waiters are asyncio
+    # futures woken on their own loop.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest = 0
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+
+    @property
+    def latest(self) -> int:
+        return self._latest
+
+    def publish(self, seq: int) -> None:
+        with self._lock:
+            if seq <= self._latest:
+                return
+            self._latest = seq
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(_resolve, future, seq)
+
+    async def wait_for(self, after: int, timeout: float) -> int | None:
+        """Return the latest seq once it passes ``after``, or None on timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            future = loop.create_future()
+            with self._lock:
+                if self._latest > after:
+                    return self._latest
+                self._waiters.add((loop, future))
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    return None
+                await asyncio.wait_for(future, remaining)
+            except TimeoutError:
+                return None
+            finally:
+                with self._lock:
+                    self._waiters.discard((loop, future))
+
+
+def _resolve(future: asyncio.Future, seq: int) -> None:
+    if not future.done():
+        future.set_result(seq)
+
+
+change_notifier = ChangeNotifier()
+
+
+def record_pending_seq(db: Session, seq: int) -> None:
+    db.info[PENDING_SEQ_KEY] = max(db.info.get(PENDING_SEQ_KEY, 0), seq)
+
+
+def install_change_hooks(notify_backend: str) -> None:
+    # Commit and rollback events also fire for savepoints, which must neither
+    # publish nor drop the outer transaction's pending seq.
+    @event.listens_for(Session, "before_commit")
+    def _notify_other_workers(db: Session) -> None:
+        seq = db.info.get(PENDING_SEQ_KEY)
+        if seq is None or notify_backend != "postgres" or db.in_nested_transaction():
+            return
+        if db.get_bind().dialect.name == "postgresql":
+            # Delivered by PostgreSQL only if and when this transaction commits.
+            db.execute(
+                text("SELECT pg_notify(:channel, :seq)"),
+                {"channel": NOTIFY_CHANNEL, "seq": str(seq)},
+            )
+
+    @event.listens_for(Session, "after_commit")
+    def _publish_committed(db: Session) -> None:
+        if db.in_nested_transaction():
+            return
+        seq = db.info.pop(PENDING_SEQ_KEY, None)
+        if seq is not None:
+            change_notifier.publish(seq)
+
+    @event.listens_for(Session, "after_rollback")
+    def _drop_pending(db: Session) -> None:
+        if db.in_nested_transaction():
+            return
+        db.info.pop(PENDING_SEQ_KEY, None)
+
+
+class PostgresChangeListener:
+    # LISTENs on a dedicated connection and forwards NOTIFY payloads from
+    # other workers to the in-process notifier.
+    def __init__(self, database_url: str, poll_seconds: float = 5.0) -> None:
+        self._engine = create_engine(database_url, poolclass=NullPool)
+        self._poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="pastoapp-listen", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self._poll_seconds + 1)
+        self._engine.dispose()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Change listener lost its connection")
+                self._stop.wait(self._poll_seconds)
+
+    def _listen(self) -> None:
+        with self._engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql(f"LISTEN {NOTIFY_CHANNEL}")
+            raw = conn.connection.driver_connection
+            while not self._stop.is_set():
+                readable, _, _ = select.select([raw], [], [], self._poll_seconds)
+                if not readable:
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    with contextlib.suppress(ValueError):
+                        change_notifier.publish(int(notify.payload))
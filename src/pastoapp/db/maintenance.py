@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import zlib
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import TypeVar
+
+from sqlalchemy import text
+
+from pastoapp.core.config import settings
+from pastoapp.db.session import engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process guard for SQLite.
+    fcntl = None
+
+T = TypeVar("T")
+
+# Every worker process starts the maintenance loops (photo GC, snapshot
+# refresh, change log upkeep, receipt pruning). Each run first takes a lock
+# named after its job and the workers that miss it skip that round, so one
+# process at a time does the work. PostgreSQL and MySQL locks are held by a
+# database connection and so also cover workers on other hosts; SQLite only
+# has workers on one host and uses a file lock next to the media.
+_PG_NAMESPACE = 0x6D61_696E
+
+logger = logging.getLogger("pastoapp.maintenance")
+
+
+def _pg_key(job: str) -> int:
+    return (_PG_NAMESPACE << 32) | zlib.crc32(job.encode())
+
+
+@contextlib.contextmanager
+def _database_lock(job: str) -> Iterator[bool]:
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Transaction-scoped, so it is released when the connection
+            # rolls back on close, also behind PgBouncer.
+            yield bool(
+                conn.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"),
+                    {"key": _pg_key(job)},
+                ).scalar()
+            )
+            return
+        name = f"pastoapp:{job}"
+        acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": name})
+        if acquired.scalar() != 1:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+
+
+@contextlib.contextmanager
+def _file_lock(job: str) -> Iterator[bool]:
+    if fcntl is None:
+        yield True
+        return
+    root = Path(settings.media_root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / f".maintenance-{job}.lock", "a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _job_lock(job: str) -> contextlib.AbstractContextManager[bool]:
+    if engine.dialect.name in {"postgresql", "mysql", "mariadb"}:
+        return _database_lock(job)
+    return _file_lock(job)
+
+
+def run_exclusive(job: str, fn: Callable[[], T]) -> T | None:
+    """Run ``fn`` unless another process is running ``job``; None if skipped."""
+    with _job_lock(job) as acquired:
+        if not acquired:
+            logger.debug("Skipping %s: another process is running it", job)
+            return None
+        return fn()
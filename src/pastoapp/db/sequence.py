@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from pastoapp.db.changes import record_pending_seq
+from pastoapp.models.pasto_entry import PastoEntry
+from pastoapp.models.sync_sequence import PASTO_ENTRIES_SEQUENCE, SyncSequence
+
+# Allocation happens inside the writer's transaction and keeps a lock until
+# that transaction ends, so sequence values become visible in the order they
+# were handed out and a pull cursor can never jump over an uncommitted row.
+# The sync_sequences row is written in that same transaction on every
+# backend, so reading it gives the highest committed seq; the PostgreSQL
+# sequence itself already counts values handed to open transactions.
+_PG_LOCK_KEY = 0x7061_7374
+
+
+def allocate_seq_block(db: Session, count: int = 1) -> int:
+    if count < 1:
+        raise ValueError("count must be positive")
+    if db.get_bind().dialect.name == "postgresql":
+        first = _allocate_pg(db, count)
+    else:
+        first = _allocate_counter(db, count)
+    record_pending_seq(db, first + count - 1)
+    return first
+
+
+def current_seq(db: Session) -> int:
+    """Highest seq allocated by a committed transaction (or by this one)."""
+    value = db.execute(
+        select(SyncSequence.value).where(SyncSequence.name == PASTO_ENTRIES_SEQUENCE)
+    ).scalar()
+    if value is None:
+        return _max_updated_seq(db)
+    return int(value)
+
+
+def lock_writes(db: Session) -> None:
+    """Take SQLite's write lock before reading rows this transaction rewrites.
+
+    PostgreSQL and MySQL lock those rows with SELECT ... FOR UPDATE. SQLite
+    ignores FOR UPDATE and only locks the database at the first write, so
+    touching the counter row starts the write transaction before the read.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        _set_counter(db, SyncSequence.value)
+
+
+def _allocate_pg(db: Session, count: int) -> int:
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+    last = db.execute(
+        text("SELECT setval(:name, nextval(:name) + :count - 1)"),
+        {"name": PASTO_ENTRIES_SEQUENCE, "count": count},
+    ).scalar_one()
+    _set_counter(db, int(last))
+    return int(last) - count + 1
+
+
+def _allocate_counter(db: Session, count: int) -> int:
+    _set_counter(db, SyncSequence.value + count)
+    last = db.execute(
+        select(SyncSequence.value).where(SyncSequence.name == PASTO_ENTRIES_SEQUENCE)
+    ).scalar_one()
+    return int(last) - count + 1
+
+
+def _set_counter(db: Session, value: Any) -> None:
+    stmt = (
+        update(SyncSequence)
+        .where(SyncSequence.name == PASTO_ENTRIES_SEQUENCE)
+        .values(value=value)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(stmt).rowcount == 0:
+        _seed_counter(db)
+        db.execute(stmt)
+
+
+def _seed_counter(db: Session) -> None:
+    # Databases built with create_all (tests, local SQLite) have no seed row.
+    try:
+        with db.begin_nested():
+            seed = _max_updated_seq(db)
+            db.add(SyncSequence(name=PASTO_ENTRIES_SEQUENCE, value=seed))
+    except IntegrityError:
+        pass
+
+
+def _max_updated_seq(db: Session) -> int:
+    return int(db.execute(select(func.max(PastoEntry.updated_seq))).scalar() or 0)
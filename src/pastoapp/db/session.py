@@ -1,20 +1,149 @@
 from __future__ import annotations
 
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Generator, Sequence
+from typing import Any, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import Row, Select, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from pastoapp.core.config import settings
+from pastoapp.core.profiling import profiled
+from pastoapp.db.changes import install_change_hooks
+from pastoapp.db.pool import engine_options, install_idle_ping
 
+T = TypeVar("T")
 
-engine = create_engine(str(settings.database_url), pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Async driver -> sync driver used for migrations and background threads.
+_ASYNC_DRIVERS = {
+    "asyncpg": "psycopg2",
+    "aiosqlite": "pysqlite",
+    "aiomysql": "pymysql",
+    "asyncmy": "pymysql",
+}
 
 
+def is_async_database_url(url: str) -> bool:
+    _, _, driver = make_url(url).drivername.partition("+")
+    return driver in _ASYNC_DRIVERS
+
+
+def sync_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend, _, driver = parsed.drivername.partition("+")
+    if driver not in _ASYNC_DRIVERS:
+        return url
+    parsed = parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[driver]}")
+    return parsed.render_as_string(hide_password=False)
+
+
+ASYNC_MODE = is_async_database_url(str(settings.database_url))
+
+_sync_url = sync_database_url(str(settings.database_url))
+engine = create_engine(_sync_url, **engine_options(_sync_url, settings))
+# Objects stay loaded after commit: responses are built from what the flush
+# already sent back (RETURNING), not re-read.
+SessionLocal = sessionmaker(
+    bind=engine, autocommit=False, autoflush=False, expire_on_commit=False
+)
+
+async_engine = (
+    create_async_engine(
+        str(settings.database_url),
+        **engine_options(str(settings.database_url), settings, is_async=True),
+    )
+    if ASYNC_MODE
+    else None
+)
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None
+    else None
+)
+
+# Engine serving request sessions; its pool is what /api/status/db-pool reports.
+request_engine = async_engine.sync_engine if async_engine is not None else engine
+
+if settings.db_pool_pre_ping == "idle":
+    install_idle_ping(request_engine, settings.db_pool_ping_idle_seconds)
+    if request_engine is not engine:
+        install_idle_ping(engine, settings.db_pool_ping_idle_seconds)
+
+install_change_hooks(settings.sync_notify_backend)
+
+
+# One transaction per request: CRUD functions only flush, and everything the
+# endpoint wrote commits together once it returns; an exception rolls it all
+# back. Endpoints that write declare Depends(get_session, scope="function") so
+# this happens before the response is sent, and normally commit already
+# through run_db_commit.
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
+        db.commit()
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+        await db.commit()
+
+
+# Endpoints depend on get_session; in sync mode it is get_db itself, so
+# dependency overrides registered against get_db keep working.
+get_session = get_async_db if ASYNC_MODE else get_db
+
+
+async def run_db(
+    db: Session | AsyncSession, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(profiled(fn), db, *args, **kwargs)
+
+
+def _call_and_commit(db: Session, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    result = fn(db, *args, **kwargs)
+    db.commit()
+    return result
+
+
+async def run_db_commit(
+    db: Session | AsyncSession, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Run the request's writes and commit them in the same worker call.
+
+    Write locks (the updated_seq lock above all) are held from the first
+    write until commit. Committing in a later threadpool call would need a
+    free thread while the writers queued behind those locks occupy the pool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(_call_and_commit, fn, *args, **kwargs)
+    return await run_in_threadpool(profiled(_call_and_commit), db, fn, *args, **kwargs)
+
+
+async def stream_db(
+    db: Session | AsyncSession, stmt: Select, batch_size: int = 200
+) -> AsyncIterator[Sequence[Row]]:
+    """Yield result rows in batches read through a server-side cursor."""
+    stmt = stmt.execution_options(yield_per=batch_size)
+    if isinstance(db, AsyncSession):
+        async_result = await db.stream(stmt)
+        try:
+            async for partition in async_result.partitions():
+                yield partition
+        finally:
+            await async_result.close()
+        return
+    result = await run_in_threadpool(db.execute, stmt)
+    partitions = result.partitions()
+    try:
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+    finally:
+        await run_in_threadpool(result.close)
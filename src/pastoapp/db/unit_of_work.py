@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+# CRUD functions only flush; the request's session commits once when the
+# endpoint returns (see get_db). Work that must only happen once the writes
+# are durable, like evicting caches, is queued here until then.
+_TRANSACTION_KEY = "pasto_transaction"
+
+
+def transaction_state(db: Session) -> dict[str, Any]:
+    """Scratch state of the open transaction, discarded when it ends."""
+    return db.info.setdefault(_TRANSACTION_KEY, {})
+
+
+def on_commit(db: Session, fn: Callable[..., Any], *args: Any) -> None:
+    """Call ``fn(*args)`` after the open transaction commits; dropped on rollback."""
+    transaction_state(db).setdefault("on_commit", []).append((fn, args))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(db: Session) -> None:
+    # Also fired when a savepoint is released; only the outer commit counts.
+    if db.in_nested_transaction():
+        return
+    state = db.info.pop(_TRANSACTION_KEY, None) or {}
+    for fn, args in state.get("on_commit", ()):
+        fn(*args)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_state(db: Session, transaction: SessionTransaction) -> None:
+    # Rollbacks and Session.close() of an open transaction end up here.
+    if not transaction.nested:
+        db.info.pop(_TRANSACTION_KEY, None)
@@ -1,20 +1,132 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import logging
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import TypeVar
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from pastoapp.api.responses import FastJSONResponse
 from pastoapp.api.router import api_router
+from pastoapp.core.compression import CompressionMiddleware
 from pastoapp.core.config import settings
 from pastoapp.core.logging import setup_logging
+from pastoapp.core.metrics import InstrumentationMiddleware
+from pastoapp.core.workers import shutdown_workers, submit_background
+from pastoapp.crud.change_log import run_change_log_maintenance
+from pastoapp.crud.photo import run_photo_garbage_collection
+from pastoapp.crud.push_receipt import run_push_receipt_prune
+from pastoapp.crud.snapshot import run_snapshot_refresh
+from pastoapp.db.changes import PostgresChangeListener
+from pastoapp.db.maintenance import run_exclusive
+from pastoapp.db.session import engine
 
+T = TypeVar("T")
 
 setup_logging(settings.log_level)
 logger = logging.getLogger("pastoapp")
 
-app = FastAPI(title="PastoAppBack", version="1.0.0")
+
+async def _run_maintenance(job: str, fn: Callable[[], T]) -> T | None:
+    # Every worker runs these loops; run_exclusive lets one of them do each
+    # round and the rest skip it (None).
+    return await asyncio.wrap_future(submit_background(run_exclusive, job, fn))
+
+
+async def _photo_gc_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await _run_maintenance("photo_gc", run_photo_garbage_collection)
+            if removed is not None:
+                logger.info("Photo garbage collection removed %d blobs", removed)
+        except Exception:
+            logger.exception("Photo garbage collection failed")
+
+
+async def _snapshot_loop(interval: float) -> None:
+    while True:
+        try:
+            snapshot = await _run_maintenance("snapshot", run_snapshot_refresh)
+            if snapshot is not None:
+                logger.debug("Sync snapshot is at seq %d", snapshot.seq)
+        except Exception:
+            logger.exception("Sync snapshot refresh failed")
+        await asyncio.sleep(interval)
+
+
+async def _change_log_loop(interval: float) -> None:
+    while True:
+        try:
+            removed = await _run_maintenance("change_log", run_change_log_maintenance)
+            if removed is not None:
+                logger.info("Change log compaction removed %d rows", removed)
+        except Exception:
+            logger.exception("Change log maintenance failed")
+        await asyncio.sleep(interval)
+
+
+async def _push_receipt_prune_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await _run_maintenance("push_receipts", run_push_receipt_prune)
+            if removed is not None:
+                logger.debug("Pruned %d expired push receipts", removed)
+        except Exception:
+            logger.exception("Push receipt pruning failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tasks = []
+    if settings.photo_gc_interval_seconds > 0:
+        tasks.append(
+            asyncio.create_task(_photo_gc_loop(settings.photo_gc_interval_seconds))
+        )
+    if settings.snapshot_refresh_seconds > 0:
+        tasks.append(
+            asyncio.create_task(_snapshot_loop(settings.snapshot_refresh_seconds))
+        )
+    if settings.change_log_maintenance_seconds > 0:
+        tasks.append(
+            asyncio.create_task(
+                _change_log_loop(settings.change_log_maintenance_seconds)
+            )
+        )
+    if settings.sync_idempotency_store == "database":
+        interval = min(settings.sync_idempotency_ttl_seconds, 3600)
+        tasks.append(asyncio.create_task(_push_receipt_prune_loop(interval)))
+    listener = None
+    if (
+        settings.sync_notify_backend == "postgres"
+        and engine.dialect.name == "postgresql"
+    ):
+        listener = PostgresChangeListener(
+            engine.url.render_as_string(hide_password=False)
+        )
+        listener.start()
+    yield
+    if listener is not None:
+        listener.stop()
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    shutdown_workers()
+
+
+app = FastAPI(
+    title="PastoAppBack",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 
 @app.middleware("http")
@@ -34,17 +146,33 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal Server Error", "error": str(exc)},
     )
 
+
 allow_origins = settings.cors_origins_list()
 allow_credentials = True
 if allow_origins == ["*"]:
     allow_credentials = False
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    zstd_level=settings.compression_zstd_level,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=allow_credentials,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "X-Snapshot-Seq",
+        "Idempotent-Replayed",
+        "Server-Timing",
+    ],
 )
+# Outermost: times the whole stack and tags the response that is sent.
+app.add_middleware(InstrumentationMiddleware)
 
 app.include_router(api_router, prefix="/api")
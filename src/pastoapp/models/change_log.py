@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DDL, BigInteger, DateTime, Index, String, Uuid, event
+from sqlalchemy.orm import Mapped, mapped_column
+
+from pastoapp.db.base import Base
+
+CHANGE_LOG_TABLE = "pasto_entry_changes"
+# Scope of entries written without a device id.
+NO_DEVICE_SCOPE = ""
+
+
+# Append-only: one row per write, carrying the updated_seq it was given.
+# Rows whose seq is no longer the entry's updated_seq are superseded and
+# removed by compaction. On PostgreSQL the table is range-partitioned by seq.
+class PastoEntryChange(Base):
+    __tablename__ = CHANGE_LOG_TABLE
+    __table_args__ = (
+        Index("ix_pasto_entry_changes_seq", "seq"),
+        {"postgresql_partition_by": "RANGE (seq)"},
+    )
+
+    scope: Mapped[str] = mapped_column(String(128), primary_key=True)
+    seq: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # Rows from before the seq allocator may share a seq; the uuid keeps
+    # their backfilled log rows distinct.
+    entry_uuid: Mapped[uuid.UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
+
+# Catches rows beyond the ranges created so far (see ensure_partitions).
+event.listen(
+    PastoEntryChange.__table__,
+    "after_create",
+    DDL(
+        f"CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE}_default "
+        f"PARTITION OF {CHANGE_LOG_TABLE} DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, Integer, String, Uuid, func
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, String, Uuid, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from pastoapp.db.base import Base
@@ -11,13 +11,24 @@ from pastoapp.db.base import Base
 
 class PastoEntry(Base):
     __tablename__ = "pasto_entries"
+    __table_args__ = (
+        Index("ix_pasto_entries_updated_seq", "updated_seq"),
+        Index("ix_pasto_entries_device_seq", "device_id", "updated_seq"),
+        Index("ix_pasto_entries_created_id", "created_at", "id"),
+        Index("ix_pasto_entries_device_created_id", "device_id", "created_at", "id"),
+    )
+    # Server defaults come back in the INSERT/UPDATE (RETURNING where the
+    # backend has it) instead of a SELECT on first access after the flush.
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     uuid: Mapped[uuid.UUID] = mapped_column(
         Uuid(as_uuid=True), unique=True, nullable=False, default=uuid.uuid4
     )
     lot_number: Mapped[str] = mapped_column(String(100), nullable=False)
-    entry_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    entry_time: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
     exit_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -32,3 +43,8 @@ class PastoEntry(Base):
     updated_seq: Mapped[int] = mapped_column(
         BigInteger, nullable=False, default=0, server_default="0"
     )
+    # Field name -> updated_seq of the write that last changed it; lets a
+    # pull send only what changed after the client's cursor. NULL on rows
+    # written before tracking existed, meaning "everything at updated_seq".
+    # deleted_at is not tracked here: tombstones change it at updated_seq.
+    field_seqs: Mapped[dict[str, int] | None] = mapped_column(JSON, nullable=True)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Uuid, func
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Uuid, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from pastoapp.db.base import Base
@@ -11,6 +11,8 @@ from pastoapp.db.base import Base
 
 class PastoEntryPhoto(Base):
     __tablename__ = "pasto_entry_photos"
+    __table_args__ = (Index("ix_pasto_entry_photos_entry_uuid", "entry_uuid"),)
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     uuid: Mapped[uuid.UUID] = mapped_column(
@@ -20,6 +22,7 @@ class PastoEntryPhoto(Base):
         Uuid(as_uuid=True), ForeignKey("pasto_entries.uuid"), nullable=False
     )
     storage_key: Mapped[str] = mapped_column(String(512), nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
     mime_type: Mapped[str | None] = mapped_column(String(100), nullable=True)
     size: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
@@ -28,3 +31,21 @@ class PastoEntryPhoto(Base):
     deleted_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
+
+
+class PhotoBlob(Base):
+    __tablename__ = "photo_blobs"
+    __table_args__ = (Index("ix_photo_blobs_orphaned", "ref_count", "orphaned_at"),)
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String(512), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    orphaned_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
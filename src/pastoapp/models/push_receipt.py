@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from pastoapp.db.base import Base
+
+
+# Response of a push batch, replayed when the same idempotency key comes back.
+class SyncPushReceipt(Base):
+    __tablename__ = "sync_push_receipts"
+    __table_args__ = (Index("ix_sync_push_receipts_created_at", "created_at"),)
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    response: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
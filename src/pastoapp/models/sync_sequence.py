@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Sequence, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from pastoapp.db.base import Base
+
+PASTO_ENTRIES_SEQUENCE = "pasto_entries_updated_seq"
+
+pasto_entries_updated_seq = Sequence(PASTO_ENTRIES_SEQUENCE, metadata=Base.metadata)
+
+
+class SyncSequence(Base):
+    __tablename__ = "sync_sequences"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
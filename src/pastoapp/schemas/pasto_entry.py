@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class PastoEntryBase(BaseModel):
@@ -21,7 +21,7 @@ class PastoEntryBase(BaseModel):
 
 class PastoEntryCreate(PastoEntryBase):
     @model_validator(mode="after")
-    def map_legacy_id(self) -> "PastoEntryCreate":
+    def map_legacy_id(self) -> PastoEntryCreate:
         if self.uuid is None and isinstance(self.id, str):
             try:
                 self.uuid = UUID(self.id)
@@ -43,6 +43,20 @@ class PastoEntryUpdate(BaseModel):
     photo_base64: str | None = Field(default=None, alias="photoBase64")
 
 
+class PastoEntryPatch(PastoEntryUpdate):
+    """Partial push: only the fields that are present get written."""
+
+    uuid: UUID = Field(..., alias="uuid")
+
+    @field_validator("lot_number", "entry_time", "exit_time")
+    @classmethod
+    def reject_null(cls, value: object) -> object:
+        # Leaving a field out keeps it; these columns cannot be cleared.
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+
 class PastoEntryRead(BaseModel):
     model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
+from typing import Any
 
 from pydantic import BaseModel, ConfigDict, Field
 
-from pastoapp.schemas.pasto_entry import PastoEntryCreate, PastoEntryRead
+from pastoapp.schemas.pasto_entry import (
+    PastoEntryCreate,
+    PastoEntryPatch,
+    PastoEntryRead,
+)
 
 
 class SyncPushRequest(BaseModel):
@@ -13,7 +18,12 @@ class SyncPushRequest(BaseModel):
 
     device_id: str | None = Field(default=None, alias="deviceId")
     client_time: datetime | None = Field(default=None, alias="clientTime")
+    # Same as the Idempotency-Key header; the header wins when both are sent.
+    idempotency_key: str | None = Field(
+        default=None, alias="idempotencyKey", max_length=255
+    )
     items: list[PastoEntryCreate] = []
+    patches: list[PastoEntryPatch] = []
     deleted_ids: list[uuid.UUID] = Field(default_factory=list, alias="deletedIds")
 
 
@@ -27,6 +37,10 @@ class SyncPushResponse(BaseModel):
 
     accepted: list[uuid.UUID]
     rejected: list[SyncRejectedItem]
+    # deletedIds the server has never seen; nothing was written for them.
+    unknown_deleted_ids: list[uuid.UUID] = Field(
+        default_factory=list, alias="unknownDeletedIds"
+    )
     server_time: datetime = Field(..., alias="serverTime")
     new_cursor: int = Field(..., alias="newCursor")
 
@@ -37,3 +51,18 @@ class SyncPullResponse(BaseModel):
     items: list[PastoEntryRead]
     deleted: list[uuid.UUID]
     new_cursor: int = Field(..., alias="newCursor")
+
+
+class SyncDeltaPullResponse(BaseModel):
+    """Pull with only the fields changed after the cursor.
+
+    Each row is ``[uuid, updatedSeq, updatedAt, mask, *values]``: bit ``i`` of
+    ``mask`` is set when ``fields[i]`` changed, and the values of the set
+    bits follow in ``fields`` order.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    fields: list[str]
+    rows: list[list[Any]]
+    new_cursor: int = Field(..., alias="newCursor")
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+from pastoapp.core.config import Settings, settings
+from pastoapp.core.logging import setup_logging
+
+APP = "pastoapp.main:app"
+# cgroup v2 CPU limit ("max 100000" or "<quota> <period>"), set by
+# docker --cpus and Kubernetes CPU limits; the affinity mask ignores it.
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+
+logger = logging.getLogger("pastoapp.server")
+
+
+def _cgroup_cpu_limit(path: Path = CGROUP_CPU_MAX) -> int | None:
+    try:
+        quota, period = path.read_text().split()[:2]
+        if quota == "max":
+            return None
+        return max(math.ceil(int(quota) / int(period)), 1)
+    except (OSError, ValueError, ZeroDivisionError):
+        return None
+
+
+def available_cpus() -> int:
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, limit)
+    return max(count, 1)
+
+
+def worker_count(configured: int) -> int:
+    """``configured`` workers, or one per available CPU when it is 0."""
+    return configured if configured > 0 else available_cpus()
+
+
+def _pick(choice: str, fast: str, fallback: str) -> str:
+    if choice != "auto":
+        return choice
+    return fast if importlib.util.find_spec(fast) is not None else fallback
+
+
+def event_loop(config: Settings) -> str:
+    return _pick(config.web_loop, "uvloop", "asyncio")
+
+
+def http_protocol(config: Settings) -> str:
+    return _pick(config.web_http, "httptools", "h11")
+
+
+def uvicorn_options(config: Settings) -> dict[str, Any]:
+    return {
+        "host": config.web_host,
+        "port": config.web_port,
+        "loop": event_loop(config),
+        "http": http_protocol(config),
+        "backlog": config.web_backlog,
+        "timeout_keep_alive": config.web_keepalive_seconds,
+        "timeout_graceful_shutdown": config.web_graceful_timeout_seconds,
+        "limit_max_requests": config.web_max_requests or None,
+        "forwarded_allow_ips": config.web_forwarded_allow_ips,
+        "log_level": config.log_level.lower(),
+    }
+
+
+def per_process_warnings(config: Settings, workers: int) -> list[str]:
+    """Settings whose state lives in one process and so splits across workers."""
+    if workers <= 1:
+        return []
+    warnings = []
+    if config.sync_notify_backend == "local":
+        warnings.append(
+            "sync_notify_backend=local: long-poll and SSE waiters only wake for "
+            "writes made by their own worker; use postgres"
+        )
+    if config.sync_idempotency_store == "memory":
+        warnings.append(
+            "sync_idempotency_store=memory: a retried push that reaches another "
+            "worker is applied again instead of replayed; use database"
+        )
+    if config.entry_cache_backend == "memory":
+        warnings.append(
+            "entry_cache_backend=memory: writes only evict the cache of the "
+            "worker that made them; use redis or a short entry_cache_ttl_seconds"
+        )
+    return warnings
+
+
+def _serve_uvicorn(config: Settings, workers: int) -> None:
+    import uvicorn
+
+    # Workers are spawned and import the app themselves, so there is nothing
+    # to preload. SIGHUP restarts them one at a time; SIGTTIN / SIGTTOU add
+    # or remove one.
+    uvicorn.run(APP, workers=workers, **uvicorn_options(config))
+
+
+def _dispose_inherited_pools(server: Any, worker: Any) -> None:
+    # A preloaded app is imported before the fork; connections the parent
+    # may have opened must not be shared with the children.
+    from pastoapp.db.session import engine, request_engine
+
+    engine.dispose(close=False)
+    if request_engine is not engine:
+        request_engine.dispose(close=False)
+
+
+def gunicorn_options(config: Settings, workers: int) -> dict[str, Any]:
+    return {
+        "bind": f"{config.web_host}:{config.web_port}",
+        "workers": workers,
+        "backlog": config.web_backlog,
+        "keepalive": config.web_keepalive_seconds,
+        "graceful_timeout": config.web_graceful_timeout_seconds,
+        "max_requests": config.web_max_requests,
+        # Spread recycling out so the workers do not all restart together.
+        "max_requests_jitter": config.web_max_requests // 10,
+        "preload_app": config.web_preload,
+        "forwarded_allow_ips": config.web_forwarded_allow_ips,
+        "loglevel": config.log_level.lower(),
+        "post_fork": _dispose_inherited_pools,
+    }
+
+
+def _serve_gunicorn(config: Settings, workers: int) -> None:
+    try:
+        from gunicorn.app.base import BaseApplication
+        from uvicorn_worker import UvicornWorker
+    except ImportError as exc:
+        raise SystemExit(
+            "web_server=gunicorn needs the server extra: pip install -e .[server]"
+        ) from exc
+
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {
+            "loop": event_loop(config),
+            "http": http_protocol(config),
+            "timeout_graceful_shutdown": config.web_graceful_timeout_seconds,
+        }
+
+    options = {**gunicorn_options(config, workers), "worker_class": Worker}
+
+    class Application(BaseApplication):
+        # SIGHUP starts new workers before stopping the old ones gracefully;
+        # with web_preload the app is not re-imported, so deploy new code
+        # with a full restart.
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            from pastoapp.main import app
+
+            return app
+
+    Application().run()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the API with one worker process per CPU."
+    )
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"))
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    overrides = {
+        "web_server": args.server,
+        "web_host": args.host,
+        "web_port": args.port,
+        "web_workers": args.workers,
+    }
+    config = settings.model_copy(
+        update={key: value for key, value in overrides.items() if value is not None}
+    )
+
+    setup_logging(config.log_level)
+    workers = worker_count(config.web_workers)
+    logger.info(
+        "Starting %s with %d workers (loop=%s, http=%s)",
+        config.web_server,
+        workers,
+        event_loop(config),
+        http_protocol(config),
+    )
+    logger.info(
+        "Each worker pools up to %d database connections (%d in total)",
+        config.db_pool_size + config.db_max_overflow,
+        (config.db_pool_size + config.db_max_overflow) * workers,
+    )
+    for message in per_process_warnings(config, workers):
+        logger.warning(message)
+
+    if config.web_server == "gunicorn":
+        _serve_gunicorn(config, workers)
+    else:
+        _serve_uvicorn(config, workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,11 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
 
+from pastoapp.crud.pasto_entry import entry_cache
 from pastoapp.db.base import Base
 from pastoapp.db.session import get_db
 from pastoapp.main import app
@@ -18,9 +20,13 @@ from pastoapp.main import app
 @pytest.fixture(scope="function")
 def db_session() -> Generator[Session, None, None]:
     engine = create_engine(
-        "sqlite+pysqlite:///:memory:", connect_args={"check_same_thread": False}
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
     )
     Base.metadata.create_all(bind=engine)
+    # uuids repeat across tests, each of which gets a fresh database.
+    entry_cache.clear()
     TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
     db = TestingSessionLocal()
     try:
@@ -32,10 +38,13 @@ def db_session() -> Generator[Session, None, None]:
 @pytest.fixture(scope="function")
 async def client(db_session: Session) -> AsyncGenerator[AsyncClient, None]:
     def override_get_db() -> Generator[Session, None, None]:
+        # Mirrors get_db's single commit, keeping the session for assertions.
         try:
             yield db_session
-        finally:
-            pass
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
 
     app.dependency_overrides[get_db] = override_get_db
     async with AsyncClient(app=app, base_url="http://test") as test_client:
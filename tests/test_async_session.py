@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.pool import StaticPool
+
+from pastoapp.db.base import Base
+from pastoapp.db.session import get_db, is_async_database_url, sync_database_url
+from pastoapp.main import app
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+
+def test_async_url_detection() -> None:
+    assert is_async_database_url("postgresql+asyncpg://u:p@db/pastoapp")
+    assert not is_async_database_url("postgresql+psycopg2://u:p@db/pastoapp")
+    assert (
+        sync_database_url("postgresql+asyncpg://u:p@db/pastoapp")
+        == "postgresql+psycopg2://u:p@db/pastoapp"
+    )
+    assert sync_database_url("sqlite+aiosqlite:///x.db") == "sqlite+pysqlite:///x.db"
+
+
+@pytest.fixture(scope="function")
+async def async_client() -> AsyncGenerator[AsyncClient, None]:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
+        async with session_factory() as db:
+            yield db
+            await db.commit()
+
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+async def test_async_session_push_pull(async_client: AsyncClient) -> None:
+    now = datetime.now(tz=UTC).isoformat()
+    entry = {
+        "uuid": "dddddddd-dddd-dddd-dddd-dddddddddddd",
+        "lotNumber": "L1",
+        "entryTime": now,
+        "exitTime": now,
+    }
+    response = await async_client.post("/api/pasto/entries", json=entry)
+    assert response.status_code == 201
+
+    response = await async_client.patch(
+        f"/api/pasto/entries/{entry['uuid']}", json={"lotNumber": "L2"}
+    )
+    assert response.json()["lotNumber"] == "L2"
+
+    response = await async_client.post(
+        "/api/sync/pasto/push",
+        json={"items": [], "deletedIds": [entry["uuid"]]},
+    )
+    assert response.status_code == 200
+
+    response = await async_client.get("/api/sync/pasto/pull", params={"cursor": 0})
+    assert response.json()["deleted"] == [entry["uuid"]]
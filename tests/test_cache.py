@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import fnmatch
+from collections.abc import Iterator
+from datetime import UTC, datetime
+
+import pytest
+from httpx import AsyncClient
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from pastoapp.core.cache import MemoryCache, RedisCache
+from pastoapp.crud.pasto_entry import _EntryValues, entry_cache
+from pastoapp.models.pasto_entry import PastoEntry
+
+ENTRY_UUID = "12121212-1212-1212-1212-121212121212"
+
+
+class FakeRedis:
+    # The handful of redis-py calls RedisCache makes, backed by a dict.
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        self.data[key] = value
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, pattern: str) -> Iterator[str]:
+        return iter(fnmatch.filter(list(self.data), pattern))
+
+
+@pytest.fixture
+def redis_entry_cache() -> Iterator[FakeRedis]:
+    client = FakeRedis()
+    backend = entry_cache.backend
+    entry_cache.backend = RedisCache(
+        client, 30, TypeAdapter(_EntryValues), prefix="test:entry:"
+    )
+    try:
+        yield client
+    finally:
+        entry_cache.backend = backend
+
+
+def _entry_payload() -> dict:
+    now = datetime.now(tz=UTC).isoformat()
+    return {"uuid": ENTRY_UUID, "lotNumber": "L1", "entryTime": now, "exitTime": now}
+
+
+def test_memory_cache_is_bounded_and_expires() -> None:
+    cache = MemoryCache(max_items=2, ttl_seconds=60)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    cache.get("a")
+    cache.set("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+
+    expired = MemoryCache(max_items=2, ttl_seconds=0)
+    expired.set("a", {"n": 1})
+    assert expired.get("a") is None
+
+
+async def _exercise_entry_cache(client: AsyncClient) -> None:
+    await client.post("/api/pasto/entries", json=_entry_payload())
+    first = await client.get(f"/api/pasto/entries/{ENTRY_UUID}")
+    second = await client.get(f"/api/pasto/entries/{ENTRY_UUID}")
+    assert second.json() == first.json()
+
+    response = await client.patch(
+        f"/api/pasto/entries/{ENTRY_UUID}", json={"lotNumber": "L2"}
+    )
+    assert response.status_code == 200
+    response = await client.get(f"/api/pasto/entries/{ENTRY_UUID}")
+    assert response.json()["lotNumber"] == "L2"
+
+    await client.delete(f"/api/pasto/entries/{ENTRY_UUID}")
+    response = await client.get(f"/api/pasto/entries/{ENTRY_UUID}")
+    assert response.json()["deletedAt"] is not None
+
+
+async def test_entry_cache_reads_through_and_invalidates(client: AsyncClient) -> None:
+    await _exercise_entry_cache(client)
+
+    stats = (await client.get("/api/status/entry-cache")).json()
+    assert stats["backend"] == "MemoryCache"
+    # GET, GET, PATCH, GET, DELETE, GET: misses after each write only. The
+    # writes themselves read the row from the database; PATCH only checks
+    # the cache for a 404 first.
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+
+
+async def test_entry_cache_shared_backend(
+    client: AsyncClient, redis_entry_cache: FakeRedis
+) -> None:
+    await _exercise_entry_cache(client)
+
+    assert list(redis_entry_cache.data) == [f"test:entry:{ENTRY_UUID}"]
+    stats = (await client.get("/api/status/entry-cache")).json()
+    assert stats["backend"] == "RedisCache"
+    assert stats["hits"] == 2
+
+
+async def test_writes_ignore_stale_cached_entries(
+    client: AsyncClient, db_session: Session
+) -> None:
+    await client.post("/api/pasto/entries", json=_entry_payload())
+    await client.get(f"/api/pasto/entries/{ENTRY_UUID}")
+    # Another worker changes the row; this process still caches "L1".
+    db_session.execute(update(PastoEntry).values(lot_number="L9"))
+    db_session.commit()
+
+    response = await client.patch(
+        f"/api/pasto/entries/{ENTRY_UUID}", json={"lotNumber": "L1"}
+    )
+    assert response.status_code == 200
+    assert response.json()["lotNumber"] == "L1"
+    db_session.expire_all()
+    stored = db_session.scalars(select(PastoEntry)).one()
+    assert stored.lot_number == "L1"
+    assert stored.field_seqs["lot_number"] == stored.updated_seq
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import gzip
+from datetime import UTC, datetime
+
+import pytest
+from httpx import AsyncClient
+from starlette.types import Message, Receive, Scope, Send
+
+from pastoapp.core.compression import (
+    CompressionMiddleware,
+    available_encodings,
+    negotiate_encoding,
+)
+
+
+def _entry_payload(index: int) -> dict:
+    now = datetime.now(tz=UTC).isoformat()
+    return {
+        "uuid": f"00000000-0000-0000-0000-{index:012d}",
+        "lotNumber": f"L{index}",
+        "entryTime": now,
+        "exitTime": now,
+        "createdAt": now,
+    }
+
+
+def test_negotiate_encoding_honours_weights() -> None:
+    supported = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, deflate, br, zstd", supported) == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", supported) == "gzip"
+    assert negotiate_encoding("zstd;q=0, gzip", supported) == "gzip"
+    assert negotiate_encoding("*", supported) == "zstd"
+    assert negotiate_encoding("identity", supported) is None
+    assert negotiate_encoding("", supported) is None
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+async def test_pull_is_compressed_when_negotiated(
+    client: AsyncClient, encoding: str
+) -> None:
+    if encoding not in available_encodings():
+        pytest.skip(f"{encoding} support is not installed")
+    items = [_entry_payload(index) for index in range(1, 101)]
+    await client.post("/api/sync/pasto/push", json={"items": items})
+
+    plain = await client.get(
+        "/api/sync/pasto/pull", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in plain.headers
+    response = await client.get(
+        "/api/sync/pasto/pull", headers={"Accept-Encoding": encoding}
+    )
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == plain.json()
+    assert len(response.content) == len(plain.content)
+    assert response.num_bytes_downloaded < len(plain.content) / 4
+
+
+async def test_small_and_streamed_responses(client: AsyncClient) -> None:
+    response = await client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    items = [_entry_payload(index) for index in range(1, 301)]
+    await client.post("/api/sync/pasto/push", json={"items": items})
+    response = await client.get(
+        "/api/sync/pasto/pull",
+        headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"},
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 301
+
+
+async def test_streamed_chunks_are_not_held_back() -> None:
+    sent: list[Message] = []
+    line = b'{"uuid": "00000000-0000-0000-0000-000000000001"}\n'
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")],
+            }
+        )
+        await send({"type": "http.response.body", "body": line, "more_body": True})
+        # The first line is on the wire before the next one is produced.
+        assert [message["type"] for message in sent] == [
+            "http.response.start",
+            "http.response.body",
+        ]
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    middleware = CompressionMiddleware(app, minimum_size=1024)
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    await middleware(scope, None, send)
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert gzip.decompress(b"".join(m["body"] for m in sent[1:])) == line
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
 
 from httpx import AsyncClient
@@ -47,3 +48,54 @@ async def test_patch_and_delete_entry(client: AsyncClient) -> None:
     response = await client.get(f"/api/pasto/entries/{entry_uuid}")
     assert response.status_code == 200
     assert response.json()["deletedAt"] is not None
+
+
+async def test_list_entries_pages_with_cursor(client: AsyncClient) -> None:
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for index in range(5):
+        payload = _payload()
+        payload["uuid"] = f"00000000-0000-0000-0000-00000000000{index}"
+        # Two entries share a timestamp; the id breaks the tie.
+        payload["createdAt"] = created.replace(day=1 + min(index, 3)).isoformat()
+        await client.post("/api/pasto/entries", json=payload)
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get("/api/pasto/entries", params=params)
+        assert response.status_code == 200
+        seen.extend(item["uuid"][-1] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    assert seen == ["4", "3", "2", "1", "0"]
+
+    response = await client.get("/api/pasto/entries", params={"after": "%%%"})
+    assert response.status_code == 400
+
+
+async def test_list_entries_streams_ndjson(client: AsyncClient) -> None:
+    for index in range(3):
+        payload = _payload()
+        payload["uuid"] = f"00000000-0000-0000-0000-00000000000{index}"
+        await client.post("/api/pasto/entries", json=payload)
+
+    headers = {"Accept": "application/x-ndjson"}
+    response = await client.get(
+        "/api/pasto/entries", params={"limit": 2}, headers=headers
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    json_page = await client.get("/api/pasto/entries", params={"limit": 2})
+    assert lines[:-1] == json_page.json()
+    assert lines[-1] == {"nextCursor": json_page.headers["x-next-cursor"]}
+
+    response = await client.get(
+        "/api/pasto/entries",
+        params={"limit": 2, "after": lines[-1]["nextCursor"]},
+        headers=headers,
+    )
+    assert [json.loads(line)["uuid"][-1] for line in response.text.splitlines()] == [
+        "0"
+    ]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from pastoapp.core.config import settings
+from pastoapp.db.maintenance import run_exclusive
+
+_OTHER_WORKER = (
+    "from pastoapp.db.maintenance import run_exclusive; "
+    "print(run_exclusive('photo_gc', lambda: 'ran'))"
+)
+
+
+def _run_in_other_process(media_root: Path) -> str:
+    env = {**os.environ, "MEDIA_ROOT": str(media_root)}
+    result = subprocess.run(
+        [sys.executable, "-c", _OTHER_WORKER],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_maintenance_job_runs_in_one_process_at_a_time(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "media_root", str(tmp_path))
+
+    def job() -> str:
+        # Other workers reaching the same job meanwhile skip their round;
+        # other jobs are not held up.
+        assert _run_in_other_process(tmp_path) == "None"
+        assert run_exclusive("snapshot", lambda: "other") == "other"
+        return "first"
+
+    def failing_job() -> None:
+        raise RuntimeError("boom")
+
+    assert run_exclusive("photo_gc", job) == "first"
+    with pytest.raises(RuntimeError):
+        run_exclusive("photo_gc", failing_job)
+    # Released once a run is over, also when it failed.
+    assert _run_in_other_process(tmp_path) == "ran"
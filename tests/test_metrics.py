@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import cProfile
+import logging
+import pstats
+import uuid
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from pastoapp.core import profiling
+from pastoapp.core.config import settings
+from pastoapp.core.metrics import (
+    _QUERY_START_KEY,
+    HISTOGRAMS,
+    RequestMetrics,
+    _current,
+    _log_repeated_statements,
+    install_query_metrics,
+)
+from pastoapp.models.pasto_entry import PastoEntry
+
+
+@pytest.fixture
+def metrics_enabled(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+    yield
+
+
+def _timings(header: str) -> dict[str, str]:
+    timings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        timings[name] = params
+    return timings
+
+
+async def test_server_timing_reports_queries(
+    client: AsyncClient, metrics_enabled: None
+) -> None:
+    now = datetime.now(tz=UTC).isoformat()
+    await client.post(
+        "/api/sync/pasto/push",
+        json={"items": [{"lotNumber": "L1", "entryTime": now, "exitTime": now}]},
+    )
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": 0})
+
+    timings = _timings(response.headers["server-timing"])
+    assert 'desc="1 queries"' in timings["db"]
+    assert {"validate", "serialize", "app"} <= timings.keys()
+
+    text = (await client.get("/api/status/metrics")).text
+    assert (
+        'pastoapp_request_queries_count{method="GET",route="/api/sync/pasto/pull"} 1'
+        in text
+    )
+    assert 'pastoapp_request_phase_seconds_count{phase="serialize"' in text
+
+
+async def test_single_entry_responses_report_phases(
+    client: AsyncClient, metrics_enabled: None
+) -> None:
+    now = datetime.now(tz=UTC).isoformat()
+    created = await client.post(
+        "/api/pasto/entries",
+        json={"lotNumber": "L1", "entryTime": now, "exitTime": now},
+    )
+    assert created.status_code == 201
+    response = await client.get(f"/api/pasto/entries/{created.json()['uuid']}")
+
+    assert response.status_code == 200
+    assert response.json()["lotNumber"] == "L1"
+    timings = _timings(response.headers["server-timing"])
+    assert {"validate", "serialize"} <= timings.keys()
+
+
+async def test_metrics_off_adds_nothing(client: AsyncClient) -> None:
+    response = await client.get("/api/status")
+    assert "server-timing" not in response.headers
+
+
+def test_repeated_statements_are_logged(
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(settings, "query_repeat_threshold", 3)
+    install_query_metrics()
+    metrics = RequestMetrics(track_statements=True)
+    token = _current.set(metrics)
+    try:
+        # A per-item lookup loop, as in a one-by-one push.
+        for _ in range(3):
+            db_session.scalar(select(PastoEntry).where(PastoEntry.uuid == uuid.uuid4()))
+        db_session.scalar(select(PastoEntry.id).limit(1))
+    finally:
+        _current.reset(token)
+
+    with caplog.at_level(logging.WARNING, logger="pastoapp.queries"):
+        _log_repeated_statements(metrics, "POST", "/api/sync/pasto/push")
+
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert "ran the same statement 3 times" in message
+    assert "pasto_entries.uuid" in message
+
+
+def test_failed_statements_leave_no_start_time(db_session: Session) -> None:
+    install_query_metrics()
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT * FROM no_such_table"))
+        started = db_session.connection().info.get(_QUERY_START_KEY)
+        db_session.scalar(select(PastoEntry.id).limit(1))
+    finally:
+        _current.reset(token)
+
+    assert started == []
+    assert metrics.queries == 2
+
+
+async def test_slow_statements_are_explained(
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(settings, "query_debug", True)
+    monkeypatch.setattr(settings, "slow_query_ms", 1e-6)
+
+    with caplog.at_level(logging.WARNING, logger="pastoapp.queries"):
+        response = await client.get("/api/pasto/entries", params={"limit": 5})
+
+    assert response.status_code == 200
+    messages = [record.getMessage() for record in caplog.records]
+    slow = [message for message in messages if "Slow statement" in message]
+    assert slow
+    assert "parameters: " in slow[0]
+    assert "SCAN" in slow[0] or "SEARCH" in slow[0]
+
+
+async def test_sampled_requests_are_profiled(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+
+    response = await client.get("/api/pasto/entries")
+
+    assert response.status_code == 200
+    (capture,) = tmp_path.glob("*-GET-api_pasto_entries-*ms.prof")
+    functions = {name for _, _, name in pstats.Stats(str(capture)).stats}
+    # Work done in the threadpool through run_db is part of the capture.
+    assert "list_entries" in functions
+
+
+class _ExclusiveProfile(cProfile.Profile):
+    # Python 3.12+ behaviour: one active cProfile profiler per process.
+    active: _ExclusiveProfile | None = None
+
+    def enable(self, *args: object, **kwargs: object) -> None:
+        if _ExclusiveProfile.active is not None:
+            raise ValueError("Another profiling tool is already active")
+        super().enable(*args, **kwargs)
+        _ExclusiveProfile.active = self
+
+    def disable(self) -> None:
+        super().disable()
+        if _ExclusiveProfile.active is self:
+            _ExclusiveProfile.active = None
+
+
+async def test_sampled_writes_share_one_profiler(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(profiling.cProfile, "Profile", _ExclusiveProfile)
+    now = datetime.now(tz=UTC).isoformat()
+
+    response = await client.post(
+        "/api/sync/pasto/push",
+        json={"items": [{"lotNumber": "L1", "entryTime": now, "exitTime": now}]},
+    )
+
+    assert response.status_code == 200
+    assert _ExclusiveProfile.active is None
+    assert len(list(tmp_path.glob("*-POST-api_sync_pasto_push-*ms.prof"))) == 1
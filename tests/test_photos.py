@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import os
+import uuid
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from pastoapp.api.endpoints import pasto_entries as entry_endpoints
+from pastoapp.core.config import settings
+from pastoapp.core.workers import submit_background
+from pastoapp.crud import photo as photo_crud
+from pastoapp.crud import photo_variant
+from pastoapp.crud.photo import Base64StreamReader, collect_photo_garbage
+from pastoapp.db.session import get_db
+from pastoapp.main import app
+from pastoapp.models.photo import PastoEntryPhoto, PhotoBlob
+
+ENTRY_UUID = "eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee"
+
+
+@pytest.fixture(autouse=True)
+def media_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(settings, "media_root", str(tmp_path))
+    return tmp_path
+
+
+async def _create_entry(client: AsyncClient) -> None:
+    now = datetime.now(tz=UTC).isoformat()
+    response = await client.post(
+        "/api/pasto/entries",
+        json={"uuid": ENTRY_UUID, "lotNumber": "L1", "entryTime": now, "exitTime": now},
+    )
+    assert response.status_code == 201
+
+
+async def test_upload_photo_streams_to_storage(
+    client: AsyncClient, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "photo_chunk_size", 1024)
+    await _create_entry(client)
+    contents = bytes(range(256)) * 100
+
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("photo.jpg", contents, "image/jpeg")},
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["size"] == len(contents)
+
+    db = next(app.dependency_overrides[get_db]())
+    photo = db.get(PastoEntryPhoto, data["id"])
+    assert photo.content_hash == hashlib.sha256(contents).hexdigest()
+    assert (media_root / photo.storage_key).read_bytes() == contents
+    assert not list(media_root.glob(".upload-*"))
+
+    response = await client.get(f"/api/photos/{data['uuid']}/content")
+    assert response.content == contents
+
+
+async def test_upload_photo_rejects_oversized_and_empty(
+    client: AsyncClient, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "photo_max_bytes", 4096)
+    monkeypatch.setattr(settings, "photo_chunk_size", 1024)
+    await _create_entry(client)
+
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("photo.jpg", b"x" * 5000, "image/jpeg")},
+    )
+    assert response.status_code == 413
+
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("photo.jpg", b"", "image/jpeg")},
+    )
+    assert response.status_code == 400
+    assert not [path for path in media_root.rglob("*") if path.is_file()]
+
+
+def test_base64_stream_reader_decodes_in_chunks() -> None:
+    data = bytes(range(256)) * 50
+    encoded = base64.b64encode(data).decode()
+    wrapped = "\n".join(encoded[i : i + 76] for i in range(0, len(encoded), 76))
+    reader = Base64StreamReader(wrapped)
+    chunks = []
+    while chunk := reader.read(1000):
+        assert len(chunk) <= 1002
+        chunks.append(chunk)
+    assert b"".join(chunks) == data
+
+    with pytest.raises(ValueError):
+        while Base64StreamReader("aGVsbG8*").read(4):
+            pass
+
+
+async def test_entry_photo_base64_inline_and_background(
+    client: AsyncClient, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await _create_entry(client)
+    contents = b"\xff\xd8" + b"photo" * 1000
+    photo_base64 = "data:image/jpeg;base64," + base64.b64encode(contents).decode()
+
+    response = await client.patch(
+        f"/api/pasto/entries/{ENTRY_UUID}", json={"photoBase64": photo_base64}
+    )
+    assert response.status_code == 200
+    response = await client.get(f"/api/pasto/entries/{ENTRY_UUID}/photos")
+    photos = response.json()
+    assert [photo["mime_type"] for photo in photos] == ["image/jpeg"]
+
+    response = await client.patch(
+        f"/api/pasto/entries/{ENTRY_UUID}", json={"photoBase64": "not base64!"}
+    )
+    assert response.status_code == 400
+
+    db = next(app.dependency_overrides[get_db]())
+    monkeypatch.setattr(settings, "photo_background_writes", True)
+    monkeypatch.setattr(photo_crud, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    queued = []
+    monkeypatch.setattr(
+        photo_crud,
+        "submit_background",
+        lambda fn, *args: queued.append(submit_background(fn, *args)),
+    )
+    response = await client.patch(
+        f"/api/pasto/entries/{ENTRY_UUID}", json={"photoBase64": photo_base64}
+    )
+    assert response.status_code == 200
+    queued[0].result(timeout=5)
+    response = await client.get(f"/api/pasto/entries/{ENTRY_UUID}/photos")
+    assert len(response.json()) == 2
+
+
+async def test_entry_and_inline_photo_commit_together(
+    client: AsyncClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # As in SessionLocal; the shared test session expires for other tests.
+    monkeypatch.setattr(db_session, "expire_on_commit", False)
+    commits = []
+    event.listen(db_session.get_bind(), "commit", commits.append)
+    now = datetime.now(tz=UTC).isoformat()
+    photo_base64 = base64.b64encode(b"\xff\xd8" + b"photo" * 100).decode()
+    body = {"lotNumber": "L1", "entryTime": now, "exitTime": now}
+
+    response = await client.post(
+        "/api/pasto/entries",
+        json={**body, "uuid": ENTRY_UUID, "photoBase64": photo_base64},
+    )
+    assert response.status_code == 201
+    assert len(commits) == 1
+
+    def failing_record(*args: object) -> None:
+        raise HTTPException(status_code=409, detail="Photo conflict")
+
+    monkeypatch.setattr(entry_endpoints, "create_photo_record", failing_record)
+    other_uuid = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+    response = await client.post(
+        "/api/pasto/entries",
+        json={**body, "uuid": other_uuid, "photoBase64": photo_base64},
+    )
+    assert response.status_code == 409
+    assert len(commits) == 1
+    # The entry written before the photo step failed was rolled back with it.
+    response = await client.get(f"/api/pasto/entries/{other_uuid}")
+    assert response.status_code == 404
+
+
+async def test_duplicate_uploads_share_one_blob(
+    client: AsyncClient, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await _create_entry(client)
+    contents = b"same photo" * 500
+    photo_ids = []
+    for _ in range(3):
+        response = await client.post(
+            f"/api/pasto/entries/{ENTRY_UUID}/photos",
+            files={"file": ("photo.jpg", contents, "image/jpeg")},
+        )
+        assert response.status_code == 201
+        photo_ids.append(response.json()["uuid"])
+
+    blob_files = [path for path in (media_root / "blobs").rglob("*") if path.is_file()]
+    assert len(blob_files) == 1
+    db = next(app.dependency_overrides[get_db]())
+    blob = db.scalars(select(PhotoBlob)).one()
+    assert blob.ref_count == 3
+
+    stray = media_root / "blobs" / "00" / "00" / ("0" * 64)
+    stray.parent.mkdir(parents=True)
+    stray.write_bytes(b"never recorded")
+
+    for photo_id in photo_ids:
+        response = await client.delete(f"/api/photos/{photo_id}")
+        assert response.status_code == 204
+    db.refresh(blob)
+    assert blob.ref_count == 0
+    assert blob.orphaned_at is not None
+
+    assert collect_photo_garbage(db, grace_seconds=0) == 2
+    assert not [path for path in (media_root / "blobs").rglob("*") if path.is_file()]
+    assert db.scalars(select(PhotoBlob)).all() == []
+
+
+def test_garbage_collection_unlinks_after_commit(
+    db_session: Session, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stored = photo_crud.store_photo_stream(io.BytesIO(b"collected photo" * 300))
+    photo = photo_crud.create_photo_record(
+        db_session, uuid.UUID(ENTRY_UUID), stored, None
+    )
+    photo_crud.delete_photo(db_session, photo)
+    db_session.commit()
+    blob_path = media_root / stored.storage_key
+    os.utime(blob_path, (0, 0))
+    variant = media_root / "variants" / stored.content_hash / "w120-q80.jpeg"
+    variant.parent.mkdir(parents=True)
+    variant.write_bytes(b"thumbnail")
+    monkeypatch.setattr(photo_variant, "_cache", None)
+
+    def failing_commit() -> None:
+        raise RuntimeError("commit failed")
+
+    # Nothing is unlinked for deletes that never committed.
+    with monkeypatch.context() as patched:
+        patched.setattr(db_session, "commit", failing_commit)
+        with pytest.raises(RuntimeError):
+            collect_photo_garbage(db_session, grace_seconds=0)
+    db_session.rollback()
+    assert blob_path.exists()
+    assert variant.exists()
+
+    assert collect_photo_garbage(db_session, grace_seconds=0) == 1
+    assert not blob_path.exists()
+    assert not variant.parent.exists()
+
+
+def test_reused_blob_survives_garbage_collection(
+    db_session: Session, media_root: Path
+) -> None:
+    contents = b"reused photo" * 300
+    first = photo_crud.store_photo_stream(io.BytesIO(contents))
+    photo_crud.create_photo_record(db_session, uuid.UUID(ENTRY_UUID), first, None)
+    db_session.commit()
+    blob_path = media_root / first.storage_key
+
+    # A file last written long ago, with no committed row yet, is kept once
+    # an upload reuses it.
+    db_session.execute(delete(PhotoBlob))
+    db_session.commit()
+    os.utime(blob_path, (0, 0))
+    second = photo_crud.store_photo_stream(io.BytesIO(contents))
+    assert collect_photo_garbage(db_session, grace_seconds=60) == 0
+    assert blob_path.exists()
+
+    # Collected anyway between the upload and its insert: rewritten.
+    blob_path.unlink()
+    photo = photo_crud.create_photo_record(
+        db_session, uuid.UUID(ENTRY_UUID), second, None
+    )
+    db_session.commit()
+    assert blob_path.read_bytes() == contents
+    assert db_session.get(PhotoBlob, photo.content_hash).ref_count == 1
+
+
+async def test_photo_content_caching_and_ranges(client: AsyncClient) -> None:
+    await _create_entry(client)
+    contents = bytes(range(256)) * 40
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("photo.jpg", contents, "image/jpeg")},
+    )
+    url = f"/api/photos/{response.json()['uuid']}/content"
+
+    response = await client.get(url)
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(contents).hexdigest()}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = await client.get(url, headers={"If-None-Match": f'W/{etag}, "x"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = await client.get(url, headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.content == contents[1000:]
+    size = len(contents)
+    assert response.headers["content-range"] == f"bytes 1000-{size - 1}/{size}"
+
+    response = await client.get(
+        url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+    assert response.status_code == 200
+    assert response.content == contents
+
+    response = await client.head(url)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(contents))
+
+
+def _jpeg_bytes(width: int, height: int) -> bytes:
+    image_module = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    image_module.new("RGB", (width, height), (30, 120, 60)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+async def test_photo_variants_are_resized_and_cached(
+    client: AsyncClient, media_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    image_module = pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(photo_variant, "_cache", None)
+    monkeypatch.setattr(settings, "photo_thumbnail_widths", "120")
+    queued = []
+    monkeypatch.setattr(
+        photo_variant,
+        "submit_background",
+        lambda fn, *args: queued.append(submit_background(fn, *args)),
+    )
+    await _create_entry(client)
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("photo.jpg", _jpeg_bytes(800, 600), "image/jpeg")},
+    )
+    url = f"/api/photos/{response.json()['uuid']}/content"
+    pregenerated = queued[0].result(timeout=5)
+    assert pregenerated.exists()
+
+    response = await client.get(url, params={"w": 120})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert image_module.open(io.BytesIO(response.content)).size == (120, 90)
+    etag = response.headers["etag"]
+    assert etag.endswith('-w120-q80.webp"')
+
+    response = await client.get(url, params={"w": 120}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = await client.get(url, params={"w": 200, "format": "jpeg", "q": 60})
+    assert response.headers["content-type"] == "image/jpeg"
+    assert image_module.open(io.BytesIO(response.content)).size == (200, 150)
+    assert len(list((media_root / "variants").rglob("*.*"))) == 2
+
+
+async def test_photo_variant_errors(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(photo_variant, "_cache", None)
+    await _create_entry(client)
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("notes.txt", b"not an image", "text/plain")},
+    )
+    url = f"/api/photos/{response.json()['uuid']}/content"
+
+    response = await client.get(url, params={"w": 120})
+    assert response.status_code == 415
+
+    # The header parses, so this only fails once the pixel data is decoded.
+    truncated = _jpeg_bytes(64, 64)[:-200]
+    response = await client.post(
+        f"/api/pasto/entries/{ENTRY_UUID}/photos",
+        files={"file": ("cut.jpg", truncated, "image/jpeg")},
+    )
+    response = await client.get(
+        f"/api/photos/{response.json()['uuid']}/content", params={"w": 32}
+    )
+    assert response.status_code == 415
+
+    def unreadable(*args: object) -> None:
+        raise PermissionError("permission denied")
+
+    # Storage failures are server errors, not a verdict on the image.
+    monkeypatch.setattr(photo_variant, "_render", unreadable)
+    with pytest.raises(PermissionError):
+        await client.get(url, params={"w": 200})
+
+
+def test_thumbnail_widths_are_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "photo_variant_max_width", 800)
+    monkeypatch.setattr(settings, "photo_thumbnail_widths", "320, 4000,800")
+
+    assert [spec.width for spec in photo_variant.thumbnail_specs()] == [320, 800]
+
+
+def test_variant_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = photo_variant.VariantCache(tmp_path, max_bytes=250)
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / "photo" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * 100)
+        paths.append(path)
+        cache.put(path, 100)
+        if name == "b":
+            assert cache.get(paths[0])
+
+    assert paths[0].exists()
+    assert not paths[1].exists()
+    assert paths[2].exists()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from httpx import AsyncClient
+from sqlalchemy import create_engine, text
+
+from pastoapp.core.config import Settings
+from pastoapp.db.pool import (
+    TimedQueuePool,
+    engine_options,
+    install_idle_ping,
+    pool_stats,
+    pool_status,
+)
+
+
+def test_engine_options_follow_settings() -> None:
+    config = Settings(
+        database_url="postgresql+asyncpg://u:p@db/pastoapp",
+        db_pool_size=25,
+        db_max_overflow=5,
+        db_pool_pre_ping="never",
+        db_pgbouncer=True,
+    )
+    options = engine_options(str(config.database_url), config, is_async=True)
+    assert options["pool_size"] == 25
+    assert options["max_overflow"] == 5
+    assert options["pool_pre_ping"] is False
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+
+
+def test_timed_pool_records_checkouts_and_idle_pings(tmp_path: Path) -> None:
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=2
+    )
+    install_idle_ping(engine, idle_seconds=0)
+    checkouts, pings = pool_stats.checkouts, pool_stats.pings
+    for _ in range(3):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    status = pool_status(engine.pool)
+    assert status["size"] == 2
+    assert status["checkedOut"] == 0
+    assert pool_stats.checkouts == checkouts + 3
+    assert pool_stats.pings == pings + 2
+    engine.dispose()
+
+
+async def test_db_pool_status_endpoint(client: AsyncClient) -> None:
+    response = await client.get("/api/status/db-pool")
+    assert response.status_code == 200
+    assert "checkouts" in response.json()
@@ -0,0 +1,251 @@
+"""Query-plan regression checks for the CRUD read and sync paths.
+
+Loads a synthetic dataset, runs each CRUD call, captures the statements it
+sends and asserts through EXPLAIN that none of them scans or sorts a whole
+table, and that the call stays inside a latency budget.
+
+PLAN_TEST_ROWS scales the dataset (millions for a real check, the default
+keeps the suite fast). PLAN_TEST_DATABASE_URL points the harness at a
+scratch database migrated with ``alembic upgrade head`` instead of a
+temporary SQLite file; rows are only loaded when pasto_entries is empty.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable, Generator, Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine, create_engine, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from pastoapp.crud.change_log import compact_change_log
+from pastoapp.crud.pasto_entry import (
+    entry_cache,
+    get_entry,
+    get_max_updated_seq,
+    list_entries,
+    list_entries_by_cursor,
+    push_entries,
+    soft_delete_entry,
+)
+from pastoapp.crud.photo import get_photo, list_photos
+from pastoapp.db.base import Base
+from pastoapp.models.change_log import PastoEntryChange
+from pastoapp.models.pasto_entry import PastoEntry
+from pastoapp.models.photo import PastoEntryPhoto
+from pastoapp.schemas.pasto_entry import PastoEntryCreate
+
+PLAN_ROWS = int(os.environ.get("PLAN_TEST_ROWS", "20000"))
+PLAN_BUDGET_MS = float(os.environ.get("PLAN_TEST_BUDGET_MS", "100"))
+PLAN_DATABASE_URL = os.environ.get("PLAN_TEST_DATABASE_URL")
+
+DEVICES = 50
+PHOTO_EVERY = 10
+LARGE_TABLES = ("pasto_entries", "pasto_entry_photos", "pasto_entry_changes")
+BASE_TIME = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def _entry_uuid(index: int) -> uuid.UUID:
+    return uuid.UUID(int=index + 1)
+
+
+def _load_dataset(engine: Engine) -> None:
+    with Session(engine) as db:
+        if db.scalar(select(func.count()).select_from(PastoEntry)):
+            return
+        for start in range(0, PLAN_ROWS, 10_000):
+            rows = []
+            changes = []
+            photos = []
+            for index in range(start, min(start + 10_000, PLAN_ROWS)):
+                created_at = BASE_TIME + timedelta(minutes=index)
+                rows.append(
+                    {
+                        "uuid": _entry_uuid(index),
+                        "lot_number": f"L{index % 200}",
+                        "entry_time": created_at,
+                        "exit_time": created_at + timedelta(hours=2),
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                        "deleted_at": created_at if index % 20 == 0 else None,
+                        "device_id": f"device-{index % DEVICES}",
+                        "updated_seq": index + 1,
+                    }
+                )
+                changes.append(
+                    {
+                        "scope": f"device-{index % DEVICES}",
+                        "seq": index + 1,
+                        "entry_uuid": _entry_uuid(index),
+                        "changed_at": created_at,
+                    }
+                )
+                if index % PHOTO_EVERY == 0:
+                    photos.append(
+                        {
+                            "uuid": uuid.uuid4(),
+                            "entry_uuid": _entry_uuid(index),
+                            "storage_key": f"blobs/{index}",
+                            "created_at": created_at,
+                        }
+                    )
+            db.execute(insert(PastoEntry), rows)
+            db.execute(insert(PastoEntryChange), changes)
+            db.execute(insert(PastoEntryPhoto), photos)
+        db.commit()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Engine]:
+    if PLAN_DATABASE_URL:
+        engine = create_engine(PLAN_DATABASE_URL)
+    else:
+        path = Path(tmp_path_factory.mktemp("plans")) / "plans.db"
+        engine = create_engine(f"sqlite+pysqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+    _load_dataset(engine)
+    yield engine
+    engine.dispose()
+
+
+@contextmanager
+def _captured_statements(engine: Engine) -> Generator[list[tuple], None, None]:
+    statements: list[tuple] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in {"SELECT", "UPDATE", "DELETE"} and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _sqlite_problems(engine: Engine, statement: str, parameters) -> list[str]:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details = [row[-1] for row in rows]
+    problems = []
+    for detail in details:
+        full_scan = detail.startswith("SCAN ") and "USING" not in detail
+        if full_scan and detail.split()[1] in LARGE_TABLES:
+            problems.append(detail)
+        if "TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append(detail)
+    return problems
+
+
+def _plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _postgresql_problems(engine: Engine, statement: str, parameters) -> list[str]:
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar_one()
+        conn.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return [
+        f"Seq Scan on {node['Relation Name']}"
+        for node in _plan_nodes(plan[0]["Plan"])
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES
+    ]
+
+
+def _plan_problems(engine: Engine, statement: str, parameters) -> list[str]:
+    if engine.dialect.name == "postgresql":
+        return _postgresql_problems(engine, statement, parameters)
+    return _sqlite_problems(engine, statement, parameters)
+
+
+def _middle(db: Session) -> PastoEntry:
+    return get_entry(db, _entry_uuid(PLAN_ROWS // 2 + 1))
+
+
+def _push(db: Session) -> object:
+    items = [
+        PastoEntryCreate(
+            uuid=_entry_uuid(index) if index < PLAN_ROWS else uuid.uuid4(),
+            lot_number="push",
+            entry_time=BASE_TIME,
+            exit_time=BASE_TIME,
+        )
+        for index in range(PLAN_ROWS - 10, PLAN_ROWS + 10)
+    ]
+    return push_entries(db, items, "device-7")
+
+
+def _push_deletes(db: Session) -> object:
+    deleted_ids = [_entry_uuid(index) for index in range(0, PLAN_ROWS, PLAN_ROWS // 50)]
+    return push_entries(db, [], "device-7", deleted_ids=[*deleted_ids, uuid.uuid4()])
+
+
+SCENARIOS: dict[str, Callable[[Session], object]] = {
+    "pull_all": lambda db: list_entries_by_cursor(db, PLAN_ROWS - 200, 100, None),
+    "pull_device_start": lambda db: list_entries_by_cursor(db, 0, 100, "device-7"),
+    "pull_device_tail": lambda db: list_entries_by_cursor(
+        db, PLAN_ROWS - 500, 100, "device-7"
+    ),
+    "max_seq": get_max_updated_seq,
+    "get_entry": _middle,
+    "list_first_page": lambda db: list_entries(db, None, None, False, 100),
+    "list_with_deleted": lambda db: list_entries(db, None, None, True, 100),
+    "list_device": lambda db: list_entries(db, "device-7", None, False, 100),
+    "list_after_cursor": lambda db: list_entries(
+        db, None, None, False, 100, after=(_middle(db).created_at, _middle(db).id)
+    ),
+    "list_device_after_cursor": lambda db: list_entries(
+        db, "device-7", None, False, 100, after=(_middle(db).created_at, _middle(db).id)
+    ),
+    "list_device_updated_since": lambda db: list_entries(
+        db, "device-7", BASE_TIME + timedelta(minutes=PLAN_ROWS // 2), False, 100
+    ),
+    "push": _push,
+    "push_deletes": _push_deletes,
+    "soft_delete": lambda db: soft_delete_entry(db, _middle(db)),
+    "list_photos": lambda db: list_photos(db, _entry_uuid(PHOTO_EVERY * 3)),
+    "get_photo": lambda db: get_photo(db, uuid.uuid4()),
+    "compact_change_log": compact_change_log,
+}
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_crud_queries_use_indexes(plan_engine: Engine, name: str) -> None:
+    # Plans are about the database; a warm entry cache would hide its queries.
+    entry_cache.clear()
+    with Session(plan_engine) as db, _captured_statements(plan_engine) as statements:
+        started = time.perf_counter()
+        SCENARIOS[name](db)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        db.rollback()
+
+    assert statements
+    problems = {
+        statement: found
+        for statement, parameters in statements
+        if (found := _plan_problems(plan_engine, statement, parameters))
+    }
+    assert not problems, problems
+    assert elapsed_ms < PLAN_BUDGET_MS, f"{name} took {elapsed_ms:.1f} ms"
+
+
+def test_plan_check_flags_full_scans(plan_engine: Engine) -> None:
+    # Guard against the checker itself going blind.
+    statement = "SELECT * FROM pasto_entries WHERE lot_number = 'L1' ORDER BY exit_time"
+    assert _plan_problems(plan_engine, statement, ())
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from pastoapp.db.base import Base
+from pastoapp.db.sequence import allocate_seq_block, current_seq
+from pastoapp.models.pasto_entry import PastoEntry
+
+
+def test_sequence_blocks_are_contiguous_and_seeded(db_session: Session) -> None:
+    now = datetime.now(tz=UTC)
+    db_session.add(
+        PastoEntry(lot_number="L1", entry_time=now, exit_time=now, updated_seq=41)
+    )
+    db_session.commit()
+
+    assert current_seq(db_session) == 41
+    assert allocate_seq_block(db_session) == 42
+    assert allocate_seq_block(db_session, 10) == 43
+    assert allocate_seq_block(db_session) == 53
+    db_session.commit()
+    assert current_seq(db_session) == 53
+
+
+def test_current_seq_ignores_uncommitted_allocations(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'seq.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as writer, factory() as reader:
+        allocate_seq_block(writer, 5)
+        writer.commit()
+        assert allocate_seq_block(writer, 3) == 6
+        # A pull cursor taken now must not pass rows that commit later.
+        assert current_seq(reader) == 5
+        reader.rollback()
+        writer.commit()
+        assert current_seq(reader) == 8
+    engine.dispose()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any
+
+import pytest
+import uvicorn
+
+from pastoapp import server
+from pastoapp.core.config import settings
+
+
+def test_worker_count_follows_cpus_and_cgroup_limit(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("max 100000\n")
+    assert server._cgroup_cpu_limit(cpu_max) is None
+    cpu_max.write_text("150000 100000\n")
+    assert server._cgroup_cpu_limit(cpu_max) == 2
+    assert server._cgroup_cpu_limit(tmp_path / "missing") is None
+
+    monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: {0, 1, 2, 3})
+    monkeypatch.setattr(server, "_cgroup_cpu_limit", lambda: 2)
+    assert server.worker_count(0) == 2
+    assert server.worker_count(6) == 6
+
+
+def test_launcher_runs_uvicorn_workers_from_settings(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    calls: list[tuple[str, dict[str, Any]]] = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kw: calls.append((app, kw)))
+    monkeypatch.setattr(settings, "web_loop", "asyncio")
+    monkeypatch.setattr(settings, "web_max_requests", 0)
+    monkeypatch.setattr(settings, "sync_notify_backend", "local")
+
+    with caplog.at_level(logging.WARNING, logger="pastoapp.server"):
+        server.main(["--workers", "3", "--port", "9001"])
+
+    [(app, options)] = calls
+    assert app == "pastoapp.main:app"
+    assert options["workers"] == 3
+    assert options["port"] == 9001
+    assert options["loop"] == "asyncio"
+    assert options["http"] in {"httptools", "h11"}
+    assert options["limit_max_requests"] is None
+    assert options["timeout_graceful_shutdown"] == settings.web_graceful_timeout_seconds
+    assert any("sync_notify_backend" in r.getMessage() for r in caplog.records)
+
+    assert server.per_process_warnings(settings, 1) == []
+
+
+def test_gunicorn_options_preload_and_spread_recycling() -> None:
+    config = settings.model_copy(
+        update={"web_port": 8100, "web_max_requests": 1000, "web_preload": True}
+    )
+    options = server.gunicorn_options(config, 4)
+    assert options["bind"] == f"{config.web_host}:8100"
+    assert options["workers"] == 4
+    assert options["preload_app"] is True
+    assert options["max_requests_jitter"] == 100
+    assert options["post_fork"] is server._dispose_inherited_pools
@@ -1,8 +1,37 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections.abc import Generator
 from datetime import datetime, timezone
+from pathlib import Path
 
+import pytest
 from httpx import AsyncClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+from pastoapp.api.endpoints.sync import change_events
+from pastoapp.core.config import settings
+from pastoapp.crud import pasto_entry as entry_crud
+from pastoapp.crud import snapshot as snapshot_crud
+from pastoapp.crud.change_log import compact_change_log
+from pastoapp.crud.pasto_entry import get_entry, push_entries, update_entry
+from pastoapp.crud.snapshot import refresh_snapshot
+from pastoapp.db.base import Base
+from pastoapp.db.changes import change_notifier
+from pastoapp.db.session import get_db
+from pastoapp.main import app
+from pastoapp.models.change_log import PastoEntryChange
+from pastoapp.schemas.pasto_entry import (
+    PastoEntryCreate,
+    PastoEntryPatch,
+    PastoEntryUpdate,
+)
 
 
 def _entry_payload(entry_uuid: str, lot: str) -> dict:
@@ -51,3 +80,375 @@ async def test_sync_push_pull(client: AsyncClient) -> None:
     assert response.status_code == 200
     pull_data = response.json()
     assert "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa" in pull_data["deleted"]
+
+
+async def test_sync_push_batch_upserts_existing_and_new(client: AsyncClient) -> None:
+    existing = _entry_payload("cccccccc-cccc-cccc-cccc-cccccccccccc", "L1")
+    response = await client.post("/api/pasto/entries", json=existing)
+    assert response.status_code == 201
+    created_at = response.json()["createdAt"]
+
+    items = [
+        _entry_payload(f"00000000-0000-0000-0000-{index:012d}", f"N{index}")
+        for index in range(1, 51)
+    ]
+    items.append({**existing, "lotNumber": "L9"})
+    items.append(_entry_payload("00000000-0000-0000-0000-000000000001", "N1b"))
+    response = await client.post(
+        "/api/sync/pasto/push",
+        json={"deviceId": "device-2", "items": items, "deletedIds": []},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rejected"] == []
+    assert data["accepted"] == [item["uuid"] for item in items]
+
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": 0})
+    pulled = {item["uuid"]: item for item in response.json()["items"]}
+    assert len(pulled) == 51
+    assert pulled[existing["uuid"]]["lotNumber"] == "L9"
+    # The POST answer is the value as sent; SQLite hands it back without
+    # its offset.
+    assert pulled[existing["uuid"]]["createdAt"] == created_at.removesuffix("Z")
+    assert pulled[existing["uuid"]]["deviceId"] == "device-2"
+    assert pulled["00000000-0000-0000-0000-000000000001"]["lotNumber"] == "N1b"
+    seqs = sorted(item["updatedSeq"] for item in pulled.values())
+    assert len(set(seqs)) == len(seqs)
+    assert response.json()["newCursor"] == data["newCursor"] == seqs[-1]
+
+
+async def test_sync_push_tombstones_in_one_seq_block(client: AsyncClient) -> None:
+    items = [
+        _entry_payload(f"00000000-0000-0000-0000-{index:012d}", f"N{index}")
+        for index in range(1, 11)
+    ]
+    response = await client.post("/api/sync/pasto/push", json={"items": items})
+    cursor = response.json()["newCursor"]
+
+    unknown = "99999999-9999-9999-9999-999999999999"
+    deleted = [item["uuid"] for item in items[:6]]
+    response = await client.post(
+        "/api/sync/pasto/push",
+        json={
+            "items": [{**items[9], "lotNumber": "N10b"}],
+            "deletedIds": [*deleted, unknown, deleted[0]],
+        },
+    )
+    data = response.json()
+    assert data["unknownDeletedIds"] == [unknown]
+    assert data["newCursor"] == cursor + 7
+
+    response = await client.get(
+        "/api/sync/pasto/pull", params={"cursor": cursor, "format": "delta"}
+    )
+    rows = {row[0]: row for row in response.json()["rows"]}
+    assert sorted(rows[entry_uuid][1] for entry_uuid in deleted) == list(
+        range(cursor + 2, cursor + 8)
+    )
+    assert all(rows[entry_uuid][3] == 1 << 6 for entry_uuid in deleted)
+    assert rows[items[9]["uuid"]][3] == 1 << 1
+
+
+async def test_sync_pull_reads_the_change_log(
+    client: AsyncClient, db_session: Session
+) -> None:
+    first = _entry_payload("abababab-abab-abab-abab-abababababab", "L1")
+    second = _entry_payload("cdcdcdcd-cdcd-cdcd-cdcd-cdcdcdcdcdcd", "L1")
+    await client.post(
+        "/api/sync/pasto/push", json={"deviceId": "device-1", "items": [first]}
+    )
+    await client.post(
+        "/api/sync/pasto/push", json={"deviceId": "device-2", "items": [second]}
+    )
+    await client.post(
+        "/api/sync/pasto/push",
+        json={"deviceId": "device-1", "items": [{**first, "lotNumber": "L2"}]},
+    )
+    assert db_session.scalar(select(func.count()).select_from(PastoEntryChange)) == 3
+
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": 0})
+    assert [item["uuid"] for item in response.json()["items"]] == [
+        second["uuid"],
+        first["uuid"],
+    ]
+    response = await client.get(
+        "/api/sync/pasto/pull", params={"cursor": 0, "device_id": "device-1"}
+    )
+    [item] = response.json()["items"]
+    assert item["lotNumber"] == "L2"
+
+    assert compact_change_log(db_session) == 1
+    assert db_session.scalar(select(func.count()).select_from(PastoEntryChange)) == 2
+
+
+async def test_sync_push_replays_idempotent_batches(client: AsyncClient) -> None:
+    items = [_entry_payload("ffffffff-ffff-ffff-ffff-ffffffffffff", "L1")]
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    first = await client.post(
+        "/api/sync/pasto/push", json={"items": items}, headers=headers
+    )
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = await client.post(
+        "/api/sync/pasto/push",
+        json={"items": [{**items[0], "lotNumber": "L2"}]},
+        headers=headers,
+    )
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    # Without a key, an identical replay is still a no-op for updatedSeq.
+    replay = await client.post("/api/sync/pasto/push", json={"items": items})
+    assert replay.json()["accepted"] == [items[0]["uuid"]]
+    assert replay.json()["newCursor"] == first.json()["newCursor"]
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": 0})
+    assert response.json()["items"][0]["lotNumber"] == "L1"
+
+
+async def test_sync_patch_and_delta_pull(client: AsyncClient) -> None:
+    entry = _entry_payload("dddddddd-dddd-dddd-dddd-dddddddddddd", "L1")
+    response = await client.post(
+        "/api/sync/pasto/push", json={"deviceId": "device-1", "items": [entry]}
+    )
+    cursor = response.json()["newCursor"]
+
+    response = await client.get(
+        "/api/sync/pasto/pull", params={"cursor": 0, "format": "delta"}
+    )
+    data = response.json()
+    assert data["fields"] == [
+        "id",
+        "lotNumber",
+        "entryTime",
+        "exitTime",
+        "createdAt",
+        "deviceId",
+        "deletedAt",
+    ]
+    [row] = data["rows"]
+    assert row[3] == 0b0111111
+    assert row[5] == "L1"
+
+    unknown = "eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee"
+    response = await client.post(
+        "/api/sync/pasto/push",
+        json={
+            "patches": [
+                {"uuid": entry["uuid"], "exitTime": "2030-01-01T10:00:00+00:00"},
+                {"uuid": unknown, "lotNumber": "L2"},
+            ]
+        },
+    )
+    data = response.json()
+    assert data["accepted"] == [entry["uuid"]]
+    assert [item["id"] for item in data["rejected"]] == [unknown]
+
+    response = await client.get(
+        "/api/sync/pasto/pull", params={"cursor": cursor, "format": "delta"}
+    )
+    [row] = response.json()["rows"]
+    assert row[0] == entry["uuid"]
+    assert row[3] == 1 << 3
+    assert len(row) == 5
+    assert row[4].startswith("2030-01-01T10:00:00")
+
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": 0})
+    [item] = response.json()["items"]
+    assert item["lotNumber"] == "L1"
+    assert item["deviceId"] == "device-1"
+
+
+async def test_sync_push_rejects_nulls_and_hides_database_errors(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    entry = _entry_payload("dddddddd-dddd-dddd-dddd-dddddddddddd", "L1")
+    await client.post("/api/sync/pasto/push", json={"items": [entry]})
+
+    response = await client.post(
+        "/api/sync/pasto/push",
+        json={"patches": [{"uuid": entry["uuid"], "lotNumber": None}]},
+    )
+    assert response.status_code == 422
+
+    def fail(*args: object) -> None:
+        raise DBAPIError("INSERT INTO pasto_entries", {"lot": "L2"}, Exception())
+
+    monkeypatch.setattr(entry_crud, "_bulk_write_entries", fail)
+    monkeypatch.setattr(entry_crud, "upsert_entry", fail)
+    other = _entry_payload("eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee", "L2")
+    response = await client.post("/api/sync/pasto/push", json={"items": [other]})
+    [rejected] = response.json()["rejected"]
+    assert rejected == {"id": other["uuid"], "reason": "Entry could not be stored"}
+
+
+def test_sync_push_keeps_concurrent_writes_to_other_fields(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'race.db'}")
+    Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    entry_uuid = uuid.uuid4()
+    now = datetime.fromisoformat("2026-01-01T08:00:00+00:00")
+    later = datetime.fromisoformat("2030-01-01T10:00:00+00:00")
+    with sessions() as db:
+        item = PastoEntryCreate(
+            uuid=entry_uuid, lot_number="L1", entry_time=now, exit_time=now
+        )
+        push_entries(db, [item], None)
+        db.commit()
+
+    def patch_exit_time() -> None:
+        with sessions() as db:
+            entry = get_entry(db, entry_uuid, for_update=True)
+            update_entry(db, entry, PastoEntryUpdate(exit_time=later), None)
+            db.commit()
+
+    racer = threading.Thread(target=patch_exit_time)
+    fetch = entry_crud._fetch_existing_entries
+
+    def fetch_then_race(db: Session, entry_uuids: list[uuid.UUID]) -> dict:
+        existing = fetch(db, entry_uuids)
+        if existing and racer.ident is None:
+            # A PATCH of another field arrives while the push holds its read.
+            racer.start()
+            racer.join(timeout=0.5)
+        return existing
+
+    monkeypatch.setattr(entry_crud, "_fetch_existing_entries", fetch_then_race)
+    with sessions() as db:
+        patch = PastoEntryPatch(uuid=entry_uuid, lot_number="L2")
+        push_entries(db, [], None, patches=[patch])
+        db.commit()
+    racer.join(timeout=10)
+
+    with sessions() as db:
+        entry = get_entry(db, entry_uuid, for_update=True)
+        assert entry.lot_number == "L2"
+        # SQLite hands back the stored wall-clock time without its offset.
+        assert entry.exit_time.replace(tzinfo=None) == later.replace(tzinfo=None)
+        assert entry.field_seqs["lot_number"] == 2
+        assert entry.field_seqs["exit_time"] == 3
+    engine.dispose()
+
+
+async def test_sync_pull_long_poll_wakes_on_commit(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Concurrent requests need their own sessions, unlike the shared test one.
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'poll.db'}")
+    Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db() -> Generator[Session, None, None]:
+        with sessions() as db:
+            yield db
+            db.commit()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setattr(change_notifier, "_latest", 0)
+    client = AsyncClient(app=app, base_url="http://test")
+    pull = asyncio.create_task(
+        client.get("/api/sync/pasto/pull", params={"cursor": 0, "wait": 10})
+    )
+    await asyncio.sleep(0.2)
+    assert not pull.done()
+
+    started = time.perf_counter()
+    payload = {"items": [_entry_payload("dddddddd-dddd-dddd-dddd-dddddddddddd", "L1")]}
+    await client.post("/api/sync/pasto/push", json=payload)
+    response = await asyncio.wait_for(pull, timeout=5)
+    assert time.perf_counter() - started < 2
+    assert [item["lotNumber"] for item in response.json()["items"]] == ["L1"]
+
+    response = await client.get(
+        "/api/sync/pasto/pull",
+        params={"cursor": response.json()["newCursor"], "wait": 0.2},
+    )
+    assert response.json()["items"] == []
+    await client.aclose()
+    engine.dispose()
+
+
+async def test_change_events_announce_new_ranges(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(change_notifier, "_latest", 4)
+    events = change_events(latest=4, cursor=1, heartbeat=0.1)
+    assert await anext(events) == (
+        'id: 4\nevent: change\ndata: {"fromSeq": 2, "toSeq": 4}\n\n'
+    )
+    assert await anext(events) == ": keepalive\n\n"
+
+    pending = asyncio.ensure_future(anext(events))
+    await asyncio.sleep(0)
+    await asyncio.to_thread(change_notifier.publish, 7)
+    assert await asyncio.wait_for(pending, timeout=1) == (
+        'id: 7\nevent: change\ndata: {"fromSeq": 5, "toSeq": 7}\n\n'
+    )
+    await events.aclose()
+
+
+async def test_sync_pull_streams_ndjson(client: AsyncClient) -> None:
+    items = [
+        _entry_payload(f"00000000-0000-0000-0000-{index:012d}", f"N{index}")
+        for index in range(1, 451)
+    ]
+    await client.post(
+        "/api/sync/pasto/push",
+        json={"items": items, "deletedIds": [items[0]["uuid"]]},
+    )
+
+    response = await client.get(
+        "/api/sync/pasto/pull",
+        params={"cursor": 0, "limit": 1000},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    json_pull = (
+        await client.get("/api/sync/pasto/pull", params={"cursor": 0, "limit": 1000})
+    ).json()
+    assert lines[:-1] == json_pull["items"] + [{"deleted": items[0]["uuid"]}]
+    assert lines[-1] == {"newCursor": json_pull["newCursor"]}
+
+
+async def test_sync_snapshot_bootstraps_a_device(
+    client: AsyncClient,
+    db_session: Session,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "media_root", str(tmp_path))
+    # The endpoint builds a missing snapshot with its own session.
+    monkeypatch.setattr(
+        snapshot_crud, "SessionLocal", sessionmaker(bind=db_session.get_bind())
+    )
+    items = [
+        _entry_payload(f"00000000-0000-0000-0000-{index:012d}", f"N{index}")
+        for index in range(1, 6)
+    ]
+    await client.post(
+        "/api/sync/pasto/push",
+        json={"items": items, "deletedIds": [items[0]["uuid"]]},
+    )
+
+    response = await client.get("/api/sync/pasto/snapshot")
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    seq = int(response.headers["x-snapshot-seq"])
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"snapshotSeq": seq}
+    assert [line["uuid"] for line in lines[1:]] == [i["uuid"] for i in items[1:]]
+
+    response = await client.get("/api/sync/pasto/pull", params={"cursor": seq})
+    assert response.json()["items"] == []
+    assert response.json()["deleted"] == []
+
+    extra = _entry_payload("00000000-0000-0000-0000-000000000099", "N99")
+    await client.post("/api/sync/pasto/push", json={"items": [extra]})
+    snapshot = refresh_snapshot(db_session)
+    assert snapshot.seq == seq + 1
+    assert refresh_snapshot(db_session) == snapshot
+    response = await client.get("/api/sync/pasto/snapshot")
+    assert response.headers["x-snapshot-seq"] == str(snapshot.seq)
+    assert len(response.text.splitlines()) == 6